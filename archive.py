@@ -0,0 +1,67 @@
+"""
+Archiving of old finished tasks
+Completed and Graded tasks due more than ARCHIVE_AFTER_DAYS ago are moved
+from the tasks table into the archive table (see migrations._create_archive)
+in short batched transactions, once at startup and then every
+ARCHIVE_INTERVAL_HOURS. The tasks table and its indexes then only grow with
+active work, so the listing, search, reminder and count queries cost the same
+however many semesters of history there are. The app's "Include archived"
+toggle lists and searches both tables. Set ARCHIVE_AFTER_DAYS=0 to keep
+everything in the tasks table.
+"""
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+import metrics
+from task_repository import archive_tasks, ARCHIVE_BATCH_SIZE
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_INTERVAL_HOURS = int(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+
+ARCHIVE_JOB_ID = "archive"
+
+_archived_total = metrics.counter("taskmanager_archived_tasks_total", "Tasks moved into the archive table")
+
+
+def archive_old_tasks(after_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move done tasks due more than after_days ago into the archive
+
+    Args:
+        after_days (int): Age in days past the due date, 0 to archive nothing
+        batch_size (int): Tasks per transaction
+
+    Returns:
+        int: Number of tasks moved
+    """
+    if after_days <= 0:
+        return 0
+    started = time.perf_counter()
+    moved = archive_tasks(datetime.now() - timedelta(days=after_days), batch_size)
+    if moved:
+        _archived_total.inc(moved)
+        logging.info(f"Archived {moved} task(s) in {time.perf_counter() - started:.2f} s")
+        print(f"Archived {moved} finished task(s) due more than {after_days} days ago")
+    return moved
+
+
+def schedule(scheduler):
+    """
+    Run archive_old_tasks now (in the background) and every ARCHIVE_INTERVAL_HOURS
+
+    Args:
+        scheduler (BackgroundScheduler): The scheduler to run it on, i.e. reminders.scheduler
+    """
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return
+    scheduler.add_job(
+        archive_old_tasks,
+        'interval',
+        hours=ARCHIVE_INTERVAL_HOURS,
+        next_run_time=datetime.now(),
+        id=ARCHIVE_JOB_ID,
+        replace_existing=True,
+        coalesce=True,
+        max_instances=1
+    )
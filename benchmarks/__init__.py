@@ -0,0 +1,8 @@
+"""
+Benchmarks for Task Manager
+`python -m benchmarks.run` builds synthetic tasks.db files (see generate.py),
+times the hot paths against each of them and writes the timings as JSON, so
+two runs (before and after a change) can be compared with
+`python -m benchmarks.compare old.json new.json`. Nothing here needs a
+display: the code measured is the database and email code behind the GUI.
+"""
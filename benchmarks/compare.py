@@ -0,0 +1,60 @@
+"""
+Compare two benchmark result files
+Prints the median of every benchmark in both runs and the change:
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+import sys
+
+
+def _medians(results):
+    medians = {}
+    for size, entry in results.get("sizes", {}).items():
+        for name, timing in entry["benchmarks"].items():
+            medians[(size, name)] = timing["median_ms"]
+    for name, timing in results.get("email", {}).items():
+        medians[("-", name)] = timing["median_ms"]
+    return medians
+
+
+def compare(before, after):
+    """
+    Return one row per benchmark found in either run
+
+    Args:
+        before (dict): Results of the earlier run
+        after (dict): Results of the later run
+
+    Returns:
+        list: (size, benchmark, before median ms, after median ms, change in percent) tuples;
+            missing values are None
+    """
+    old, new = _medians(before), _medians(after)
+    rows = []
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        change = (b - a) / a * 100 if a and b is not None else None
+        rows.append((*key, a, b, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmarks.run result files.")
+    parser.add_argument("before", help="Results of the earlier run")
+    parser.add_argument("after", help="Results of the later run")
+    args = parser.parse_args(argv)
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{'size':>6}  {'benchmark':<22} {'before ms':>12} {'after ms':>12} {'change':>8}")
+    for size, name, a, b, change in compare(before, after):
+        print(f"{size:>6}  {name:<22} {'-' if a is None else f'{a:.3f}':>12} {'-' if b is None else f'{b:.3f}':>12} "
+              f"{'' if change is None else f'{change:+.1f}%':>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
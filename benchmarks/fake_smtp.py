@@ -0,0 +1,71 @@
+"""
+Local fake SMTP server for benchmarking send_email
+Speaks just enough ESMTP (EHLO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT)
+for smtplib, accepts every message and delivers nothing. `delay` adds a
+fixed wait before each reply to stand in for a remote provider's latency.
+"""
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def _reply(self, *lines):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.wfile.write("".join(f"{line}\r\n" for line in lines).encode())
+        self.wfile.flush()
+
+    def handle(self):
+        self._reply("220 localhost fake ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                self._reply("250-localhost", "250-AUTH PLAIN LOGIN", "250 8BITMIME")
+            elif command.startswith("AUTH"):
+                self._reply("235 2.7.0 Authentication successful")
+            elif command.startswith("DATA"):
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply("250 2.0.0 Queued")
+            elif command.startswith("QUIT"):
+                self._reply("221 2.0.0 Bye")
+                return
+            else:
+                self._reply("250 2.0.0 OK")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded fake SMTP server on 127.0.0.1. start() serves it on a
+    background thread; `port` is the port it listens on and `messages`
+    counts the messages it accepted.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, delay=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.delay = delay
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-smtp", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
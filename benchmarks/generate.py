@@ -0,0 +1,184 @@
+"""
+Synthetic tasks.db generator
+Builds a database at the current schema with a realistic mix of one-off
+tasks and recurring series across a handful of courses: most tasks are in the
+past and done, the upcoming ones are spread over the coming months, and each
+series has a few materialized and skipped occurrences. The data is centred on
+midnight of a given date (today unless told otherwise), which is stored in the
+database's benchmark_info table: the same size, seed and date always give the
+same rows.
+
+    python -m benchmarks.generate --tasks 100k --output bench-100k.db --date 2026-01-15
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import migrations
+import task_repository
+from recurrence import insert_series, load_series, series_occurrences, occurrence_key, skip_occurrence
+from task_repository import transaction, close_connection
+
+COURSES = ["MATH 221", "CS 101", "CS 240", "PHYS 150", "CHEM 110", "HIST 105", "ENGL 201", "ECON 200",
+           "BIO 130", "PSYC 100", "ART 115", "STAT 250"]
+KINDS = ["Homework", "Lab Report", "Reading", "Quiz Prep", "Project Milestone", "Problem Set", "Essay Draft",
+         "Discussion Post", "Exam Review"]
+STATUSES = ["Not Started", "In Progress", "Completed", "Graded"]
+REMINDER_HOURS = [0, 2, 12, 24, 24, 24, 48, 72]
+# Weekday bitmasks (Mon=1 ... Sun=64) of typical class meetings
+MEETING_DAYS = [1 | 4 | 16, 2 | 8, 1 | 4, 2, 8, 16]
+
+SIZES = {"1k": 1000, "100k": 100000, "1M": 1000000}
+
+
+def parse_size(text):
+    """Return a row count given as a number or with a k/M suffix (e.g. 100k)."""
+    text = text.strip()
+    if text in SIZES:
+        return SIZES[text]
+    for suffix, factor in (("k", 1000), ("K", 1000), ("m", 1000000), ("M", 1000000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * factor)
+    return int(text)
+
+
+def parse_date(text):
+    """Return the date in a YYYY-MM-DD string, for --date."""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', expected YYYY-MM-DD")
+
+
+def series_count(tasks):
+    """Return how many recurring series a database of this many tasks gets."""
+    return min(200, max(5, tasks // 500))
+
+
+def _task_tuples(rng, count, now):
+    # Four years of tasks up to a semester ahead, so most are past and most past ones are done
+    earliest = now - timedelta(days=4 * 365)
+    span = (now + timedelta(days=120) - earliest).total_seconds()
+    for i in range(count):
+        start = earliest + timedelta(seconds=int(rng.random() * span) // 900 * 900)
+        due = start + timedelta(hours=rng.choice([2, 24, 48, 72, 168, 336]))
+        if due < now:
+            status = rng.choices(STATUSES, weights=[3, 4, 60, 33])[0]
+        else:
+            status = rng.choices(STATUSES, weights=[55, 30, 12, 3])[0]
+        course = rng.choice(COURSES)
+        name = f"{rng.choice(KINDS)} {i % 40 + 1}"
+        yield name, course, start, due, status, 0, rng.choice(REMINDER_HOURS), None, None
+
+
+def _add_series(conn, rng, count, now):
+    # Semester-long weekly series; some occurrences have rows of their own, some were deleted
+    materialized = []
+    for i in range(count):
+        first = datetime.combine(now.date() - timedelta(days=rng.randrange(0, 60)), datetime.min.time())
+        start = first + timedelta(hours=rng.choice([8, 9, 10, 13, 14, 16]))
+        due = start + timedelta(hours=rng.choice([1, 2, 24]))
+        course = COURSES[i % len(COURSES)]
+        name = f"{rng.choice(['Lecture', 'Lab', 'Recitation', 'Weekly Quiz'])} {i + 1}"
+        series_id = insert_series(conn, name, course, "Not Started", rng.choice(MEETING_DAYS), start, due,
+                                  (first + timedelta(weeks=16)).date(), rng.choice(REMINDER_HOURS[1:]))
+        occurrences = list(series_occurrences(load_series(conn, series_id)[0]))
+        for occ_start, occ_due in occurrences[:3]:
+            materialized.append((name, course, occ_start, occ_due,
+                                 "Completed" if occ_due < now else "In Progress", 0, 24, series_id,
+                                 occurrence_key(occ_start)))
+        for occ_start, _ in occurrences[3:5]:
+            skip_occurrence(conn, series_id, occurrence_key(occ_start))
+    return materialized
+
+
+def data_date(path):
+    """
+    Return the date a generated database is centred on
+
+    Args:
+        path (str): Database file made by generate()
+
+    Returns:
+        date: The stored date, or None if the file is missing or wasn't made by generate()
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT value FROM benchmark_info WHERE key = 'date'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    return datetime.strptime(row[0], "%Y-%m-%d").date() if row else None
+
+
+def generate(path, tasks, seed=0, day=None):
+    """
+    Build a synthetic tasks.db
+
+    Args:
+        path (str): Database file to create; an existing file is replaced
+        tasks (int): Number of one-off tasks
+        seed (int): Random seed
+        day (date): Date whose midnight the data is centred on, defaults to today
+
+    Returns:
+        dict: Rows created per table
+    """
+    day = day or date.today()
+    now = datetime.combine(day, datetime.min.time())
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    previous, task_repository.DB_PATH = task_repository.DB_PATH, path
+    close_connection()
+    try:
+        migrations.migrate()
+        with transaction() as conn:
+            materialized = _add_series(conn, rng, series_count(tasks), now)
+        task_repository.import_tasks(_task_tuples(rng, tasks, now))
+        task_repository.import_tasks(materialized)
+        conn = task_repository.get_connection()
+        with transaction():
+            conn.execute('CREATE TABLE benchmark_info (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            conn.executemany('INSERT INTO benchmark_info (key, value) VALUES (?, ?)',
+                             [("date", day.isoformat()), ("seed", str(seed)), ("tasks", str(tasks))])
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ("tasks", "series", "series_skips")}
+    finally:
+        close_connection()
+        task_repository.DB_PATH = previous
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a synthetic tasks.db for benchmarking.")
+    parser.add_argument("--tasks", default="1k", help="Number of tasks, e.g. 1000, 100k or 1M (default: 1k)")
+    parser.add_argument("--output", help="Database file (default: bench-<tasks>.db)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--date", type=parse_date, default=None,
+                        help="Date (YYYY-MM-DD) the data is centred on (default: today)")
+    args = parser.parse_args(argv)
+    try:
+        tasks = parse_size(args.tasks)
+    except ValueError:
+        parser.error(f"invalid --tasks value '{args.tasks}'")
+    path = args.output or f"bench-{args.tasks}.db"
+    started = time.perf_counter()
+    counts = generate(path, tasks, args.seed, args.date)
+    print(f"Wrote {path}: {counts['tasks']} tasks, {counts['series']} series, {counts['series_skips']} skipped "
+          f"occurrences in {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Benchmark runner
+Generates (or reuses) a synthetic tasks.db per size, times the hot paths
+against it, and writes the results as JSON. A kept database is only reused if
+it is centred on the same date as this run (today unless --date is given), so
+results from different days are not compared against stale data:
+
+    python -m benchmarks.run --sizes 1k,100k --repeat 5 --output results.json
+
+Timed paths (the database and email code behind the GUI; no display needed):
+    startup_load          First two pages of the main listing, as reload_tree loads them
+    reminder_rebuild      One full pass of the reminder engine (rebuild_reminder_jobs)
+    pending_count         Tray pending count from scratch (pending_counter.recount)
+    view_by_class         View by Class for one course: rows, per-class and per-status counts
+    recurrence_expansion  Saving a semester-long recurring assignment, as save_assignment does
+    send_email            One send_email over an open session to a local fake SMTP server
+    send_email_connect    One send_email including connecting and logging in
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.generate import generate, data_date, parse_date, parse_size, COURSES
+from benchmarks.fake_smtp import FakeSMTPServer
+
+# Messages per send_email measurement
+EMAIL_SENDS = 50
+
+
+def _summary(seconds):
+    return {
+        "runs": len(seconds),
+        "min_ms": round(min(seconds) * 1000, 3),
+        "median_ms": round(statistics.median(seconds) * 1000, 3),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+
+def _timed(repeat, run, cleanup=None):
+    # Time run() repeat times; cleanup(result) undoes its writes outside the timing
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - started)
+        if cleanup is not None:
+            cleanup(result)
+    return _summary(seconds)
+
+
+def _database_benchmarks(repeat):
+    import pending_counter
+    import reminders
+    from recurrence import insert_series, load_series
+    from task_pages import (PAGE_SIZE, fetch_page, row_sort_key, series_rows, class_rows, class_counts,
+                            status_counts)
+    from task_repository import get_connection, transaction
+
+    def startup_load():
+        rows = fetch_page("due", False, None, PAGE_SIZE)
+        if rows:
+            fetch_page("due", False, row_sort_key(rows[-1], "due"), PAGE_SIZE)
+
+    def view_by_class():
+        rows = class_rows(COURSES[0])
+        class_counts()
+        status_counts(COURSES[0])
+        return rows
+
+    def save_recurring():
+        start = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        with transaction() as conn:
+            series_id = insert_series(conn, "Benchmark Lab", COURSES[0], "Not Started", 1 | 4 | 16, start,
+                                      start + timedelta(hours=2), (start + timedelta(weeks=16)).date(), 24)
+        reminders.sync_series_reminder(series_id)
+        list(series_rows(load_series(get_connection(), series_id)[0]))
+        return series_id
+
+    def remove_series(series_id):
+        with transaction() as conn:
+            conn.execute('DELETE FROM series WHERE id = ?', (series_id,))
+        reminders.cancel_reminder(reminders.series_job_id(series_id))
+
+    return {
+        "startup_load": _timed(repeat, startup_load),
+        "reminder_rebuild": _timed(repeat, reminders.rebuild_reminder_jobs),
+        "pending_count": _timed(repeat, pending_counter.recount),
+        "view_by_class": _timed(repeat, view_by_class),
+        "recurrence_expansion": _timed(repeat, save_recurring, remove_series),
+    }
+
+
+def _email_benchmarks(server, sends):
+    import email_utils
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def send():
+        if not email_utils.send_email("student@example.com", "Benchmark reminder", "Lab Report 3 is due tomorrow."):
+            raise RuntimeError("send_email failed against the fake SMTP server")
+
+    def send_new_session():
+        email_utils.close_smtp_sessions()
+        send()
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            send()  # Opens the session the reused-session timing starts from
+            results = {
+                "send_email": _timed(sends, send),
+                "send_email_connect": _timed(sends, send_new_session),
+            }
+            email_utils.close_smtp_sessions()
+    finally:
+        server.stop()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, repeat=5, workdir=".benchmarks", fresh=False, seed=0, email=True, smtp_delay=0.0, day=None):
+    """
+    Run the benchmark suite
+
+    Args:
+        sizes (list): Database sizes, e.g. ["1k", "100k"]
+        repeat (int): Timed runs per benchmark
+        workdir (str): Where the generated databases are kept between runs
+        fresh (bool): Generate the databases again even if they exist
+        seed (int): Random seed for the generator
+        email (bool): Also time send_email against the fake SMTP server
+        smtp_delay (float): Seconds the fake server waits before each reply
+        day (date): Date the generated data is centred on, defaults to today
+
+    Returns:
+        dict: The results, as written to JSON
+    """
+    day = day or date.today()
+    server = None
+    if email:
+        # email_utils reads these when first imported (outbox imports it), so they are set before
+        # anything else: send to the fake server only, without pacing
+        server = FakeSMTPServer(delay=smtp_delay).start()
+        os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(server.port), SMTP_STARTTLS="0",
+                          EMAIL_USER="bench@example.com", EMAIL_PASSWORD="bench",
+                          EMAIL_RATE_PER_MINUTE="1000000", EMAIL_RATE_PER_DAY="1000000", EMAIL_RATE_BURST="1000")
+    import reminders
+    import task_repository
+
+    # The reminder jobs scheduled while timing must not fire and queue email, nor log every one
+    reminders.scheduler.pause()
+    logging.getLogger("apscheduler").setLevel(logging.WARNING)
+    os.makedirs(workdir, exist_ok=True)
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "seed": seed,
+        "data_date": day.isoformat(),
+        "sizes": {},
+    }
+    previous = task_repository.DB_PATH
+    try:
+        for size in sizes:
+            path = os.path.join(workdir, f"bench-{size}-seed{seed}.db")
+            entry = {}
+            if fresh or data_date(path) != day:
+                print(f"Generating {path} for {day} ...", file=sys.stderr)
+                started = time.perf_counter()
+                generate(path, parse_size(size), seed, day)
+                entry["generate_seconds"] = round(time.perf_counter() - started, 2)
+            task_repository.close_connection()
+            task_repository.DB_PATH = path
+            conn = task_repository.get_connection()
+            entry["rows"] = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                             for table in ("tasks", "series")}
+            print(f"Timing {size} ({entry['rows']['tasks']} tasks) ...", file=sys.stderr)
+            entry["benchmarks"] = _database_benchmarks(repeat)
+            results["sizes"][size] = entry
+        if server is not None:
+            print("Timing send_email ...", file=sys.stderr)
+            results["email"] = _email_benchmarks(server, max(repeat, EMAIL_SENDS))
+    finally:
+        task_repository.close_connection()
+        task_repository.DB_PATH = previous
+        reminders.scheduler.shutdown(wait=False)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time Task Manager's hot paths against synthetic databases.")
+    parser.add_argument("--sizes", default="1k,100k", help="Comma-separated database sizes (default: 1k,100k)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default: 5)")
+    parser.add_argument("--output", help="JSON results file (default: print to stdout)")
+    parser.add_argument("--workdir", default=".benchmarks", help="Directory for the generated databases")
+    parser.add_argument("--fresh", action="store_true", help="Generate the databases again")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generator (default: 0)")
+    parser.add_argument("--date", type=parse_date, default=None,
+                        help="Date (YYYY-MM-DD) the generated data is centred on (default: today)")
+    parser.add_argument("--no-email", action="store_true", help="Skip the send_email benchmarks")
+    parser.add_argument("--smtp-delay", type=float, default=0.0,
+                        help="Seconds the fake SMTP server waits before each reply (default: 0)")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    results = run(sizes, args.repeat, args.workdir, args.fresh, args.seed, not args.no_email, args.smtp_delay,
+                  args.date)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Change feed over tasks.db
+Triggers record every change to tasks and series in the changes table, so
+a window or process can apply only what changed since it last looked. A
+ChangeFeed checks PRAGMA data_version first: while no other connection has
+committed, a poll costs one PRAGMA, and otherwise it reads just the new
+log entries. The log is trimmed to its last CHANGE_LOG_KEEP entries; a
+reader that fell further behind (or sees a very large change) is told to
+reload everything instead.
+"""
+from collections import namedtuple
+from task_repository import data_version, changes_since, change_log_bounds, prune_changes
+
+# Log entries kept for readers that poll slowly
+CHANGE_LOG_KEEP = 20000
+# More changed rows than this in one poll are cheaper to handle with a full reload
+CHANGE_BATCH_LIMIT = 2000
+
+# task_ids and series_ids are the tasks and series that were inserted, updated or deleted;
+# overflow means the reader should reload everything rather than apply them
+Changes = namedtuple("Changes", "task_ids series_ids overflow")
+
+
+class ChangeFeed:
+    """
+    Reader of the change log. Poll it from one thread only: PRAGMA
+    data_version is per connection, and connections are per thread.
+    Changes committed on that thread's own connection are not reported
+    until another connection commits; the caller has applied them already.
+    """
+
+    def __init__(self, limit=CHANGE_BATCH_LIMIT):
+        self.limit = limit
+        self._version = data_version()
+        self._seq = change_log_bounds()[1] or 0
+
+    def poll(self):
+        """
+        Return the Changes since the last poll, or None when there are none
+        """
+        version = data_version()
+        if version == self._version:
+            return None
+        self._version = version
+        oldest, newest = change_log_bounds()
+        if newest is None or newest <= self._seq:
+            return None
+        if oldest > self._seq + 1 or newest - self._seq > self.limit:
+            # Entries we hadn't read were trimmed, or there are too many to apply one by one
+            self._seq = newest
+            self._trim(newest)
+            return Changes(set(), set(), True)
+        task_ids, series_ids = set(), set()
+        for seq, table, row_id, series_id, op in changes_since(self._seq, self.limit):
+            if table == "tasks":
+                task_ids.add(row_id)
+            if series_id is not None:
+                # A materialized occurrence replaces (or, when deleted, skips) a generated one
+                series_ids.add(series_id)
+            self._seq = seq
+        self._trim(newest)
+        return Changes(task_ids, series_ids, False)
+
+    def _trim(self, newest):
+        oldest = change_log_bounds()[0]
+        if oldest is not None and newest - oldest >= 2 * CHANGE_LOG_KEEP:
+            prune_changes(newest - CHANGE_LOG_KEEP)
@@ -0,0 +1,97 @@
+"""
+Headless reminder daemon for Task Manager
+Runs only the reminder scheduler and the outbox delivery workers, without
+tkinter, tkcalendar, PIL or pystray, so reminders keep going on machines
+without a display. Start it with `python daemon.py` or `python main.py --headless`.
+SIGTERM and SIGINT shut it down cleanly; SIGHUP reschedules every reminder.
+Changes made by other processes are picked up from the change log, so only
+the reminders of the tasks and series that changed are rescheduled.
+Old finished tasks are archived on the same schedule as in the app.
+With METRICS_PORT set, its timings are served as Prometheus text at /metrics.
+"""
+import os
+import signal
+import threading
+import logging
+from dotenv import load_dotenv
+
+# Read .env once, before the modules that take their settings from the environment are imported
+load_dotenv()
+
+import archive
+import metrics
+import migrations
+import outbox
+import reminders
+import task_repository
+from change_feed import ChangeFeed
+
+# How often tasks.db is checked for changes made by another process (e.g. the GUI)
+DAEMON_RESCAN_SECONDS = int(os.getenv("DAEMON_RESCAN_SECONDS", "60"))
+
+_stop = threading.Event()
+_rescan = threading.Event()
+
+
+def _on_stop(signum, frame):
+    logging.info(f"Received {signal.Signals(signum).name}, shutting down")
+    _stop.set()
+    _rescan.set()
+
+
+def _on_rescan(signum, frame):
+    _rescan.set()
+
+
+def run():
+    """
+    Run the reminder engine until SIGTERM or SIGINT
+
+    Returns:
+        int: Process exit status
+    """
+    signal.signal(signal.SIGTERM, _on_stop)
+    signal.signal(signal.SIGINT, _on_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _on_rescan)
+
+    migrations.migrate()
+    outbox.start_workers()
+    if os.getenv("FEED_PORT"):
+        try:
+            import feed_server
+            feed_server.start()
+        except (ImportError, OSError, ValueError) as e:
+            logging.error(f"Could not start the calendar feed: {e}")
+    # Prometheus text at /metrics when METRICS_PORT is set
+    metrics.start()
+    feed = ChangeFeed()
+    count = reminders.rebuild_reminder_jobs()
+    # Finished tasks older than ARCHIVE_AFTER_DAYS move to the archive table, now and daily
+    archive.schedule(reminders.scheduler)
+    print(f"Reminder daemon started (pid {os.getpid()}), {count} reminder job(s) scheduled")
+
+    try:
+        while not _stop.is_set():
+            _rescan.wait(DAEMON_RESCAN_SECONDS)
+            if _stop.is_set():
+                break
+            changes = feed.poll()
+            if _rescan.is_set() or (changes is not None and changes.overflow):
+                _rescan.clear()
+                reminders.rebuild_reminder_jobs()
+            elif changes is not None:
+                # Tasks were added, edited or deleted elsewhere; only their jobs follow the database
+                reminders.sync_task_reminders(list(changes.task_ids))
+                for series_id in changes.series_ids:
+                    reminders.sync_series_reminder(series_id)
+    finally:
+        reminders.scheduler.shutdown(wait=True)
+        outbox.stop_workers()
+        task_repository.close_connection()
+        print("Reminder daemon stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run())
@@ -6,14 +6,190 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-from dotenv import load_dotenv
 import logging
+import threading
+import atexit
+import time
+from rate_limit import RateLimiter
+import metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load environment variables
-load_dotenv()
+# SMTP server settings (Gmail by default; override in .env to point at another server)
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_SSL_PORT = int(os.getenv("SMTP_SSL_PORT", "465"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+
+# Seconds a session may sit idle before it is checked with NOOP ahead of the next send
+SMTP_NOOP_AFTER = 30
+
+# Outbound pacing, to stay under the provider's quotas (Gmail allows about 500 messages a day)
+EMAIL_RATE_PER_MINUTE = int(os.getenv("EMAIL_RATE_PER_MINUTE", "20"))
+EMAIL_RATE_PER_DAY = int(os.getenv("EMAIL_RATE_PER_DAY", "500"))
+EMAIL_RATE_BURST = int(os.getenv("EMAIL_RATE_BURST", "3"))
+# Pause after the server answers 421/4xx
+EMAIL_THROTTLE_BACKOFF_SECONDS = int(os.getenv("EMAIL_THROTTLE_BACKOFF_SECONDS", "120"))
+# Longest a send waits for its turn before reporting a failure (the outbox retries it later)
+EMAIL_RATE_WAIT_SECONDS = 120
+
+email_limiter = RateLimiter(EMAIL_RATE_PER_MINUTE, EMAIL_RATE_PER_DAY, EMAIL_RATE_BURST,
+                            EMAIL_THROTTLE_BACKOFF_SECONDS)
+
+_smtp_seconds = metrics.histogram("taskmanager_smtp_seconds",
+                                  "Time spent in each SMTP step (connect, tls, login, transfer)")
+_emails_total = metrics.counter("taskmanager_emails_total",
+                                "Emails accepted by the SMTP server (sent) or held back by the rate limiter")
+
+
+class SMTPSession:
+    """
+    A long-lived, authenticated SMTP connection reused across sends.
+
+    The connection is opened (and logged in) lazily on the first send. After it
+    has been idle for SMTP_NOOP_AFTER seconds it is probed with NOOP, and if the
+    server has dropped it, a new connection is opened transparently. Sends are
+    serialized with a lock, so one session can be shared between threads.
+    """
+
+    def __init__(self, host, port, username, password, use_ssl=False, starttls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.timeout = timeout
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # With implicit SSL the TLS handshake is part of "connect"
+        with _smtp_seconds.labels(phase="connect").time():
+            if self.use_ssl:
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls and not self.use_ssl:
+                with _smtp_seconds.labels(phase="tls").time():
+                    server.starttls()  # Enable security
+            with _smtp_seconds.labels(phase="login").time():
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        logging.info(f"Opened SMTP session to {self.host}:{self.port}")
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            finally:
+                self._server = None
+
+    def _ensure_connected(self):
+        if self._server is None:
+            self._connect()
+            return
+        if time.monotonic() - self._last_used < SMTP_NOOP_AFTER:
+            return
+        try:
+            alive = self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            alive = False
+        if not alive:
+            logging.info(f"SMTP session to {self.host}:{self.port} went stale, reconnecting")
+            self._drop()
+            self._connect()
+
+    def send_message(self, msg, from_addr, to_addrs):
+        """
+        Send a prepared message over the shared connection, reconnecting once if
+        the server closed it since the last send.
+
+        Raises:
+            smtplib.SMTPException or OSError if the send fails
+        """
+        with self._lock:
+            self._ensure_connected()
+            try:
+                with _smtp_seconds.labels(phase="transfer").time():
+                    self._server.send_message(msg, from_addr, to_addrs)
+            except smtplib.SMTPServerDisconnected:
+                self._drop()
+                self._connect()
+                with _smtp_seconds.labels(phase="transfer").time():
+                    self._server.send_message(msg, from_addr, to_addrs)
+            self._last_used = time.monotonic()
+
+    def close(self):
+        """Log out and close the connection if one is open."""
+        with self._lock:
+            if self._server is None:
+                return
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._drop()
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_smtp_session(sender_email, sender_password, use_ssl=False):
+    """
+    Return the calling thread's SMTP session for these credentials, creating it
+    if needed. Each thread gets its own connection so concurrent senders (such as
+    the outbox workers) don't queue behind one another.
+
+    Args:
+        sender_email (str): Account to log in as
+        sender_password (str): Password (App Password for Gmail)
+        use_ssl (bool): Use implicit SSL (port SMTP_SSL_PORT) instead of STARTTLS
+
+    Returns:
+        SMTPSession: The session for this account and transport
+    """
+    key = (threading.get_ident(), use_ssl, sender_email, sender_password)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            if use_ssl:
+                session = SMTPSession(SMTP_HOST, SMTP_SSL_PORT, sender_email, sender_password, use_ssl=True)
+            else:
+                session = SMTPSession(SMTP_HOST, SMTP_PORT, sender_email, sender_password,
+                                      starttls=SMTP_STARTTLS)
+            _sessions[key] = session
+        return session
+
+
+def close_smtp_sessions():
+    """Close every open SMTP session. Registered to run at interpreter exit."""
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_smtp_sessions)
+
+
+def _note_smtp_error(e):
+    # Tell the rate limiter about transient (4xx) answers, which is how providers throttle senders
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in e.recipients.values()]
+    else:
+        codes = [getattr(e, "smtp_code", None)]
+    throttled = [code for code in codes if isinstance(code, int) and 400 <= code < 500]
+    if throttled:
+        email_limiter.throttled(throttled[0])
 
 
 def send_email(to_email, subject, body):
@@ -37,6 +213,11 @@ def send_email(to_email, subject, body):
         print("Error: EMAIL_USER or EMAIL_PASSWORD not found in .env file")
         return False
 
+    if not email_limiter.acquire(EMAIL_RATE_WAIT_SECONDS):
+        _emails_total.labels(result="rate_limited").inc()
+        logging.warning(f"Email rate limit reached, not sending to {to_email} now")
+        return False
+
     logging.info(f"Attempting to send email from {sender_email} to {to_email}")
 
     try:
@@ -49,15 +230,10 @@ def send_email(to_email, subject, body):
         # Add body to email
         msg.attach(MIMEText(body, 'plain'))
 
-        # Gmail SMTP configuration - Using STARTTLS (port 587)
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()  # Enable security
-        server.login(sender_email, sender_password)
-
-        # Send email
-        text = msg.as_string()
-        server.sendmail(sender_email, to_email, text)
-        server.quit()
+        # Send over the shared STARTTLS session (port 587), connecting on first use
+        get_smtp_session(sender_email, sender_password).send_message(msg, sender_email, [to_email])
+        email_limiter.succeeded()
+        _emails_total.labels(result="sent").inc()
 
         logging.info(f"Email successfully sent to {to_email}")
         print(f"Email sent successfully to {to_email}")
@@ -71,15 +247,23 @@ def send_email(to_email, subject, body):
         return False
 
     except smtplib.SMTPRecipientsRefused as e:
+        _note_smtp_error(e)
         logging.error(f"Recipients refused: {e}")
         print(f"Email address {to_email} was refused by the server")
         return False
 
     except smtplib.SMTPConnectError as e:
+        _note_smtp_error(e)
         logging.error(f"SMTP Connection Error: {e}")
         print("Failed to connect to Gmail SMTP server. Check your internet connection.")
         return False
 
+    except smtplib.SMTPResponseException as e:
+        _note_smtp_error(e)
+        logging.error(f"SMTP error {e.smtp_code}: {e.smtp_error}")
+        print(f"Failed to send email: the server answered {e.smtp_code}")
+        return False
+
     except Exception as e:
         logging.error(f"Unexpected error sending email: {e}")
         print(f"Failed to send email: {e}")
@@ -106,6 +290,11 @@ def send_email_ssl(to_email, subject, body):
         logging.error("Email credentials missing in .env file")
         return False
 
+    if not email_limiter.acquire(EMAIL_RATE_WAIT_SECONDS):
+        _emails_total.labels(result="rate_limited").inc()
+        logging.warning(f"Email rate limit reached, not sending to {to_email} now")
+        return False
+
     try:
         # Create message
         msg = MIMEText(body)
@@ -113,16 +302,16 @@ def send_email_ssl(to_email, subject, body):
         msg['From'] = sender_email
         msg['To'] = to_email
 
-        # Gmail SMTP with SSL (port 465)
-        server = smtplib.SMTP_SSL("smtp.gmail.com", 465)
-        server.login(sender_email, sender_password)
-        server.send_message(msg)
-        server.quit()
+        # Send over the shared SSL session (port 465)
+        get_smtp_session(sender_email, sender_password, use_ssl=True).send_message(msg, sender_email, [to_email])
+        email_limiter.succeeded()
+        _emails_total.labels(result="sent").inc()
 
         logging.info(f"Email successfully sent to {to_email} (SSL)")
         return True
 
     except Exception as e:
+        _note_smtp_error(e)
         logging.error(f"Failed to send email via SSL: {e}")
         return False
 
@@ -168,5 +357,9 @@ def test_email_setup():
 
 
 if __name__ == "__main__":
-    # Run email test when script is executed directly
-    test_email_setup()
\ No newline at end of file
+    # Run email test when script is executed directly. The SMTP settings above are read
+    # at import, so load .env first and run the test from a fresh import of this module.
+    from dotenv import load_dotenv
+    load_dotenv()
+    import email_utils
+    email_utils.test_email_setup()
\ No newline at end of file
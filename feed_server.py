@@ -0,0 +1,183 @@
+"""
+Local iCalendar feed for Task Manager
+Serves the upcoming tasks as .ics over HTTP so phones and calendar apps can
+subscribe: /tasks.ics for everything, /courses/<class>.ics for one class.
+Each feed is built once and kept, compressed, until PRAGMA data_version
+shows another connection committed to tasks.db (or the day rolls over), so
+a poll costs one PRAGMA and, with If-None-Match, a bodyless 304.
+
+Set FEED_PORT in .env to start it with the app or the headless daemon, or
+run it on its own with `python feed_server.py`.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote
+from aiohttp import web
+import task_repository
+from transfer import ics_lines
+
+FEED_HOST = os.getenv("FEED_HOST", "127.0.0.1")
+FEED_PORT = int(os.getenv("FEED_PORT") or "8765")
+# Tasks due up to this many days ago stay in the feed
+FEED_PAST_DAYS = int(os.getenv("FEED_PAST_DAYS", "7"))
+# How long clients may use their copy before asking again
+FEED_MAX_AGE_SECONDS = int(os.getenv("FEED_MAX_AGE_SECONDS", "300"))
+
+# etag is a hash of the content without the DTSTAMP lines, so an unchanged feed keeps its
+# ETag (and its body) across rebuilds and server restarts
+_Feed = namedtuple("_Feed", "version window etag body gzipped")
+
+_feeds = {}  # class (None for all) -> _Feed
+_build_lock = asyncio.Lock()
+# Feeds are built off the event loop, one at a time, on the same connection
+_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feed-build")
+
+
+def _window_start():
+    # Midnight FEED_PAST_DAYS ago, so the feed only changes by itself once a day
+    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight - timedelta(days=FEED_PAST_DAYS)
+
+
+def _build(course, version, window, previous):
+    lines = []
+    digest = hashlib.sha256()
+    for line in ics_lines(course, due_after=window):
+        lines.append(line)
+        if not line.startswith("DTSTAMP:"):
+            digest.update(line.encode("utf-8"))
+    etag = f'"{digest.hexdigest()[:32]}"'
+    if previous is not None and previous.etag == etag:
+        return previous._replace(version=version, window=window)
+    body = "".join(lines).encode("utf-8")
+    return _Feed(version, window, etag, body, gzip.compress(body))
+
+
+async def get_feed(course=None):
+    """
+    Return the current feed for a class (or all classes), rebuilding it only
+    when tasks.db has changed since it was built
+
+    Args:
+        course (str): Class name, or None for every class
+
+    Returns:
+        _Feed: The feed with its ETag and plain and gzipped bodies
+    """
+    version = task_repository.data_version()
+    window = _window_start()
+    feed = _feeds.get(course)
+    if feed is not None and feed.version == version and feed.window == window:
+        return feed
+    async with _build_lock:
+        feed = _feeds.get(course)
+        if feed is None or feed.version != version or feed.window != window:
+            # Read the version before building: a commit during the build only causes one more rebuild
+            feed = await asyncio.get_running_loop().run_in_executor(_builder, _build, course, version, window, feed)
+            _feeds[course] = feed
+    return feed
+
+
+def _accepts_gzip(request):
+    for coding in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "x-gzip"):
+            params = params.replace(" ", "")
+            try:
+                return not params.startswith("q=") or float(params[2:]) > 0
+            except ValueError:
+                return True
+    return False
+
+
+def _etag_matches(request, etags):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or not tags.isdisjoint(etags)
+
+
+async def handle_feed(request):
+    course = request.match_info.get("course")
+    feed = await get_feed(course)
+    # Each content coding gets its own ETag; a client holding either one has the current feed
+    gzip_etag = feed.etag[:-1] + '-gzip"'
+    use_gzip = _accepts_gzip(request)
+    headers = {
+        "ETag": gzip_etag if use_gzip else feed.etag,
+        "Cache-Control": f"max-age={FEED_MAX_AGE_SECONDS}",
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request, (feed.etag, gzip_etag)):
+        return web.Response(status=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return web.Response(body=feed.gzipped if use_gzip else feed.body, headers=headers,
+                        content_type="text/calendar", charset="utf-8")
+
+
+async def handle_index(request):
+    # Plain-text list of the feed URLs, one per class
+    lines = [f"{request.url.origin()}/tasks.ics"]
+    # Off the event loop, like the feed builds, so other requests aren't held up by the query
+    counts = await asyncio.get_running_loop().run_in_executor(_builder, task_repository.count_by_course)
+    for course in sorted(course for course in counts if course):
+        lines.append(f"{request.url.origin()}/courses/{quote(course, safe='')}.ics")
+    return web.Response(text="\n".join(lines) + "\n")
+
+
+def make_app():
+    """Return the aiohttp application serving the feeds."""
+    app = web.Application()
+    app.router.add_get("/", handle_index)
+    app.router.add_get("/tasks.ics", handle_feed)
+    app.router.add_get("/courses/{course}.ics", handle_feed)
+    return app
+
+
+def start(host=FEED_HOST, port=FEED_PORT):
+    """
+    Serve the feeds from a background thread with its own event loop
+
+    Args:
+        host (str): Address to listen on; the default only accepts local connections
+        port (int): Port to listen on
+    """
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            runner = web.AppRunner(make_app())
+            loop.run_until_complete(runner.setup())
+            loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        except Exception as e:
+            logging.error(f"Could not start the calendar feed on {host}:{port}: {e}")
+            return
+        print(f"Calendar feed at http://{host}:{port}/tasks.ics")
+        loop.run_forever()
+
+    threading.Thread(target=run, name="ics-feed", daemon=True).start()
+
+
+def serve(host=FEED_HOST, port=FEED_PORT):
+    """Serve the feeds in this thread until interrupted."""
+    print(f"Calendar feed at http://{host}:{port}/tasks.ics")
+    web.run_app(make_app(), host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    # Import again so the FEED_ settings come from .env
+    import migrations
+    import feed_server
+    migrations.migrate()
+    feed_server.serve()
@@ -1,19 +1,43 @@
+import sys
+
+if "--headless" in sys.argv[1:]:
+    # Reminders and email only, for machines without a display (see daemon.py)
+    import daemon
+    sys.exit(daemon.run())
+
+import startup_profile
+from dotenv import load_dotenv
+
+# Read .env once, before the modules that take their settings from the environment are imported
+load_dotenv()
+
 import tkinter as tk
 from tkinter import messagebox, ttk
-from tkcalendar import DateEntry
-from datetime import datetime, timedelta
-import sqlite3
-from dotenv import load_dotenv
-from email_utils import send_email  # Import from our new email utility module
+from datetime import datetime
+from reminders import (sync_task_reminder, sync_task_reminders, sync_series_reminder, rebuild_reminder_jobs,
+                       scheduler)
+from task_pages import (PAGE_SIZE, SORT_COLUMNS, fetch_page, row_sort_key, series_rows, class_rows, class_counts,
+                        status_counts, search_rows)
+from recurrence import (load_series, insert_series, update_series, skip_occurrence, materialize_occurrence,
+                        occurrence_start)
+import task_repository
+from task_repository import get_connection, transaction
+from recipients import (load_recipients, add_recipient, delete_recipient, set_task_recipients, set_series_recipients,
+                        task_recipient_ids, series_recipient_ids)
+import migrations
+import archive
+import outbox
+import pending_counter
+import metrics
+from change_feed import ChangeFeed
+import heapq
 import threading
 import time
 import os
 
-import pystray
-from PIL import Image, ImageDraw
-
-import sys
 print("✅ TaskManager started successfully!", file=sys.stderr)
+startup_profile.mark("imports")
+
 def decode_recurrence_days(bitmask):
     """
     Convert the recurrence_days integer (bitmask) into a list of weekday strings.
@@ -22,79 +46,30 @@ def decode_recurrence_days(bitmask):
     weekdays = [name for bit, name in day_map.items() if bitmask and (bitmask & bit)]
     return ", ".join(weekdays)
 
-import pystray
-from PIL import Image, ImageDraw
-
-load_dotenv()
-
-# Connect to SQLite database and create table if not exists
-conn = sqlite3.connect('tasks.db', check_same_thread=False)
-cursor = conn.cursor()
-# Create table if it doesn't exist
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS tasks
-    (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        course TEXT,
-        start TEXT,
-        due TEXT,
-        status TEXT,
-        recurrence_days INTEGER
-    )
-''')
-conn.commit()
-
-# Add reminder_hours column if it doesn't exist
-try:
-    cursor.execute('ALTER TABLE tasks ADD COLUMN reminder_hours INTEGER DEFAULT 24')
-    conn.commit()
-except sqlite3.OperationalError:
-    # Column already exists, ignore
-    pass
-
-# Add reminder_sent column if it doesn't exist
-try:
-    cursor.execute('ALTER TABLE tasks ADD COLUMN reminder_sent INTEGER DEFAULT 0')
-    # Mark all tasks in the past as already reminded
-    cursor.execute('''
-                   UPDATE tasks
-                   SET reminder_sent = 1
-                   WHERE reminder_sent IS NULL
-                      OR reminder_sent = 0
-                       AND datetime(due, '-' || reminder_hours || ' hours') < datetime('now')
-                   ''')
-    conn.commit()
-except sqlite3.OperationalError:
-    # Column already exists, ignore
-    pass
+# Create or upgrade the tasks.db schema (tasks, outbox, series and their indexes)
+migrations.migrate()
+startup_profile.mark("schema migrations")
 
-# --- System Tray Icon Functions ---
-def create_image(width, height, color1, color2):
-    # Generate an icon image
-    image = Image.new('RGB', (width, height), color1)
-    dc = ImageDraw.Draw(image)
-    dc.rectangle(
-        [(width // 3, height // 3), (width * 2 // 3, height * 2 // 3)],
-        fill=color2)
-    return image
 
-def on_quit(icon, item):
-    root.quit()
-    icon.stop()
+# Occurrences of a series that have no tasks row of their own are shown in the
+# Treeview under iids of the form "S<series id>@<YYYYMMDD>"
+def series_iid(series_id, occ_start):
+    return f"S{series_id}@{occ_start.strftime('%Y%m%d')}"
 
-def setup_tray():
-    image = create_image(64, 64, "black", "white")
-    menu = pystray.Menu(
-        pystray.MenuItem("Show Task Manager", lambda icon, item: root.deiconify()),
-        pystray.MenuItem("Quit", on_quit)
-    )
-    tray_icon = pystray.Icon("taskmanager", image, "Task Manager", menu)
-    threading.Thread(target=tray_icon.run, daemon=True).start()
+def parse_series_iid(iid):
+    """
+    Return (series_id, occurrence key) for a Treeview item that is an
+    unmaterialized series occurrence, or None for a regular task.
+    """
+    if not iid.startswith("S"):
+        return None
+    series_id, stamp = iid[1:].split("@")
+    return int(series_id), datetime.strptime(stamp, "%Y%m%d").strftime("%Y-%m-%d")
 
 # --- System Tray Icon Functions ---
 def create_image(width, height, color1, color2):
-    # Generate an icon image
+    # Generate an icon image. PIL is only loaded here, once the tray icon is built.
+    from PIL import Image, ImageDraw
     image = Image.new('RGB', (width, height), color1)
     dc = ImageDraw.Draw(image)
     dc.rectangle(
@@ -115,6 +90,7 @@ def show_window(icon, item):
 
 def setup_tray():
     global tray_icon
+    import pystray
     image = create_image(64, 64, "black", "white")
     menu = pystray.Menu(
         pystray.MenuItem("Show Task Manager", show_window),
@@ -133,45 +109,244 @@ def on_close():
     root.withdraw()  # Hide the window instead of closing
 root.protocol("WM_DELETE_WINDOW", on_close)
 
-# Handler to hide window instead of quitting
-def on_close():
-    root.withdraw()  # Hide the window instead of closing
-root.protocol("WM_DELETE_WINDOW", on_close)
+# Search box above the Treeview; typing filters the listing through the full-text index
+search_frame = tk.Frame(root)
+search_frame.pack(fill="x", padx=5, pady=(5, 0))
+tk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+search_var = tk.StringVar()
+tk.Entry(search_frame, textvariable=search_var).pack(side=tk.LEFT, fill="x", expand=True, padx=5)
+tk.Button(search_frame, text="Clear", command=lambda: search_var.set("")).pack(side=tk.LEFT)
+archived_var = tk.BooleanVar(value=False)
+tk.Checkbutton(search_frame, text="Include archived", variable=archived_var,
+               command=lambda: toggle_archived()).pack(side=tk.LEFT, padx=5)
 
 # Treeview setup
 # Treeview to display tasks, now including Class/Course as the second column, but hiding Recurrence column
-tree = ttk.Treeview(root, columns=("Name", "Class", "Start", "Due", "Status"), show="headings")
-tree.heading("Name", text="Assignment Name")
-tree.heading("Class", text="Class")
-tree.heading("Start", text="Start Date/Time")
-tree.heading("Due", text="Due Date/Time")
-tree.heading("Status", text="Status")
-tree.pack(fill="both", expand=True)
-
-# Configure tags for background colors
+tree_frame = tk.Frame(root)
+tree_frame.pack(fill="both", expand=True)
+# Extended selection: shift/ctrl-click picks several rows for the bulk actions below
+tree = ttk.Treeview(tree_frame, columns=("Name", "Class", "Start", "Due", "Status"), show="headings",
+                    selectmode="extended")
+heading_text = {"Name": "Assignment Name", "Class": "Class", "Start": "Start Date/Time", "Due": "Due Date/Time",
+                "Status": "Status"}
+for heading, text in heading_text.items():
+    tree.heading(heading, text=text, command=lambda h=heading: sort_tree_by(h))
+tree_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
+tree_scrollbar.pack(side=tk.RIGHT, fill="y")
+tree.pack(side=tk.LEFT, fill="both", expand=True)
+
 # Configure tags for background colors (matching View by Class)
 tree.tag_configure("Not Started", background="#ff7171")
 tree.tag_configure("In Progress", background="#fffacd")
 tree.tag_configure("Completed", background="#d0f0c0")
 tree.tag_configure("Graded", background="#add8e6")
+tree.tag_configure("Archived", foreground="#666666")
+
+# The Treeview holds only the part of the task listing the user has scrolled to, in the
+# selected sort order. "keys" are the sort keys of the loaded rows in display order and
+# "cursor" is the key of the last row fetched; more pages are loaded as the user scrolls.
+# While "search" holds the search box text, the Treeview shows one page of matches instead.
+# With "archived" set, archived tasks (read-only, "A" iids) are listed and searched too.
+tree_view = {"column": "due", "descending": False, "keys": [], "key_by_iid": {}, "cursor": None,
+             "exhausted": False, "loading": False, "search": None, "archived": False}
 
-# Load existing tasks from database and print them
-# NOTE: Old tasks in DB do not have 'Course' or 'Status'; only show what is available.
-cursor.execute('SELECT id, name, course, start, due, status, recurrence_days FROM tasks')
-rows = cursor.fetchall()
-for task in rows:
-    status_tag = task[5] if task[5] else "Not Started"
+tree_fill_seconds = metrics.histogram("taskmanager_tree_fill_seconds",
+                                      "Time the main window spent filling the Treeview")
+
+def format_for_display(value):
+    # Database times are shown as MM/DD/YY HH:MM AM/PM; anything unparseable is shown as stored
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").strftime("%m/%d/%y %I:%M %p")
+    except (TypeError, ValueError):
+        return value
+
+def _show_row(row, index):
+    # NOTE: Old tasks in DB do not have 'Course' or 'Status'; only show what is available.
+    tags = (row.status or "Not Started",)
+    if row.iid.startswith("A"):
+        tags += ("Archived",)
     tree.insert(
         "",
-        tk.END,
-        iid=str(task[0]),
-        values=(task[1], task[2], task[3], task[4], task[5]),
-        tags=(status_tag,)
+        index,
+        iid=row.iid,
+        values=(row.name, row.course, format_for_display(row.start), format_for_display(row.due), row.status),
+        tags=tags
     )
 
+def _tree_position(key):
+    # Index of the first loaded row that sorts after key
+    keys, descending = tree_view["keys"], tree_view["descending"]
+    lo, hi = 0, len(keys)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (keys[mid] < key) if descending else (keys[mid] > key):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+@tree_fill_seconds.labels(op="page").timed
+def load_next_page():
+    tree_view["loading"] = False
+    if tree_view["exhausted"]:
+        return
+    rows = fetch_page(tree_view["column"], tree_view["descending"], tree_view["cursor"], PAGE_SIZE,
+                      tree_view["archived"])
+    _append_rows(rows)
+    if rows:
+        tree_view["cursor"] = row_sort_key(rows[-1], tree_view["column"])
+    tree_view["exhausted"] = len(rows) < PAGE_SIZE
+
+def _append_rows(rows):
+    for row in rows:
+        key = row_sort_key(row, tree_view["column"])
+        _show_row(row, tk.END)
+        tree_view["keys"].append(key)
+        tree_view["key_by_iid"][row.iid] = key
+
+@tree_fill_seconds.labels(op="reload").timed
+def reload_tree():
+    children = tree.get_children()
+    if children:
+        tree.delete(*children)
+    tree_view.update(keys=[], key_by_iid={}, cursor=None, exhausted=False)
+    if tree_view["search"]:
+        # One page of matches, in the selected sort order; nothing more is paged in
+        rows = search_rows(tree_view["search"], PAGE_SIZE, tree_view["archived"])
+        rows.sort(key=lambda row: row_sort_key(row, tree_view["column"]), reverse=tree_view["descending"])
+        _append_rows(rows)
+        tree_view["exhausted"] = True
+        return
+    load_next_page()
+    load_next_page()  # Prefetch one page beyond what is visible
+
+# Wait this long after the last keystroke before searching
+SEARCH_DELAY_MS = 150
+search_job = {"id": None}
+
+def schedule_search(*args):
+    if search_job["id"] is not None:
+        root.after_cancel(search_job["id"])
+    search_job["id"] = root.after(SEARCH_DELAY_MS, apply_search)
+
+def apply_search():
+    search_job["id"] = None
+    tree_view["search"] = search_var.get().strip() or None
+    reload_tree()
+
+search_var.trace_add("write", schedule_search)
+
+def toggle_archived():
+    tree_view["archived"] = archived_var.get()
+    reload_tree()
+
+def sort_tree_by(heading):
+    column = SORT_COLUMNS[heading]
+    tree_view["descending"] = not tree_view["descending"] if tree_view["column"] == column else False
+    tree_view["column"] = column
+    for name, text in heading_text.items():
+        arrow = (" ▼" if tree_view["descending"] else " ▲") if name == heading else ""
+        tree.heading(name, text=text + arrow)
+    reload_tree()
+
+def on_tree_scroll(first, last):
+    tree_scrollbar.set(first, last)
+    # Fetch the next page once the end of the loaded rows comes into view
+    if float(last) > 0.9 and not tree_view["exhausted"] and not tree_view["loading"]:
+        tree_view["loading"] = True
+        root.after_idle(load_next_page)
+
+tree.configure(yscrollcommand=on_tree_scroll)
+
+def tree_put(row):
+    """
+    Show a new or changed row at its sorted position. Rows past the loaded part
+    of the listing are left for a later page.
+    """
+    if tree_view["search"]:
+        # Whether the row matches is up to the index, so search again
+        schedule_search()
+        return
+    tree_remove(row.iid)
+    key = row_sort_key(row, tree_view["column"])
+    cursor = tree_view["cursor"]
+    if not tree_view["exhausted"] and cursor is not None:
+        if (key < cursor) if tree_view["descending"] else (key > cursor):
+            return
+    index = _tree_position(key)
+    _show_row(row, index)
+    tree_view["keys"].insert(index, key)
+    tree_view["key_by_iid"][row.iid] = key
+
+def tree_remove(iid):
+    key = tree_view["key_by_iid"].pop(iid, None)
+    if key is None:
+        return
+    del tree_view["keys"][_tree_position(key) - 1]
+    tree.delete(iid)
+
+def tree_remove_many(iids):
+    # tree_remove for many rows, with one Treeview call and one pass over the sort keys
+    key_by_iid = tree_view["key_by_iid"]
+    removed = [iid for iid in iids if key_by_iid.pop(iid, None) is not None]
+    if removed:
+        tree.delete(*removed)
+        tree_view["keys"] = [key_by_iid[iid] for iid in tree.get_children()]
+
+@tree_fill_seconds.labels(op="bulk").timed
+def tree_put_many(rows):
+    # tree_put for many rows: the new keys are merged into the loaded ones in a single pass
+    if tree_view["search"]:
+        schedule_search()
+        return
+    tree_remove_many([row.iid for row in rows])
+    column, descending, cursor = tree_view["column"], tree_view["descending"], tree_view["cursor"]
+    placed = []
+    for row in rows:
+        key = row_sort_key(row, column)
+        if not tree_view["exhausted"] and cursor is not None:
+            if (key < cursor) if descending else (key > cursor):
+                continue
+        placed.append((key, row))
+    placed.sort(key=lambda item: item[0], reverse=descending)
+    # Inserted in display order, each row lands after the ones placed before it
+    for offset, (key, row) in enumerate(placed):
+        _show_row(row, _tree_position(key) + offset)
+        tree_view["key_by_iid"][row.iid] = key
+    tree_view["keys"] = list(heapq.merge(tree_view["keys"], [key for key, _ in placed], reverse=descending))
+
+def insert_series_items(series):
+    # Show the occurrences of the series that have no tasks row of their own
+    for row in series_rows(series):
+        tree_put(row)
+
+def remove_series_items(series_id):
+    prefix = f"S{series_id}@"
+    for iid in [iid for iid in tree_view["key_by_iid"] if iid.startswith(prefix)]:
+        tree_remove(iid)
+
+# Follows the changes other processes and this app's background threads make to tasks.db
+change_feed = ChangeFeed()
+reload_tree()
+
+
+def recipient_picker(parent, row, selected_ids=()):
+    # Multi-select list of the saved recipients; returns a function giving the ids selected at save time
+    recipients = load_recipients(get_connection())
+    tk.Label(parent, text="Also Remind:").grid(column=0, row=row, sticky="nw", padx=5, pady=5)
+    listbox = tk.Listbox(parent, selectmode=tk.MULTIPLE, exportselection=False, width=40,
+                         height=min(max(len(recipients), 1), 5))
+    for index, recipient in enumerate(recipients):
+        listbox.insert(tk.END, f"{recipient.name} <{recipient.email or recipient.phone}>")
+        if recipient.id in selected_ids:
+            listbox.selection_set(index)
+    listbox.grid(column=1, row=row, sticky="w", padx=5, pady=5)
+    return lambda: [recipients[index].id for index in listbox.curselection()]
+
 
 # Function to open add assignment window
 def open_new_window():
+    from tkcalendar import DateEntry  # tkcalendar (and babel) load when the first dialog opens
     new_window = tk.Toplevel(root)
     new_window.title("Add New Assignment")
     new_window.geometry("800x600")
@@ -248,6 +423,8 @@ def open_new_window():
     reminder_hours_entry.insert(0, "24")
     reminder_hours_entry.grid(column=1, row=9, sticky="w", padx=5, pady=5)
 
+    selected_recipients = recipient_picker(form_frame, 10)
+
     def toggle_recurring():
         if recurring_var.get():
             recurring_frame.grid()
@@ -283,74 +460,34 @@ def open_new_window():
             messagebox.showerror("Error", "Due date/time cannot be before start date/time.")
             return
 
-        # Prepare recurrence days string for display
+        # Encode the selected weekdays as the recurrence_days bitmask
         recurrence_days = 0
-        recurrence_days_str = ""
         if recurring_var.get():
             day_map = {"Mon": 1, "Tue": 2, "Wed": 4, "Thu": 8, "Fri": 16, "Sat": 32, "Sun": 64}
             recurrence_days = sum(day_map[d] for d, var in weekday_vars.items() if var.get())
-            recurrence_days_str = ", ".join([d for d, var in weekday_vars.items() if var.get()])
-
-        # Insert task into the database, including reminder_hours and reminder_sent (default 0)
-        cursor.execute(
-            'INSERT INTO tasks (name, course, start, due, status, recurrence_days, reminder_hours, reminder_sent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-            (name, course, start.strftime("%Y-%m-%d %H:%M:%S"), due.strftime("%Y-%m-%d %H:%M:%S"), status,
-             recurrence_days, reminder_hours, 0)
-        )
-        conn.commit()
-        task_id = cursor.lastrowid
-
-        # Insert new row into Treeview with columns: Name, Class, Start, Due, Status
-        tree.insert(
-            "",
-            tk.END,
-            iid=str(task_id),
-            values=(
-                name,
-                course,
-                start.strftime("%m/%d/%y %I:%M %p"),
-                due.strftime("%m/%d/%y %I:%M %p"),
-                status
-            ),
-            tags=(status,)
-        )
-        # Reminder scheduling handled externally
-
-        if recurring_var.get():
-            end_dt_date = datetime.strptime(recurrence_end.get(), "%m/%d/%y")
-            day_map = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
-            selected_days = [day_map[d] for d, var in weekday_vars.items() if var.get()]
-            if not selected_days:
+            if not recurrence_days:
                 messagebox.showerror("Error", "Select at least one weekday for recurring tasks.")
                 return
-            current_date = start
-            while current_date.date() <= end_dt_date.date():
-                if current_date.weekday() in selected_days and current_date != start:
-                    delta = due - start
-                    current_due = current_date + delta
-                    # Insert each recurring task into the database and Treeview with unique id, including reminder_hours and reminder_sent
-                    cursor.execute(
-                        'INSERT INTO tasks (name, course, start, due, status, recurrence_days, reminder_hours, reminder_sent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-                        (name, course, current_date.strftime("%Y-%m-%d %H:%M:%S"),
-                         current_due.strftime("%Y-%m-%d %H:%M:%S"), status, recurrence_days, reminder_hours, 0)
-                    )
-                    conn.commit()
-                    recurring_task_id = cursor.lastrowid
-                    tree.insert(
-                        "",
-                        tk.END,
-                        iid=str(recurring_task_id),
-                        values=(
-                            name,
-                            course,
-                            current_date.strftime("%m/%d/%y %I:%M %p"),
-                            current_due.strftime("%m/%d/%y %I:%M %p"),
-                            status
-                        ),
-                        tags=(status,)
-                    )
-                    # Reminder scheduling handled externally
-                current_date += timedelta(days=1)
+            end_dt_date = datetime.strptime(recurrence_end.get(), "%m/%d/%y")
+
+            # Store just the rule; occurrences are generated when displayed or reminded
+            with transaction() as conn:
+                series_id = insert_series(conn, name, course, status, recurrence_days, start, due,
+                                          end_dt_date.date(), reminder_hours)
+                set_series_recipients(conn, series_id, selected_recipients())
+            sync_series_reminder(series_id)
+            insert_series_items(load_series(get_connection(), series_id)[0])
+            new_window.destroy()
+            return
+
+        # Insert task into the database, including reminder_hours, reminder_at and reminder_sent (default 0)
+        task_id = task_repository.insert_task(name, course, start, due, status, recurrence_days, reminder_hours)
+        with transaction() as conn:
+            set_task_recipients(conn, task_id, selected_recipients())
+        sync_task_reminder(task_id)
+
+        # Show the new row in the Treeview at its sorted position
+        tree_put(task_repository.get_task(task_id))
 
         new_window.destroy()
 
@@ -368,6 +505,14 @@ def open_view_by_class_window():
                "Modern Software Design & Development", "Web Application Development"]
     selected_class = tk.StringVar(value=classes[0])
     tk.OptionMenu(view_window, selected_class, *classes).pack(pady=5)
+    include_archived = tk.BooleanVar(value=archived_var.get())
+    tk.Checkbutton(view_window, text="Include archived", variable=include_archived).pack()
+
+    # Totals: tasks per class across all classes, and tasks per status in the selected class
+    class_counts_label = tk.Label(view_window, justify=tk.LEFT)
+    class_counts_label.pack(pady=2)
+    status_counts_label = tk.Label(view_window)
+    status_counts_label.pack(pady=2)
 
     class_tree = ttk.Treeview(view_window, columns=("Name", "Start", "Due", "Status"), show='headings')
     class_tree.heading("Name", text="Assignment Name")
@@ -382,25 +527,40 @@ def open_view_by_class_window():
     class_tree.tag_configure("Graded", background="#add8e6")
 
     def update_tree(*args):
-        for item in class_tree.get_children():
-            class_tree.delete(item)
-        for item in tree.get_children():
-            vals = tree.item(item, "values")
-            if len(vals) >= 5:
-                name, cls, start, due, status = vals[:5]
-                if cls == selected_class.get():
-                    class_tree.insert("", tk.END, values=(name, start, due, status), tags=(status,))
+        # Query the class straight from tasks.db (course index) rather than filtering the main tree,
+        # which only holds the rows scrolled to so far
+        course = selected_class.get()
+        archived = include_archived.get()
+        rows = class_rows(course, archived)
+        children = class_tree.get_children()
+        if children:
+            class_tree.delete(*children)
+        for row in rows:
+            class_tree.insert("", tk.END, values=(row.name, format_for_display(row.start),
+                                                  format_for_display(row.due), row.status),
+                              tags=(row.status or "Not Started",))
+
+        per_class = class_counts(archived)
+        class_counts_label.config(text="\n".join(f"{cls}: {per_class.get(cls, 0)}" for cls in classes))
+        per_status = status_counts(course, archived)
+        status_counts_label.config(text=f"{len(rows)} assignment(s) — " + ", ".join(
+            f"{status}: {per_status.get(status, 0)}" for status in ("Not Started", "In Progress", "Completed", "Graded")))
 
     selected_class.trace_add("write", update_tree)
+    include_archived.trace_add("write", update_tree)
     update_tree()
 
 
 # Function to edit selected task
 def open_edit_window():
+    from tkcalendar import DateEntry
     selected_item = tree.selection()
     if not selected_item:
         messagebox.showwarning("Edit Task", "Please select a task to edit.")
         return
+    if selected_item[0].startswith("A"):
+        messagebox.showinfo("Edit Task", "Archived tasks are read-only.")
+        return
 
     item = tree.item(selected_item[0])  # Fix: Use selected_item[0]
     values = item['values']
@@ -411,8 +571,14 @@ def open_edit_window():
         name_val, course_val, start_val, due_val, status_val = values
         recurrence_val = ""
 
+    # An unmaterialized series occurrence edits its whole series
+    series_ref = parse_series_iid(selected_item[0])
+    series = load_series(get_connection(), series_ref[0])[0] if series_ref else None
+    if series:
+        recurrence_val = series.recurrence_days
+
     edit_window = tk.Toplevel(root)
-    edit_window.title("Edit Assignment")
+    edit_window.title("Edit Recurring Series" if series else "Edit Assignment")
     edit_window.geometry("800x600")
 
     tk.Label(edit_window, text="Edit Assignment", font=("Arial", 16)).grid(column=0, row=0, columnspan=2, pady=10)
@@ -499,7 +665,7 @@ def open_edit_window():
     # Reminder hours
     tk.Label(form_frame, text="Reminder Hours Before Due:").grid(column=0, row=7, sticky="w", padx=5, pady=5)
     reminder_hours_entry = tk.Entry(form_frame, width=10)
-    reminder_hours_entry.insert(0, "24")
+    reminder_hours_entry.insert(0, str(series.reminder_hours) if series else "24")
     reminder_hours_entry.grid(column=1, row=7, sticky="w", padx=5, pady=5)
 
     # Recurrence checkboxes
@@ -540,6 +706,13 @@ def open_edit_window():
 
     recurring_var.trace_add("write", lambda *args: toggle_recurring())
 
+    # Who else gets this task's (or series') reminders
+    if series:
+        shared_with = series_recipient_ids(get_connection(), series.id)
+    else:
+        shared_with = task_recipient_ids(get_connection(), int(selected_item[0]))
+    selected_recipients = recipient_picker(form_frame, 10, shared_with)
+
     # Save changes
     def save_changes():
         new_name = name_entry.get().strip()
@@ -561,28 +734,38 @@ def open_edit_window():
         # Encode recurrence days
         day_map = {"Mon": 1, "Tue": 2, "Wed": 4, "Thu": 8, "Fri": 16, "Sat": 32, "Sun": 64}
         recurrence_days = sum(day_map[d] for d, var in weekday_vars.items() if var.get()) if recurring_var.get() else 0
-        recurrence_days_str = decode_recurrence_days(recurrence_days)
+
+        if series:
+            # Series edits touch only the rule: the time of day and duration come from the form,
+            # the dates keep following the weekday rule. Occurrences with their own rows keep their state.
+            series_start = datetime.combine(series.start.date(), new_start.time())
+            try:
+                with transaction() as conn:
+                    update_series(conn, series.id, new_name, new_course, new_status, recurrence_days,
+                                  series_start, series_start + (new_due - new_start), reminder_hours)
+                    set_series_recipients(conn, series.id, selected_recipients())
+                sync_series_reminder(series.id)
+                remove_series_items(series.id)
+                insert_series_items(load_series(get_connection(), series.id)[0])
+                messagebox.showinfo("Success", "Recurring series updated successfully!")
+                edit_window.destroy()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save changes: {str(e)}")
+            return
 
         try:
             # Use the item iid as the task ID (guaranteed to be correct)
             task_id = int(selected_item[0])
-            # Update database
-            cursor.execute(
-                'UPDATE tasks SET name=?, course=?, start=?, due=?, status=?, reminder_hours=?, recurrence_days=? WHERE id=?',
-                (new_name, new_course, new_start.strftime("%Y-%m-%d %H:%M:%S"),
-                 new_due.strftime("%Y-%m-%d %H:%M:%S"), new_status, reminder_hours, recurrence_days, task_id)
-            )
-            if cursor.rowcount == 0:
+            # Update database; a changed reminder time re-arms the reminder
+            if not task_repository.update_task(task_id, new_name, new_course, new_start, new_due, new_status,
+                                               reminder_hours, recurrence_days):
                 messagebox.showerror("Error", f"No task found with ID {task_id}. Update failed.")
                 return
-            conn.commit()
-            # Update tree display
-            tree.item(
-                selected_item[0],
-                values=(new_name, new_course, new_start.strftime("%m/%d/%y %I:%M %p"),
-                        new_due.strftime("%m/%d/%y %I:%M %p"), new_status),
-                tags=(new_status,)
-            )
+            with transaction() as conn:
+                set_task_recipients(conn, task_id, selected_recipients())
+            sync_task_reminder(task_id)
+            # Update tree display (the row may move if a sorted column changed)
+            tree_put(task_repository.get_task(task_id))
             messagebox.showinfo("Success", "Task updated successfully!")
             edit_window.destroy()
         except Exception as e:
@@ -598,12 +781,129 @@ def test_email():
         messagebox.showerror("Email Test", "Email test failed. Check the console for error details.")
 
 
+# Window for the people reminders can be shared with
+def open_recipients_window():
+    recipients_window = tk.Toplevel(root)
+    recipients_window.title("Recipients")
+    recipients_window.geometry("700x400")
+
+    recipients_tree = ttk.Treeview(recipients_window, columns=("Name", "Email", "Phone", "Channels"),
+                                   show="headings")
+    for heading in ("Name", "Email", "Phone", "Channels"):
+        recipients_tree.heading(heading, text=heading)
+    recipients_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+    def refresh():
+        children = recipients_tree.get_children()
+        if children:
+            recipients_tree.delete(*children)
+        for recipient in load_recipients(get_connection()):
+            recipients_tree.insert("", tk.END, iid=str(recipient.id),
+                                   values=(recipient.name, recipient.email or "", recipient.phone or "",
+                                           recipient.channels or "(default)"))
+
+    form_frame = tk.Frame(recipients_window)
+    form_frame.pack(pady=5)
+    entries = {}
+    for column, label in enumerate(("Name", "Email", "Phone", "Channels")):
+        tk.Label(form_frame, text=f"{label}:").grid(column=column, row=0, sticky="w", padx=5)
+        entries[label] = tk.Entry(form_frame, width=18)
+        entries[label].grid(column=column, row=1, padx=5)
+
+    def add():
+        name, email, phone, channels = (entries[label].get().strip() for label in ("Name", "Email", "Phone", "Channels"))
+        if not name or not (email or phone):
+            messagebox.showerror("Recipients", "Enter a name and an email address or phone number.",
+                                 parent=recipients_window)
+            return
+        with transaction() as conn:
+            add_recipient(conn, name, email or None, phone, channels)
+        for entry in entries.values():
+            entry.delete(0, tk.END)
+        refresh()
+
+    def delete():
+        selected = recipients_tree.selection()
+        if not selected:
+            return
+        if not messagebox.askyesno("Recipients", "Stop sending reminders to the selected recipient(s)?",
+                                   parent=recipients_window):
+            return
+        with transaction() as conn:
+            for iid in selected:
+                delete_recipient(conn, int(iid))
+        refresh()
+
+    button_frame = tk.Frame(recipients_window)
+    button_frame.pack(pady=5)
+    tk.Button(button_frame, text="Add Recipient", command=add).pack(side=tk.LEFT, padx=5)
+    tk.Button(button_frame, text="Delete Selected", command=delete).pack(side=tk.LEFT, padx=5)
+    tk.Label(recipients_window, text="Channels: comma-separated, e.g. email,sms; blank uses the default.").pack()
+    refresh()
+
+
+# Window with the timings and counts collected in metrics.py, refreshed while it is open
+STATS_REFRESH_MS = 1000
+
+def format_seconds(seconds):
+    return "" if seconds is None else f"{seconds * 1000:.2f}"
+
+def open_stats_window():
+    stats_window = tk.Toplevel(root)
+    stats_window.title("Stats")
+    stats_window.geometry("900x450")
+
+    columns = ("Metric", "Labels", "Count", "Mean ms", "p50 ms", "p95 ms", "Total s")
+    stats_tree = ttk.Treeview(stats_window, columns=columns, show="headings")
+    for heading in columns:
+        stats_tree.heading(heading, text=heading)
+        stats_tree.column(heading, width=90, anchor="e" if heading not in ("Metric", "Labels") else "w")
+    stats_tree.column("Metric", width=260)
+    stats_tree.column("Labels", width=160)
+    stats_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+    def refresh():
+        if not stats_window.winfo_exists():
+            return
+        rows = []
+        for entry in metrics.snapshot():
+            name = entry["name"].removeprefix("taskmanager_")
+            labels = ", ".join(f"{key}={value}" for key, value in entry["labels"].items())
+            if entry["type"] == "counter":
+                rows.append((name, labels, entry["value"], "", "", "", ""))
+            elif entry["count"]:
+                rows.append((name, labels, entry["count"], format_seconds(entry["sum"] / entry["count"]),
+                             format_seconds(entry["p50"]), format_seconds(entry["p95"]), f"{entry['sum']:.3f}"))
+        children = stats_tree.get_children()
+        if children:
+            stats_tree.delete(*children)
+        for row in rows:
+            stats_tree.insert("", tk.END, values=row)
+        stats_window.after(STATS_REFRESH_MS, refresh)
+
+    port = os.getenv("METRICS_PORT")
+    tk.Label(stats_window, text=f"Prometheus metrics: http://{metrics.METRICS_HOST}:{port}/metrics" if port
+             else "Set METRICS_PORT in .env to serve these as Prometheus metrics.").pack(pady=2)
+    refresh()
+
+# How late a root.after callback runs shows how busy the Tk thread is
+GUI_LAG_PROBE_MS = 500
+gui_lag_seconds = metrics.histogram("taskmanager_gui_loop_lag_seconds",
+                                    "How late the Tk event loop ran a scheduled callback")
+
+def probe_gui_lag(expected):
+    now = time.perf_counter()
+    gui_lag_seconds.observe(max(0.0, now - expected))
+    root.after(GUI_LAG_PROBE_MS, probe_gui_lag, now + GUI_LAG_PROBE_MS / 1000)
+
 #
 # Buttons and Status Update Controls
 tk.Button(root, text="Add Assignment", command=open_new_window).pack(pady=5)
 tk.Button(root, text="View Assignments by Class", command=open_view_by_class_window).pack(pady=5)
 tk.Button(root, text="Edit Selected Task", command=open_edit_window).pack(pady=5)
 tk.Button(root, text="Test Email Setup", command=test_email).pack(pady=5)
+tk.Button(root, text="Manage Recipients", command=open_recipients_window).pack(pady=5)
+tk.Button(root, text="Show Stats", command=open_stats_window).pack(pady=5)
 
 # --- Status Change Dropdown and Button ---
 status_frame = tk.Frame(root)
@@ -614,111 +914,257 @@ status_combobox = ttk.Combobox(status_frame, values=status_options, state="reado
 status_combobox.set(status_options[0])
 status_combobox.pack(side=tk.LEFT, padx=5)
 
-def update_task_status():
-    selected_item = tree.selection()
-    if not selected_item:
-        messagebox.showwarning("Update Status", "Please select a task to update its status.")
+def selected_task_ids(conn, status=None):
+    """
+    Return the task ids of the selected rows; a selected occurrence of a
+    series first gets a tasks row of its own, inside the caller's transaction
+
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction
+        status (str): Status for newly materialized occurrences
+
+    Returns:
+        tuple: (task ids, ids of the series whose occurrences were materialized)
+    """
+    task_ids, series_by_id = [], {}
+    for iid in tree.selection():
+        if iid.startswith("A"):
+            raise ValueError("archived tasks are read-only")
+        series_ref = parse_series_iid(iid)
+        if series_ref is None:
+            task_ids.append(int(iid))
+            continue
+        series_id, occurrence = series_ref
+        if series_id not in series_by_id:
+            series_by_id[series_id] = load_series(conn, series_id)[0]
+        series = series_by_id[series_id]
+        task_ids.append(materialize_occurrence(conn, series, occurrence_start(series, occurrence), status=status))
+    return task_ids, list(series_by_id)
+
+def refresh_selected(task_ids, series_ids):
+    # After a bulk edit: the rows and reminders of the edited tasks in one batch each
+    tree_remove_many([iid for iid in tree.selection() if parse_series_iid(iid)])
+    tree_put_many(task_repository.get_tasks(task_ids))
+    sync_task_reminders(task_ids)
+    for series_id in series_ids:
+        sync_series_reminder(series_id)
+    tree.selection_set([str(task_id) for task_id in task_ids if tree.exists(str(task_id))])
+
+def bulk_edit(title, edit, status=None):
+    # Apply edit(task_ids) to every selected row in one transaction
+    if not tree.selection():
+        messagebox.showwarning(title, "Please select one or more tasks.")
         return
-    new_status = status_combobox.get()
-    task_id = int(selected_item[0])
     try:
-        cursor.execute("UPDATE tasks SET status=? WHERE id=?", (new_status, task_id))
-        conn.commit()
-        values = list(tree.item(selected_item[0], "values"))
-        values[4] = new_status  # Status column
-        tree.item(selected_item[0], values=values, tags=(new_status,))
+        with transaction() as conn:
+            task_ids, series_ids = selected_task_ids(conn, status)
+            edit(task_ids)
+        refresh_selected(task_ids, series_ids)
     except Exception as e:
-        messagebox.showerror("Update Status", f"Failed to update status: {e}")
+        messagebox.showerror(title, f"Failed to update the selected tasks: {e}")
+
+def update_task_status():
+    new_status = status_combobox.get()
+    bulk_edit("Update Status", lambda task_ids: task_repository.update_status_many(task_ids, new_status),
+              status=new_status)
 
 tk.Button(status_frame, text="Update Status", command=update_task_status).pack(side=tk.LEFT, padx=5)
 
+# --- Bulk due date and reminder changes for the selected tasks ---
+bulk_frame = tk.Frame(root)
+bulk_frame.pack(pady=5)
+tk.Label(bulk_frame, text="Shift due by").pack(side=tk.LEFT)
+shift_days_spinbox = tk.Spinbox(bulk_frame, from_=-365, to=365, width=5)
+shift_days_spinbox.delete(0, tk.END)
+shift_days_spinbox.insert(0, "7")
+shift_days_spinbox.pack(side=tk.LEFT, padx=5)
+tk.Label(bulk_frame, text="days").pack(side=tk.LEFT)
+
+def shift_selected_due():
+    try:
+        days = int(shift_days_spinbox.get())
+    except ValueError:
+        messagebox.showerror("Shift Due Dates", "The number of days must be a whole number.")
+        return
+    bulk_edit("Shift Due Dates", lambda task_ids: task_repository.shift_due_many(task_ids, days))
+
+tk.Button(bulk_frame, text="Shift", command=shift_selected_due).pack(side=tk.LEFT, padx=5)
+tk.Label(bulk_frame, text="Remind").pack(side=tk.LEFT, padx=(15, 0))
+bulk_reminder_entry = tk.Entry(bulk_frame, width=5)
+bulk_reminder_entry.insert(0, "24")
+bulk_reminder_entry.pack(side=tk.LEFT, padx=5)
+tk.Label(bulk_frame, text="hours before due").pack(side=tk.LEFT)
+
+def set_selected_reminder_hours():
+    try:
+        reminder_hours = int(bulk_reminder_entry.get())
+    except ValueError:
+        messagebox.showerror("Set Reminder", "Reminder hours must be a whole number (0 for no reminder).")
+        return
+    bulk_edit("Set Reminder", lambda task_ids: task_repository.set_reminder_hours_many(task_ids, reminder_hours))
+
+tk.Button(bulk_frame, text="Set Reminder", command=set_selected_reminder_hours).pack(side=tk.LEFT, padx=5)
+
 # --- New functions for deleting tasks ---
 def delete_selected_task():
-    selected_item = tree.selection()
-    if not selected_item:
-        messagebox.showwarning("Delete Task", "Please select a task to delete.")
+    selected_items = tree.selection()
+    if not selected_items:
+        messagebox.showwarning("Delete Task", "Please select one or more tasks to delete.")
         return
-    task_id = selected_item[0]
-    # Remove from database
+    if len(selected_items) > 1 and not messagebox.askyesno(
+            "Delete Tasks", f"Delete the {len(selected_items)} selected tasks?"):
+        return
+    task_ids, archived_ids, series_ids = [], [], set()
     try:
-        cursor.execute("DELETE FROM tasks WHERE id=?", (int(task_id.lstrip('I')),))
-        conn.commit()
-        tree.delete(selected_item)
+        with transaction() as conn:
+            for iid in selected_items:
+                series_ref = parse_series_iid(iid)
+                if iid.startswith("A"):
+                    archived_ids.append(int(iid[1:]))
+                elif series_ref:
+                    # Deleting one occurrence of a series records it as skipped
+                    skip_occurrence(conn, *series_ref)
+                    series_ids.add(series_ref[0])
+                else:
+                    task_ids.append(int(iid))
+            # A materialized series occurrence is recorded as skipped so it doesn't come back
+            task_repository.delete_many(task_ids)
+            task_repository.delete_archived(archived_ids)
+        tree_remove_many(selected_items)
+        sync_task_reminders(task_ids)
+        for series_id in series_ids:
+            sync_series_reminder(series_id)
     except Exception as e:
         messagebox.showerror("Delete Task", f"Failed to delete task: {e}")
 
 def delete_all_tasks():
-    if not messagebox.askyesno("Delete All Tasks", "Are you sure you want to delete ALL tasks?"):
+    if not messagebox.askyesno("Delete All Tasks", "Are you sure you want to delete ALL tasks, archived ones included?"):
         return
     try:
-        cursor.execute("DELETE FROM tasks")
-        conn.commit()
-        for item in tree.get_children():
-            tree.delete(item)
+        task_repository.delete_all()
+        rebuild_reminder_jobs()
+        reload_tree()
     except Exception as e:
         messagebox.showerror("Delete All Tasks", f"Failed to delete all tasks: {e}")
 
+# --- Import and export ---
+TRANSFER_FILE_TYPES = [("CSV", "*.csv"), ("JSON Lines", "*.jsonl *.ndjson")]
+
+def import_tasks_file():
+    from tkinter import filedialog
+    import transfer
+    path = filedialog.askopenfilename(title="Import Tasks", filetypes=TRANSFER_FILE_TYPES)
+    if not path:
+        return
+    try:
+        stats = transfer.import_file(path)
+    except Exception as e:
+        messagebox.showerror("Import Tasks", f"Failed to import {os.path.basename(path)}: {e}")
+        return
+    rebuild_reminder_jobs()
+    reload_tree()
+    message = f"Imported {stats['tasks']} task(s) and {stats['series']} recurring series."
+    if stats["skipped"]:
+        message += f"\n{stats['skipped']} invalid record(s) were skipped."
+    messagebox.showinfo("Import Tasks", message)
+
+def export_tasks_file():
+    from tkinter import filedialog
+    import transfer
+    path = filedialog.asksaveasfilename(title="Export Tasks", defaultextension=".csv",
+                                        filetypes=TRANSFER_FILE_TYPES + [("iCalendar", "*.ics")])
+    if not path:
+        return
+    try:
+        transfer.export_file(path)
+    except Exception as e:
+        messagebox.showerror("Export Tasks", f"Failed to export {os.path.basename(path)}: {e}")
+        return
+    messagebox.showinfo("Export Tasks", f"Tasks exported to {os.path.basename(path)}.")
+
 # --- New buttons for deleting tasks ---
-tk.Button(root, text="Delete Selected Task", command=delete_selected_task).pack(pady=5)
+tk.Button(root, text="Delete Selected Tasks", command=delete_selected_task).pack(pady=5)
 tk.Button(root, text="Delete All Tasks", command=delete_all_tasks).pack(pady=5)
-
-# Initialize system tray icon
-setup_tray()
-
-
-def reminder_loop():
-    """Background loop to check for upcoming task reminders. Uses its own SQLite connection for thread safety."""
-    import sqlite3
-    local_conn = sqlite3.connect('tasks.db')
-    local_cursor = local_conn.cursor()
-    while True:
-        now = datetime.now()
-        # Also retrieve reminder_sent
-        local_cursor.execute('SELECT id, name, course, due, status, reminder_hours, reminder_sent FROM tasks')
-        tasks = local_cursor.fetchall()
-        for task in tasks:
-            task_id, name, course, due_str, status, reminder_hours, reminder_sent = task
-            if not reminder_hours:
-                continue  # Skip tasks without reminders
-
-            due = datetime.strptime(due_str, "%Y-%m-%d %H:%M:%S")
-            reminder_time = due - timedelta(hours=reminder_hours)
-
-            # Only send if the reminder time has passed, task is not completed, and not already reminded
-            if reminder_time <= now < due and status != "Completed" and (reminder_sent is None or reminder_sent == 0):
-                try:
-                    send_email(
-                        os.getenv("EMAIL_USER"),  # recipient email
-                        f"Reminder: {name} due soon",  # subject
-                        f"Your assignment '{name}' for {course} is due at {due.strftime('%m/%d/%y %I:%M %p')}."  # body
-                    )
-                    print(f"Reminder sent for task: {name}")
-                    # Mark as reminded to avoid multiple emails
-                    local_cursor.execute('UPDATE tasks SET reminder_sent=1 WHERE id=?', (task_id,))
-                    local_conn.commit()
-                except Exception as e:
-                    print(f"Failed to send reminder for {name}: {e}")
-
-        # --- Update tray icon tooltip with pending tasks count ---
+transfer_frame = tk.Frame(root)
+transfer_frame.pack(pady=5)
+tk.Button(transfer_frame, text="Import Tasks...", command=import_tasks_file).pack(side=tk.LEFT, padx=5)
+tk.Button(transfer_frame, text="Export Tasks...", command=export_tasks_file).pack(side=tk.LEFT, padx=5)
+
+startup_profile.mark("main window and first pages")
+
+def update_tray_title(pending_count):
+    # Called by pending_counter right after a task changes and when a pending task falls due
+    if 'tray_icon' in globals():
+        tray_icon.title = f"Task Manager - {pending_count} pending"
+
+# How often the change log is checked for writes made outside this window
+CHANGE_POLL_MS = 1000
+
+def apply_changes(changes):
+    # Bring the Treeview and the reminder jobs up to date with rows changed elsewhere
+    if changes.overflow:
+        reload_tree()
+        rebuild_reminder_jobs()
+    else:
+        rows = task_repository.get_tasks(changes.task_ids)
+        for row in rows:
+            tree_put(row)
+        missing = changes.task_ids - {int(row.iid) for row in rows}
+        for task_id in missing:
+            tree_remove(str(task_id))
+        if tree_view["archived"]:
+            # Tasks gone from the tasks table may have been archived
+            for row in task_repository.get_archived_tasks(missing):
+                tree_put(row)
+        conn = get_connection()
+        for series_id in changes.series_ids:
+            remove_series_items(series_id)
+            found = load_series(conn, series_id)
+            if found:
+                insert_series_items(found[0])
+            sync_series_reminder(series_id)
+        sync_task_reminders(list(changes.task_ids))
+    # The tray count is kept from this window's own writes; have it counted again
+    task_repository.notify_task_changed(None, None)
+
+def poll_changes():
+    try:
+        changes = change_feed.poll()
+        if changes is not None:
+            apply_changes(changes)
+    except Exception as e:
+        print(f"Failed to apply changes from tasks.db: {e}", file=sys.stderr)
+    root.after(CHANGE_POLL_MS, poll_changes)
+
+def start_background_services():
+    # Runs once the window is up, so the tray icon's imports and the reminder scan don't hold it back
+    setup_tray()
+    pending_counter.watch(update_tray_title)
+    startup_profile.mark("tray icon")
+    # Start the email delivery workers and schedule a reminder job for every pending task in the database
+    outbox.start_workers()
+    rebuild_reminder_jobs()
+    startup_profile.mark("outbox workers and reminder jobs")
+    # Finished tasks older than ARCHIVE_AFTER_DAYS move to the archive table, now and daily
+    archive.schedule(scheduler)
+    root.after(CHANGE_POLL_MS, poll_changes)
+    root.after(GUI_LAG_PROBE_MS, probe_gui_lag, time.perf_counter() + GUI_LAG_PROBE_MS / 1000)
+    metrics.start()
+    if os.getenv("FEED_PORT"):
+        # An optional service; a bad FEED_ setting or missing aiohttp must not stop the app
         try:
-            # Re-fetch tasks to get up-to-date info
-            local_cursor.execute('SELECT status, due FROM tasks')
-            all_tasks = local_cursor.fetchall()
-            pending_count = 0
-            for status, due_str in all_tasks:
-                try:
-                    due = datetime.strptime(due_str, "%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    continue
-                if status != "Completed" and due > now:
-                    pending_count += 1
-            # Update tray icon tooltip
-            if 'tray_icon' in globals():
-                tray_icon.title = f"Task Manager - {pending_count} pending"
-        except Exception as e:
-            # Silently ignore errors in tray update
-            pass
+            import feed_server
+            feed_server.start()
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Could not start the calendar feed: {e}", file=sys.stderr)
+
+def finish_startup_profile():
+    startup_profile.report()
+    root.destroy()
+
+root.after_idle(startup_profile.mark, "first window draw")
+root.after_idle(start_background_services)
+if startup_profile.ENABLED:
+    root.after_idle(finish_startup_profile)
 
-        time.sleep(60)  # Check every minute
-threading.Thread(target=reminder_loop, daemon=True).start()
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Timing histograms and counters for Task Manager
+The hot paths (tasks.db queries and transactions, the reminder engine, the
+outbox workers, each SMTP step, recurrence expansion and Treeview fills)
+record into the metrics defined here. Recording is a perf_counter() pair,
+a bisect and an uncontended lock, so it is always on. The numbers can be
+read in the app's stats window, or scraped as Prometheus text from
+http://127.0.0.1:METRICS_PORT/metrics when METRICS_PORT is set (e.g. for the
+headless daemon).
+"""
+import bisect
+import os
+import threading
+import time
+import logging
+from functools import wraps
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Upper bounds in seconds, from a quick index lookup to a slow SMTP login
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, 30.0, 60.0)
+
+_families = {}
+_families_lock = threading.Lock()
+_server = None
+
+
+class Histogram:
+    """Distribution of one timed operation; buckets are per bound, made cumulative on export."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes how long its block took."""
+        return _Timer(self)
+
+    def timed(self, func):
+        """Decorator that observes every call of func."""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started)
+        return wrapper
+
+    def time_iter(self, iterable):
+        """Yield from iterable, observing the time spent producing the items once it is exhausted or closed."""
+        iterator = iter(iterable)
+        elapsed = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            self.observe(elapsed)
+
+    def quantile(self, q):
+        """Estimate the q quantile (0-1) from the buckets, as Prometheus' histogram_quantile does."""
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank, seen = q * count, 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class Counter:
+    """A count that only goes up."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Family:
+    """
+    A named metric and its children, one per set of label values. Children
+    are created on first use and kept, so callers on a hot path can hold on
+    to the one they use.
+    """
+
+    def __init__(self, name, help, kind, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.buckets = buckets
+        self.children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """Return the child for these label values."""
+        key = tuple(sorted(labels.items()))
+        child = self.children.get(key)
+        if child is None:
+            with self._lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self.children[key] = child
+        return child
+
+    def items(self):
+        """Return (label pairs, child) for every child, sorted by labels."""
+        with self._lock:
+            return sorted(self.children.items(), key=lambda item: item[0])
+
+    # Shortcuts for the unlabelled child
+    def observe(self, seconds):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+    def timed(self, func):
+        return self.labels().timed(func)
+
+    def time_iter(self, iterable):
+        return self.labels().time_iter(iterable)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+def _family(name, help, kind, buckets=DEFAULT_BUCKETS):
+    with _families_lock:
+        family = _families.get(name)
+        if family is None:
+            family = _families[name] = Family(name, help, kind, buckets)
+        return family
+
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    """
+    Return the histogram family called name, creating it on first use
+
+    Args:
+        name (str): Prometheus metric name, ending in _seconds for timings
+        help (str): One-line description
+        buckets (tuple): Ascending bucket upper bounds
+
+    Returns:
+        Family: The family; use .labels(...) for a labelled child
+    """
+    return _family(name, help, "histogram", buckets)
+
+
+def counter(name, help):
+    """Return the counter family called name (ending in _total), creating it on first use."""
+    return _family(name, help, "counter")
+
+
+def snapshot():
+    """
+    Return the current value of every metric, for display
+
+    Returns:
+        list: Dicts with name, labels and type, plus count, sum, p50 and p95 (seconds) for
+            histograms or value for counters, ordered by name
+    """
+    with _families_lock:
+        families = sorted(_families.values(), key=lambda family: family.name)
+    result = []
+    for family in families:
+        for key, child in family.items():
+            entry = {"name": family.name, "labels": dict(key), "type": family.kind}
+            if family.kind == "histogram":
+                entry.update(count=child.count, sum=child.sum, p50=child.quantile(0.5), p95=child.quantile(0.95))
+            else:
+                entry["value"] = child.value
+            result.append(entry)
+    return result
+
+
+def _label_text(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _families_lock:
+        families = sorted(_families.values(), key=lambda family: family.name)
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for key, child in family.items():
+            if family.kind == "counter":
+                lines.append(f"{family.name}{_label_text(key)} {child.value}")
+                continue
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip((*family.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{family.name}_bucket{_label_text(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{family.name}_sum{_label_text(key)} {total}")
+            lines.append(f"{family.name}_count{_label_text(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def serve(port, host=METRICS_HOST):
+    """
+    Serve render() at /metrics on a background thread (once per process)
+
+    Args:
+        port (int): TCP port
+        host (str): Interface to listen on; only this machine by default
+
+    Returns:
+        http.server.ThreadingHTTPServer: The running server
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # A scrape every few seconds would flood the log
+
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), MetricsHandler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Serving metrics at http://{host}:{port}/metrics")
+    return _server
+
+
+def start():
+    """
+    Serve the metrics endpoint if METRICS_PORT is set; see serve(). A port
+    that is taken or invalid is logged rather than raised, so it can't stop
+    the services started after it.
+
+    Returns:
+        http.server.ThreadingHTTPServer: The running server, or None
+    """
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return serve(int(port))
+    except (OSError, ValueError) as e:
+        logging.error(f"Could not serve metrics on {METRICS_HOST}:{port}: {e}")
+        return None
@@ -0,0 +1,386 @@
+"""
+Schema migrations for tasks.db
+The database's PRAGMA user_version records how many migrations it has had.
+At startup each newer migration runs once, in its own transaction together
+with the user_version bump, so a crash never leaves a half-applied step.
+Databases created before migrations existed start at version 0; the early
+steps only add what such a database is missing.
+"""
+import logging
+from task_repository import get_connection, transaction
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_column(conn, table, definition):
+    # Add a column unless the table already has it; returns True if it was added
+    if definition.split()[0] in _columns(conn, table):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {definition}')
+    return True
+
+
+def _create_tasks(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            course TEXT,
+            start TEXT,
+            due TEXT,
+            status TEXT,
+            recurrence_days INTEGER
+        )
+    ''')
+    _add_column(conn, 'tasks', 'reminder_hours INTEGER DEFAULT 24')
+    if _add_column(conn, 'tasks', 'reminder_sent INTEGER DEFAULT 0'):
+        # Mark tasks whose reminder time has already passed as reminded. due is local time.
+        conn.execute('''
+            UPDATE tasks
+            SET reminder_sent = 1
+            WHERE (reminder_sent IS NULL OR reminder_sent = 0)
+              AND datetime(due, '-' || reminder_hours || ' hours') < datetime('now', 'localtime')
+        ''')
+    # due minus reminder_hours, stored so the reminder engine can let SQLite pick the due rows
+    if _add_column(conn, 'tasks', 'reminder_at TEXT'):
+        conn.execute('''
+            UPDATE tasks
+            SET reminder_at = datetime(due, '-' || reminder_hours || ' hours')
+            WHERE reminder_hours > 0
+        ''')
+
+
+def _create_outbox(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            recipient TEXT,
+            subject TEXT,
+            body TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TEXT,
+            last_error TEXT,
+            created_at TEXT,
+            sent_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+        ON outbox (next_attempt_at)
+        WHERE status = 'pending'
+    ''')
+
+
+def _create_series(conn):
+    # Recurring series rules and the columns tying materialized occurrences to them
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS series
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            course TEXT,
+            status TEXT,
+            recurrence_days INTEGER,
+            start TEXT,
+            due TEXT,
+            end_date TEXT,
+            reminder_hours INTEGER DEFAULT 24
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS series_skips
+        (
+            series_id INTEGER,
+            occurrence TEXT,
+            PRIMARY KEY (series_id, occurrence)
+        )
+    ''')
+    _add_column(conn, 'tasks', 'series_id INTEGER')
+    _add_column(conn, 'tasks', 'occurrence TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_series_occurrence
+        ON tasks (series_id, occurrence)
+        WHERE series_id IS NOT NULL
+    ''')
+
+
+def _create_listing_indexes(conn):
+    # One index per sortable Treeview column, so every page is an index range scan
+    for column in ("name", "course", "start", "due", "status"):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_tasks_{column} ON tasks ({column})')
+    # View by Class
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_course_due ON tasks (course, due)')
+
+
+def _add_epoch_columns(conn):
+    # Start, due and reminder time as UTC epoch seconds, so range scans and comparisons
+    # run on integers in SQLite and nothing has to parse the text columns. The text
+    # columns are local time; the 'utc' modifier converts them.
+    _add_column(conn, 'tasks', 'start_ts INTEGER')
+    _add_column(conn, 'tasks', 'due_ts INTEGER')
+    _add_column(conn, 'tasks', 'reminder_ts INTEGER')
+    conn.execute('''
+        UPDATE tasks
+        SET start_ts = CAST(strftime('%s', start, 'utc') AS INTEGER),
+            due_ts = CAST(strftime('%s', due, 'utc') AS INTEGER)
+    ''')
+    conn.execute('''
+        UPDATE tasks
+        SET reminder_ts = CASE WHEN reminder_hours > 0 THEN due_ts - reminder_hours * 3600 END
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_start_ts ON tasks (start_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_due_ts ON tasks (due_ts)')
+    # Partial index covering only reminders that can still fire; replaces the reminder_at one
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending_reminder_ts
+        ON tasks (reminder_ts)
+        WHERE reminder_sent = 0 AND status != 'Completed'
+    ''')
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_pending_reminder')
+
+
+def _add_pending_due_index(conn):
+    # Lets the pending-task count and the next pending due time be read from the index alone
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending_due
+        ON tasks (due_ts)
+        WHERE status != 'Completed'
+    ''')
+
+
+def _create_search_index(conn):
+    # Full-text indexes over the name and class of tasks and series for the search box. They are
+    # external-content tables: the text stays in tasks/series, and triggers keep the index in sync.
+    for table in ("tasks", "series"):
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+                name, course, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, name, course) VALUES (new.id, new.name, new.course);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, name, course)
+                VALUES ('delete', old.id, old.name, old.course);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF name, course ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, name, course)
+                VALUES ('delete', old.id, old.name, old.course);
+                INSERT INTO {table}_fts (rowid, name, course) VALUES (new.id, new.name, new.course);
+            END
+        """)
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def _add_notification_channels(conn):
+    # The channels an outbox message still has to go out on (NULL for the configured default),
+    # and one row per channel per delivery attempt with how long the provider took
+    _add_column(conn, 'outbox', 'channels TEXT')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS deliveries
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            outbox_id INTEGER NOT NULL,
+            channel TEXT NOT NULL,
+            ok INTEGER NOT NULL,
+            latency_ms REAL,
+            error TEXT,
+            attempted_at TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_deliveries_outbox ON deliveries (outbox_id)')
+
+
+def _create_recipients(conn):
+    # People reminders go to besides the owner, and which tasks and series are shared with whom.
+    # Deleting a task, series or recipient deletes its mappings.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS recipients
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT,
+            phone TEXT,
+            channels TEXT
+        )
+    ''')
+    for owner in ("task", "series"):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {owner}_recipients
+            (
+                {owner}_id INTEGER NOT NULL,
+                recipient_id INTEGER NOT NULL,
+                PRIMARY KEY ({owner}_id, recipient_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{owner}_recipients_recipient ON {owner}_recipients (recipient_id)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_recipients_delete AFTER DELETE ON tasks BEGIN
+            DELETE FROM task_recipients WHERE task_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS series_recipients_delete AFTER DELETE ON series BEGIN
+            DELETE FROM series_recipients WHERE series_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS recipients_delete AFTER DELETE ON recipients BEGIN
+            DELETE FROM task_recipients WHERE recipient_id = old.id;
+            DELETE FROM series_recipients WHERE recipient_id = old.id;
+        END
+    ''')
+    # Phone number for the SMS channel, next to the email address in recipient
+    _add_column(conn, 'outbox', 'phone TEXT')
+
+
+def _add_outbox_priority(conn):
+    # Due time (epoch seconds) of the task a message is about, so the most urgent goes first
+    # when the send budget is short
+    _add_column(conn, 'outbox', 'due_ts INTEGER')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending_due
+        ON outbox (due_ts, next_attempt_at)
+        WHERE status = 'pending'
+    ''')
+
+
+def _create_change_log(conn):
+    # Every insert, visible update and delete of a task or series, so other windows and processes
+    # can apply just what changed (see change_feed.py). A skipped occurrence counts as a series update.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS changes
+        (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            series_id INTEGER,
+            op TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_changes_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO changes (tbl, row_id, series_id, op) VALUES ('tasks', new.id, new.series_id, 'insert');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_changes_update AFTER UPDATE OF name, course, start, due, status, reminder_ts ON tasks
+        BEGIN
+            INSERT INTO changes (tbl, row_id, series_id, op) VALUES ('tasks', new.id, new.series_id, 'update');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS tasks_changes_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO changes (tbl, row_id, series_id, op) VALUES ('tasks', old.id, old.series_id, 'delete');
+        END
+    ''')
+    for op, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS series_changes_{op} AFTER {op.upper()} ON series BEGIN
+                INSERT INTO changes (tbl, row_id, series_id, op) VALUES ('series', {row}.id, {row}.id, '{op}');
+            END
+        ''')
+    for op, row in (("insert", "new"), ("delete", "old")):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS series_skips_changes_{op} AFTER {op.upper()} ON series_skips BEGIN
+                INSERT INTO changes (tbl, row_id, series_id, op)
+                VALUES ('series', {row}.series_id, {row}.series_id, 'update');
+            END
+        ''')
+
+
+def _create_archive(conn):
+    # Done tasks older than ARCHIVE_AFTER_DAYS move here (see archive.py), so the tasks table and its
+    # indexes only hold active work. Rows keep their task id, which AUTOINCREMENT never hands out again.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive
+        (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            course TEXT,
+            start TEXT,
+            due TEXT,
+            status TEXT,
+            recurrence_days INTEGER,
+            reminder_hours INTEGER,
+            series_id INTEGER,
+            occurrence TEXT,
+            start_ts INTEGER,
+            due_ts INTEGER,
+            archived_at TEXT
+        )
+    ''')
+    # The same listing, View by Class and search indexes as tasks, for "Include archived"
+    for column in ("name", "course", "start", "due", "status", "due_ts"):
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_archive_{column} ON archive ({column})')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_archive_course_due ON archive (course, due)')
+    # An archived occurrence still overrides the generated one
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_archive_series ON archive (series_id, occurrence) '
+                 'WHERE series_id IS NOT NULL')
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5(
+            name, course, content='archive', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS archive_fts_insert AFTER INSERT ON archive BEGIN
+            INSERT INTO archive_fts (rowid, name, course) VALUES (new.id, new.name, new.course);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS archive_fts_delete AFTER DELETE ON archive BEGIN
+            INSERT INTO archive_fts (archive_fts, rowid, name, course) VALUES ('delete', old.id, old.name, old.course);
+        END
+    """)
+
+
+# In order; a database at user_version N has had the first N applied. Only append.
+MIGRATIONS = [
+    _create_tasks,
+    _create_outbox,
+    _create_series,
+    _create_listing_indexes,
+    _add_epoch_columns,
+    _add_pending_due_index,
+    _create_search_index,
+    _add_notification_channels,
+    _create_recipients,
+    _add_outbox_priority,
+    _create_change_log,
+    _create_archive,
+]
+
+
+def migrate():
+    """
+    Bring tasks.db up to the latest schema version
+
+    Returns:
+        int: The schema version after migrating
+    """
+    conn = get_connection()
+    while True:
+        with transaction():
+            # Read the version under the write lock, so two processes starting together
+            # don't both apply the same migration
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version >= len(MIGRATIONS):
+                return version
+            migration = MIGRATIONS[version]
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version + 1}')
+        logging.info(f"Applied database migration {version + 1}: {migration.__name__.lstrip('_')}")
@@ -0,0 +1,255 @@
+"""
+Notification channels for Task Manager
+A reminder is delivered over one or more channels (email, SMS, ...). Each
+channel is a Notifier; dispatch() sends a recipient's batch of messages to
+all of its channels concurrently on an asyncio event loop, so a slow
+provider only costs its own time, and gives up on a channel after its
+timeout. Every attempt's latency is returned to the caller, which records it.
+A message whose outcome can't be known (it was still being handed to the
+provider when the channel timed out) is reported as unknown, not failed, so
+it isn't sent again.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import metrics
+
+# Channels a reminder goes to unless its outbox row names others
+NOTIFY_CHANNELS = os.getenv("NOTIFY_CHANNELS", "email")
+
+# Result of one channel's attempt; ok is True, False, or None when it is unknown whether the
+# message went out, latency is in seconds and error is None on success. skipped is True when the
+# channel could never deliver to this recipient (no address for it), so trying again is pointless
+Delivery = namedtuple("Delivery", "channel ok latency error skipped", defaults=(False,))
+
+_notify_seconds = metrics.histogram("taskmanager_notify_seconds", "Time a channel took to deliver one message")
+_notifications_total = metrics.counter("taskmanager_notifications_total", "Messages delivered, by channel and result")
+
+
+class Notifier:
+    """
+    A notification channel. Subclasses implement send() as a coroutine that
+    raises on failure, and may override send_batch() to share a connection
+    across one recipient's messages.
+    """
+
+    name = None
+    # Seconds allowed per message
+    timeout = 30
+
+    def address(self, recipient):
+        """Return where this channel reaches a recipient (anything with email and phone), or None."""
+        return recipient.email
+
+    async def send(self, address, subject, body):
+        raise NotImplementedError
+
+    async def send_batch(self, address, messages):
+        """
+        Send several messages to one address, in order
+
+        Args:
+            address (str): From address()
+            messages (list): (subject, body) tuples
+
+        Returns:
+            list: (ok, error or None, seconds taken) per message; ok is None when the outcome is unknown
+        """
+        results = []
+        for subject, body in messages:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.send(address, subject, body), self.timeout)
+                ok, error = True, None
+            except asyncio.TimeoutError:
+                # The send is cancelled, but the provider may already have accepted the message
+                # (e.g. Twilio created the SMS and the response was slow), so it isn't sent again
+                ok, error = None, f"timed out after {self.timeout:g} s"
+            except Exception as e:
+                ok, error = False, str(e) or type(e).__name__
+            results.append((ok, error, time.perf_counter() - started))
+        return results
+
+
+class EmailNotifier(Notifier):
+    """Sends through email_utils.send_email on a worker thread, over that thread's SMTP session."""
+
+    name = "email"
+    timeout = int(os.getenv("EMAIL_TIMEOUT_SECONDS", "30"))
+
+    async def send(self, address, subject, body):
+        from email_utils import send_email
+        # smtplib blocks; a send that times out here still finishes (or fails) on its thread
+        if not await asyncio.to_thread(send_email, address, subject, body):
+            raise RuntimeError("send_email reported a failure")
+
+    async def send_batch(self, address, messages):
+        from email_utils import send_email
+        results = []
+        lock = threading.Lock()
+        progress = {"started": 0, "cancelled": False}
+
+        # The whole batch goes out from one thread, so it shares that thread's SMTP session. The thread
+        # can't be stopped, so on timeout it is told not to start another message, and the results it
+        # has reported so far are kept
+        def send_all():
+            for subject, body in messages:
+                with lock:
+                    if progress["cancelled"]:
+                        return
+                    progress["started"] += 1
+                started = time.perf_counter()
+                sent = send_email(address, subject, body)
+                with lock:
+                    results.append((sent, None if sent else "send_email reported a failure",
+                                    time.perf_counter() - started))
+
+        started = time.perf_counter()
+        timeout = self.timeout * len(messages)
+        try:
+            await asyncio.wait_for(asyncio.to_thread(send_all), timeout)
+            return results
+        except asyncio.TimeoutError:
+            with lock:
+                progress["cancelled"] = True
+                done, in_flight = list(results), progress["started"] - len(results)
+        elapsed = time.perf_counter() - started
+        # The message being sent may still go out; only the ones never started are safe to retry
+        unknown = [(None, f"timed out after {timeout:g} s while sending", elapsed)] * in_flight
+        not_started = [(False, f"not sent, batch timed out after {timeout:g} s", elapsed)]
+        return done + unknown + not_started * (len(messages) - len(done) - in_flight)
+
+
+class SMSNotifier(Notifier):
+    """
+    Sends a text message through Twilio's asynchronous (aiohttp) client.
+    Needs TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_FROM in .env, and a
+    phone number for the recipient (SMS_TO for the owner).
+    """
+
+    name = "sms"
+    timeout = int(os.getenv("SMS_TIMEOUT_SECONDS", "15"))
+
+    def __init__(self):
+        # One client per event loop, since its aiohttp session belongs to the loop it was made on
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def address(self, recipient):
+        return recipient.phone
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                from twilio.rest import Client
+                from twilio.http.async_http_client import AsyncTwilioHttpClient
+                client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"),
+                                http_client=AsyncTwilioHttpClient(timeout=self.timeout))
+                self._clients[loop] = client
+            return client
+
+    async def send(self, address, subject, body):
+        if not os.getenv("TWILIO_ACCOUNT_SID") or not os.getenv("TWILIO_FROM"):
+            raise RuntimeError("TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN or TWILIO_FROM not found in .env file")
+        await self._client().messages.create_async(to=address, from_=os.getenv("TWILIO_FROM"),
+                                                   body=f"{subject}\n{body}")
+
+
+class FakeNotifier(Notifier):
+    """
+    Local channel that delivers nothing and keeps what it was sent in
+    `sent`, for tests and benchmarks. `delay` simulates a slow provider and
+    `fail` a broken one; `name` lets several be registered side by side.
+    """
+
+    def __init__(self, delay=0.0, fail=False, name="fake", timeout=5):
+        self.delay = delay
+        self.fail = fail
+        self.name = name
+        self.timeout = timeout
+        self.sent = []
+
+    async def send(self, address, subject, body):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("fake channel failure")
+        self.sent.append((address, subject, body))
+
+
+_notifiers = {notifier.name: notifier for notifier in (EmailNotifier(), SMSNotifier(), FakeNotifier())}
+
+
+def register_notifier(notifier):
+    """
+    Add a channel, or replace the one with the same name (e.g. with a
+    FakeNotifier in a test)
+
+    Args:
+        notifier (Notifier): The channel; its name is what outbox rows refer to
+    """
+    _notifiers[notifier.name] = notifier
+
+
+def get_notifier(name):
+    """Return the channel registered under name, or None."""
+    return _notifiers.get(name)
+
+
+def parse_channels(channels):
+    """Return a comma-separated channel list (None for NOTIFY_CHANNELS) as a list of names."""
+    return [name.strip() for name in (channels or NOTIFY_CHANNELS).split(",") if name.strip()]
+
+
+async def _send_channel(name, recipient, messages):
+    started = time.perf_counter()
+    notifier = _notifiers.get(name)
+    if notifier is not None and not notifier.address(recipient):
+        return [(False, f"No address for channel '{name}'", 0.0, True)] * len(messages)
+    try:
+        if notifier is None:
+            raise LookupError(f"Unknown notification channel '{name}'")
+        results = await notifier.send_batch(notifier.address(recipient), messages)
+        return [(ok, error, seconds, False) for ok, error, seconds in results]
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return [(False, error, time.perf_counter() - started, False)] * len(messages)
+
+
+async def dispatch(channels, recipient, messages):
+    """
+    Send one recipient's messages over several channels at once
+
+    Args:
+        channels (list): Channel names
+        recipient: Anything with email and phone attributes, e.g. a recipients.Recipient
+        messages (list): (subject, body) tuples
+
+    Returns:
+        list: For each message, a list with a Delivery per channel
+    """
+    results = await asyncio.gather(*(_send_channel(name, recipient, messages) for name in channels))
+    deliveries = [[Delivery(name, ok, latency, error, skipped)
+                   for name, (ok, error, latency, skipped) in zip(channels, outcomes)]
+                  for outcomes in zip(*results)] if channels else [[] for _ in messages]
+    for (subject, _), outcome in zip(messages, deliveries):
+        for delivery in outcome:
+            _notify_seconds.labels(channel=delivery.channel).observe(delivery.latency)
+            result = ("ok" if delivery.ok else "unknown" if delivery.ok is None
+                      else "skipped" if delivery.skipped else "failed")
+            _notifications_total.labels(channel=delivery.channel, result=result).inc()
+            if delivery.ok:
+                logging.info(f"Sent '{subject}' via {delivery.channel} in {delivery.latency * 1000:.0f} ms")
+            elif delivery.ok is None:
+                logging.warning(f"Sending '{subject}' via {delivery.channel} may or may not have succeeded, "
+                                f"not retrying: {delivery.error}")
+            elif delivery.skipped:
+                logging.warning(f"Skipped '{subject}' via {delivery.channel}: {delivery.error}")
+            else:
+                logging.warning(f"Sending '{subject}' via {delivery.channel} failed after "
+                                f"{delivery.latency * 1000:.0f} ms: {delivery.error}")
+    return deliveries
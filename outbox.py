@@ -0,0 +1,278 @@
+"""
+Durable outbox for Task Manager notifications
+Reminders are written to the outbox table in the same transaction that marks the
+task as reminded, and a small pool of worker threads delivers them with retries.
+A message goes out on all of its notification channels at once; channels that
+fail are retried on their own, so the others never get a duplicate. Workers
+claim a recipient's due messages together and send them as one batch over
+one connection per channel, most urgent task first. A message a channel may
+or may not have delivered (it timed out mid-send) is not retried on that
+channel; if no channel failed outright it ends up 'unknown' rather than
+'sent', so it is never sent twice. Email is paced by
+email_utils.email_limiter: a worker claims no more email than the limiter
+has budget for, and while it has none, only messages for other channels.
+"""
+import asyncio
+import sqlite3
+import threading
+import logging
+import uuid
+from datetime import datetime, timedelta
+import metrics
+import notifiers
+import task_repository
+from email_utils import email_limiter
+from recipients import Recipient
+
+# Number of delivery threads; each keeps its own SMTP session and event loop
+OUTBOX_WORKERS = 3
+# Most messages to one recipient claimed and sent together
+OUTBOX_BATCH_SIZE = 50
+# Attempts before a message is moved to the dead letter state
+OUTBOX_MAX_ATTEMPTS = 6
+# Retry delay is OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), capped at OUTBOX_MAX_BACKOFF_SECONDS
+OUTBOX_BACKOFF_SECONDS = 30
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
+# Longest a worker sleeps before checking the table again when nothing wakes it
+OUTBOX_POLL_SECONDS = 60
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_step_seconds = metrics.histogram("taskmanager_outbox_step_seconds",
+                                  "Time an outbox worker spent claiming or delivering a batch")
+_delay_seconds = metrics.histogram("taskmanager_outbox_delay_seconds",
+                                   "Time a due message waited in the outbox before delivery started",
+                                   buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600))
+
+_wakeup = threading.Condition()
+_wakeup_count = 0
+_stop = threading.Event()
+_workers = []
+
+
+def enqueue(conn, idempotency_key, recipient, subject, body, channels=None, phone=None, due_ts=None):
+    """
+    Add a message to the outbox on the caller's connection without committing,
+    so it can share a transaction with other writes. A message whose key is
+    already in the outbox is ignored.
+
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction
+        idempotency_key (str): Unique key identifying this notification
+        recipient (str): Recipient email address
+        subject (str): Email subject
+        body (str): Email body content
+        channels (str): Comma-separated notification channels, or None for notifiers.NOTIFY_CHANNELS
+        phone (str): Recipient phone number, for the SMS channel
+        due_ts (int): Due time of the task the message is about, in epoch seconds; earlier goes first
+
+    Returns:
+        bool: True if a new message was added
+    """
+    now = datetime.now().strftime(TIME_FORMAT)
+    channels = ",".join(notifiers.parse_channels(channels)) if channels else None
+    cur = conn.execute(
+        'INSERT OR IGNORE INTO outbox (idempotency_key, recipient, phone, subject, body, channels, due_ts, '
+        'next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (idempotency_key or uuid.uuid4().hex, recipient, phone, subject, body, channels, due_ts, now, now)
+    )
+    return cur.rowcount == 1
+
+
+def notify():
+    """Wake the delivery workers after new messages were committed."""
+    global _wakeup_count
+    with _wakeup:
+        _wakeup_count += 1
+        _wakeup.notify_all()
+
+
+def _claim(conn):
+    # Atomically pick the most urgent due message, plus more due messages for the same recipient
+    # and channels up to OUTBOX_BATCH_SIZE (and the email budget), and mark them as being sent
+    now = datetime.now().strftime(TIME_FORMAT)
+    budget = email_limiter.available()
+    where = "status = 'pending' AND next_attempt_at <= ?"
+    params = [now]
+    if not budget:
+        where += " AND ',' || COALESCE(channels, ?) || ',' NOT LIKE '%,email,%'"
+        params.append(notifiers.NOTIFY_CHANNELS.replace(" ", ""))
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        first = conn.execute(f'''
+            SELECT recipient, phone, channels FROM outbox
+            WHERE {where}
+            ORDER BY due_ts IS NULL, due_ts, next_attempt_at
+            LIMIT 1
+        ''', params).fetchone()
+        rows = []
+        if first is not None:
+            limit = OUTBOX_BATCH_SIZE
+            if "email" in notifiers.parse_channels(first[2]):
+                limit = min(limit, budget)
+            rows = conn.execute(f'''
+                SELECT id, subject, body, attempts, next_attempt_at FROM outbox
+                WHERE {where} AND recipient IS ? AND phone IS ? AND channels IS ?
+                ORDER BY due_ts IS NULL, due_ts, next_attempt_at
+                LIMIT ?
+            ''', (*params, *first, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return first, rows
+
+
+def _next_due_in(conn):
+    # Seconds until the earliest pending retry, bounded by the poll interval
+    row = conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+    if row[0] is None:
+        return OUTBOX_POLL_SECONDS
+    wait = (datetime.strptime(row[0], TIME_FORMAT) - datetime.now()).total_seconds()
+    return min(max(wait, 0.5), OUTBOX_POLL_SECONDS)
+
+
+def _deliver(conn, loop, recipient, phone, channels, rows):
+    started = datetime.now()
+    for row in rows:
+        _delay_seconds.observe(max(0.0, (started - datetime.strptime(row[4], TIME_FORMAT)).total_seconds()))
+    deliveries = loop.run_until_complete(notifiers.dispatch(
+        notifiers.parse_channels(channels), Recipient(None, None, recipient, phone, channels),
+        [(subject, body) for _, subject, body, _, _ in rows]))
+
+    now = datetime.now()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for (message_id, subject, body, attempts, _), outcome in zip(rows, deliveries):
+            _record(conn, message_id, recipient, channels, attempts + 1, outcome, now)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _record(conn, message_id, recipient, channels, attempts, deliveries, now):
+    # A channel skipped for lack of an address is not retried; the message goes dead if it had nothing else
+    skipped = [delivery for delivery in deliveries if delivery.skipped]
+    failed = [delivery for delivery in deliveries if delivery.ok is False and not delivery.skipped]
+    unknown = [delivery for delivery in deliveries if delivery.ok is None]
+    error = "; ".join(f"{delivery.channel}: {delivery.error}" for delivery in failed + unknown + skipped) or None
+    # deliveries.ok is 1 for delivered, 0 for failed and -1 when it is unknown whether the message went out
+    conn.executemany(
+        'INSERT INTO deliveries (outbox_id, channel, ok, latency_ms, error, attempted_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(message_id, delivery.channel, -1 if delivery.ok is None else delivery.ok, delivery.latency * 1000,
+          delivery.error, now.strftime(TIME_FORMAT)) for delivery in deliveries]
+    )
+    # Only the channels that failed are tried again; one that may have delivered is not
+    remaining = ",".join(delivery.channel for delivery in failed) or channels
+    if skipped and len(skipped) == len(deliveries):
+        conn.execute("UPDATE outbox SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                     (attempts, error, message_id))
+        logging.error(f"Giving up on outbox message {message_id}: {recipient} has no address for it: {error}")
+    elif not failed:
+        conn.execute("UPDATE outbox SET status = ?, attempts = ?, sent_at = ?, last_error = ? WHERE id = ?",
+                     ("unknown" if unknown else "sent", attempts, now.strftime(TIME_FORMAT), error, message_id))
+        if unknown:
+            logging.error(f"Outbox message {message_id} to {recipient} may not have been delivered, "
+                          f"not retrying: {error}")
+    elif attempts >= OUTBOX_MAX_ATTEMPTS:
+        conn.execute("UPDATE outbox SET status = 'dead', attempts = ?, channels = ?, last_error = ? WHERE id = ?",
+                     (attempts, remaining, error, message_id))
+        logging.error(f"Giving up on outbox message {message_id} to {recipient} after {attempts} attempts: {error}")
+    else:
+        delay = min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS)
+        conn.execute("UPDATE outbox SET status = 'pending', attempts = ?, channels = ?, next_attempt_at = ?, "
+                     "last_error = ? WHERE id = ?",
+                     (attempts, remaining, (now + timedelta(seconds=delay)).strftime(TIME_FORMAT), error,
+                      message_id))
+        logging.warning(f"Outbox message {message_id} to {recipient} failed (attempt {attempts}), "
+                        f"retrying in {delay} s: {error}")
+
+
+def _release(conn, rows, error):
+    # Put claimed messages a worker failed on back to pending with the usual backoff, so they
+    # don't sit in 'sending' until the next start; a message that keeps failing goes dead
+    now = datetime.now()
+    params = []
+    for message_id, _, _, attempts, _ in rows:
+        attempts += 1
+        delay = min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS)
+        params.append(("dead" if attempts >= OUTBOX_MAX_ATTEMPTS else "pending", attempts,
+                       (now + timedelta(seconds=delay)).strftime(TIME_FORMAT), error, message_id))
+    conn.executemany("UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                     "WHERE id = ? AND status = 'sending'", params)
+
+
+def _worker_loop():
+    conn = task_repository.connect(isolation_level=None)
+    loop = asyncio.new_event_loop()
+    try:
+        while not _stop.is_set():
+            rows = []
+            try:
+                seen = _wakeup_count
+                with _step_seconds.labels(step="claim").time():
+                    first, rows = _claim(conn)
+                if not rows:
+                    wait = _next_due_in(conn)
+                    limiter_wait = email_limiter.wait_time()
+                    if limiter_wait > 0:
+                        # Email may be waiting for budget rather than for its retry time
+                        wait = min(wait, max(limiter_wait, 0.5))
+                    with _wakeup:
+                        # Don't sleep through a notify() that arrived while we were looking
+                        if _wakeup_count == seen:
+                            _wakeup.wait(wait)
+                    continue
+                with _step_seconds.labels(step="deliver").time():
+                    _deliver(conn, loop, *first, rows)
+            except Exception as e:
+                # Keep the worker alive whatever went wrong; the batch it was on is tried again later
+                logging.exception(f"Outbox worker error: {e}")
+                if rows:
+                    try:
+                        _release(conn, rows, f"worker error: {e}")
+                    except sqlite3.Error as release_error:
+                        logging.error(f"Could not release {len(rows)} outbox message(s): {release_error}")
+                _stop.wait(1)
+    finally:
+        loop.close()
+        conn.close()
+
+
+def start_workers(count=OUTBOX_WORKERS):
+    """
+    Start the delivery threads if they aren't running yet
+
+    Args:
+        count (int): Number of worker threads
+    """
+    if _workers:
+        return
+    # Messages a crashed process was in the middle of sending are retried
+    conn = task_repository.connect(isolation_level=None)
+    try:
+        conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+        # Emails sent in the last day, possibly by an earlier run, count towards the daily quota; so do
+        # the ones that may have gone out (ok is -1)
+        since = (datetime.now() - timedelta(days=1)).strftime(TIME_FORMAT)
+        email_limiter.seed(datetime.strptime(row[0], TIME_FORMAT).timestamp() for row in conn.execute(
+            "SELECT attempted_at FROM deliveries WHERE channel = 'email' AND ok != 0 AND attempted_at >= ?",
+            (since,)))
+    finally:
+        conn.close()
+    _stop.clear()
+    for i in range(count):
+        worker = threading.Thread(target=_worker_loop, name=f"outbox-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+
+
+def stop_workers(timeout=5):
+    """Ask the delivery threads to finish their current message and exit."""
+    _stop.set()
+    notify()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
@@ -0,0 +1,146 @@
+"""
+Pending-task count for the tray tooltip
+Counts the tasks and generated series occurrences that are not completed and
+not yet due. Once watch() has been called, writes adjust the count in memory
+through the task_repository listeners, and tasks.db is only counted again when
+the earliest counted due time has passed (or after a bulk change).
+"""
+import threading
+import time
+import logging
+from task_repository import (get_connection, from_epoch, count_pending, next_pending_due, add_task_listener,
+                             add_series_listener)
+from recurrence import load_series, pending_occurrences
+
+# Longest the watcher sleeps when there is no due time to wait for
+MAX_WAIT_SECONDS = 3600
+
+_lock = threading.RLock()
+_wakeup = threading.Event()
+_tasks = 0  # Pending rows in the tasks table
+_next_task_due = None  # Earliest due_ts among them
+_series = {}  # series id -> (pending generated occurrences, due_ts of the first one)
+_stale = False
+_callbacks = []
+_watcher = None
+
+
+def _is_pending(state):
+    # state is (status, due_ts) as passed by the task listeners
+    return state is not None and state[0] != "Completed" and state[1] is not None and state[1] > time.time()
+
+
+def _count_series(series, now_ts):
+    if series.status == "Completed":
+        return 0, None
+    count, first_due = 0, None
+    for occ_start, occ_due in pending_occurrences(get_connection(), series, window_start=from_epoch(now_ts + 1)):
+        if first_due is None:
+            first_due = int(occ_due.timestamp())
+        count += 1
+    return count, first_due
+
+
+def _next_due():
+    dues = [due for _, due in _series.values() if due is not None]
+    if _next_task_due is not None:
+        dues.append(_next_task_due)
+    return min(dues, default=None)
+
+
+def total():
+    """Return the current pending count."""
+    with _lock:
+        return _tasks + sum(count for count, _ in _series.values())
+
+
+def recount():
+    """Count the pending tasks and occurrences in tasks.db again and return the total."""
+    global _tasks, _next_task_due, _stale
+    now_ts = int(time.time())
+    with _lock:
+        now = from_epoch(now_ts)
+        _tasks = count_pending(now)
+        _next_task_due = next_pending_due(now)
+        _series.clear()
+        for series in load_series(get_connection()):
+            _series[series.id] = _count_series(series, now_ts)
+        _stale = False
+    return total()
+
+
+def _notify():
+    count = total()
+    for callback in _callbacks:
+        try:
+            callback(count)
+        except Exception as e:
+            logging.error(f"Pending count callback failed: {e}")
+
+
+def _on_task_changed(before, after):
+    global _tasks, _next_task_due, _stale
+    if _watcher is None:
+        return
+    with _lock:
+        if before is None and after is None:
+            # Bulk change: the watcher thread counts again
+            _stale = True
+            _wakeup.set()
+            return
+        _tasks += _is_pending(after) - _is_pending(before)
+        if _is_pending(after) and (_next_task_due is None or after[1] < _next_task_due):
+            _next_task_due = after[1]
+            _wakeup.set()
+    _notify()
+
+
+def _on_series_changed(series_id):
+    if _watcher is None:
+        return
+    with _lock:
+        found = load_series(get_connection(), series_id)
+        if found:
+            _series[series_id] = _count_series(found[0], int(time.time()))
+        else:
+            _series.pop(series_id, None)
+        _wakeup.set()
+    _notify()
+
+
+def _watch_loop():
+    while True:
+        try:
+            recount()
+            _notify()
+            while True:
+                _wakeup.clear()
+                with _lock:
+                    next_due = _next_due()
+                    stale = _stale
+                if stale or (next_due is not None and time.time() >= next_due):
+                    break
+                wait = MAX_WAIT_SECONDS if next_due is None else min(next_due - time.time(), MAX_WAIT_SECONDS)
+                _wakeup.wait(wait)
+        except Exception as e:
+            logging.error(f"Pending count watcher error: {e}")
+            time.sleep(60)
+
+
+def watch(callback):
+    """
+    Call callback(count) now and whenever the pending count changes: right after
+    a write, and when a counted task or occurrence falls due
+
+    Args:
+        callback (callable): Called with the new count, from whichever thread made the change
+    """
+    global _watcher
+    _callbacks.append(callback)
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch_loop, name="pending-counter", daemon=True)
+        _watcher.start()
+
+
+add_task_listener(_on_task_changed)
+add_series_listener(_on_series_changed)
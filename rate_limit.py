@@ -0,0 +1,117 @@
+"""
+Send-rate limiting for Task Manager
+A token bucket paces sends to a per-minute rate with a small burst allowance,
+and a rolling 24-hour count enforces a per-day quota. The rate adapts to the
+provider: a throttling response (SMTP 421/4xx) halves it and pauses sending
+for a while, and every successful send raises it again a little, up to the
+configured rate (additive increase, multiplicative decrease).
+"""
+import threading
+import time
+import logging
+from collections import deque
+
+DAY_SECONDS = 86400
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket with a daily quota and adaptive rate.
+
+    Callers take a token with acquire() before each send and report how it
+    went with succeeded() or throttled(). available() tells a scheduler how
+    many sends it may start now, so it can hand the budget to the most urgent
+    messages first.
+    """
+
+    def __init__(self, per_minute, per_day, burst=1, backoff_seconds=60):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.min_rate = self.max_rate / 16
+        self.per_day = per_day
+        self.burst = max(1, burst)
+        self.backoff_seconds = backoff_seconds
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._sent = deque()  # time.time() of each send in the last 24 hours
+        self._lock = threading.Condition()
+
+    def _refill(self, now):
+        # Nothing accrues during a pause, so sending resumes slowly rather than with a burst
+        accrued = max(0.0, now - max(self._updated, self._paused_until)) * self.rate
+        self._tokens = min(self.burst, self._tokens + accrued)
+        self._updated = now
+        cutoff = time.time() - DAY_SECONDS
+        while self._sent and self._sent[0] <= cutoff:
+            self._sent.popleft()
+
+    def _wait(self, now):
+        # Seconds until a token could be taken; 0 if one can be taken now
+        if len(self._sent) >= self.per_day:
+            return self._sent[0] + DAY_SECONDS - time.time()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def seed(self, timestamps):
+        """Count earlier sends (epoch seconds) towards the daily quota, e.g. after a restart."""
+        with self._lock:
+            self._sent.extend(sorted(ts for ts in timestamps if ts > time.time() - DAY_SECONDS))
+
+    def available(self):
+        """Return how many sends may start right now."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return 0
+            return max(0, min(int(self._tokens), self.per_day - len(self._sent)))
+
+    def wait_time(self):
+        """Return the seconds until the next send may start."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return max(0.0, self._wait(now))
+
+    def acquire(self, timeout=None):
+        """
+        Wait for a token and take it
+
+        Args:
+            timeout (float): Longest to wait in seconds, or None to wait as long as it takes
+
+        Returns:
+            bool: False if no token became available in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait(now)
+                if wait <= 0:
+                    self._tokens -= 1
+                    self._sent.append(time.time())
+                    return True
+                if deadline is not None:
+                    if now + wait > deadline:
+                        return False
+                self._lock.wait(wait)
+
+    def succeeded(self):
+        """Report an accepted send; the rate creeps back towards the configured one."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def throttled(self, code=None):
+        """Report a throttling response: halve the rate and pause for backoff_seconds."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._paused_until = time.monotonic() + self.backoff_seconds
+        logging.warning(f"Provider throttled sending (code {code}); pausing {self.backoff_seconds} s, "
+                        f"then {self.rate * 60:.1f} per minute")
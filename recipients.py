@@ -0,0 +1,139 @@
+"""
+Reminder recipients for Task Manager
+A task or recurring series can be shared with any number of recipients
+(a classmate, a team list, ...). The mapping is kept in task_recipients and
+series_recipients; an occurrence of a series goes to the series'
+recipients as well as its own. Every reminder also goes to the owner
+(EMAIL_USER, and SMS_TO for text messages), as before.
+
+Like recurrence.py, the functions take the caller's connection and leave
+committing to it.
+"""
+import os
+from collections import namedtuple
+import notifiers
+from task_repository import series_of_tasks
+
+# channels is a comma-separated notifiers channel list, or None for NOTIFY_CHANNELS
+Recipient = namedtuple("Recipient", "id name email phone channels")
+
+_COLUMNS = "r.id, r.name, r.email, r.phone, r.channels"
+
+
+def owner():
+    """Return the app's own user as a Recipient with no id."""
+    return Recipient(None, "Me", os.getenv("EMAIL_USER"), os.getenv("SMS_TO"), None)
+
+
+def channels_for(recipient):
+    """
+    Return the channels a recipient's reminders go out on: their own list if
+    they have one, otherwise the NOTIFY_CHANNELS they have an address for,
+    or failing that the channels their addresses allow (sms for a phone-only
+    recipient)
+
+    Args:
+        recipient (Recipient): The recipient
+
+    Returns:
+        str: Comma-separated channel names, or None for NOTIFY_CHANNELS unchanged
+    """
+    if recipient.channels:
+        return recipient.channels
+    default = notifiers.parse_channels(None)
+    reachable = [name for name in default
+                 if notifiers.get_notifier(name) is None or notifiers.get_notifier(name).address(recipient)]
+    if reachable == default:
+        return None
+    if not reachable:
+        reachable = [name for name, address in (("email", recipient.email), ("sms", recipient.phone)) if address]
+    return ",".join(reachable) or None
+
+
+def load_recipients(conn):
+    """Return every recipient, ordered by name."""
+    return [Recipient(*row) for row in conn.execute(f'SELECT {_COLUMNS} FROM recipients r ORDER BY r.name, r.id')]
+
+
+def add_recipient(conn, name, email, phone=None, channels=None):
+    """
+    Store a new recipient without committing
+
+    Returns:
+        int: The new recipient id
+    """
+    return conn.execute('INSERT INTO recipients (name, email, phone, channels) VALUES (?, ?, ?, ?)',
+                        (name, email, phone or None, channels or None)).lastrowid
+
+
+def delete_recipient(conn, recipient_id):
+    """Delete a recipient without committing; triggers remove it from every task and series."""
+    conn.execute('DELETE FROM recipients WHERE id = ?', (recipient_id,))
+
+
+def set_task_recipients(conn, task_id, recipient_ids):
+    """Replace the recipients a task is shared with, without committing."""
+    conn.execute('DELETE FROM task_recipients WHERE task_id = ?', (task_id,))
+    conn.executemany('INSERT OR IGNORE INTO task_recipients (task_id, recipient_id) VALUES (?, ?)',
+                     [(task_id, recipient_id) for recipient_id in recipient_ids])
+
+
+def set_series_recipients(conn, series_id, recipient_ids):
+    """Replace the recipients a series is shared with, without committing."""
+    conn.execute('DELETE FROM series_recipients WHERE series_id = ?', (series_id,))
+    conn.executemany('INSERT OR IGNORE INTO series_recipients (series_id, recipient_id) VALUES (?, ?)',
+                     [(series_id, recipient_id) for recipient_id in recipient_ids])
+
+
+def task_recipient_ids(conn, task_id):
+    """Return the ids of the recipients a task itself is shared with."""
+    return {row[0] for row in conn.execute('SELECT recipient_id FROM task_recipients WHERE task_id = ?', (task_id,))}
+
+
+def series_recipient_ids(conn, series_id):
+    """Return the ids of the recipients a series is shared with."""
+    return {row[0] for row in conn.execute('SELECT recipient_id FROM series_recipients WHERE series_id = ?',
+                                           (series_id,))}
+
+
+def recipients_for_tasks(conn, task_ids):
+    """
+    Look up who each task's reminder goes to, a few queries per 500 tasks
+
+    Args:
+        conn (sqlite3.Connection): Connection to tasks.db
+        task_ids (list): Task ids
+
+    Returns:
+        dict: task id -> list of Recipient, starting with owner()
+    """
+    # Which tasks are series occurrences comes from the repository; the sharing tables are queried here
+    series_by_task = series_of_tasks(conn, task_ids)
+    by_id, linked, by_series = {}, {}, {}
+    for ids, table, key, shared in ((task_ids, "task_recipients", "task_id", linked),
+                                    (sorted(set(series_by_task.values())), "series_recipients", "series_id",
+                                     by_series)):
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for ref_id, *recipient in conn.execute(
+                    f'SELECT m.{key}, {_COLUMNS} FROM {table} m JOIN recipients r ON r.id = m.recipient_id '
+                    f'WHERE m.{key} IN ({",".join("?" * len(chunk))})', chunk):
+                by_id[recipient[0]] = Recipient(*recipient)
+                shared.setdefault(ref_id, set()).add(recipient[0])
+    for task_id, series_id in series_by_task.items():
+        linked.setdefault(task_id, set()).update(by_series.get(series_id, ()))
+    found = {task_id: [by_id[recipient_id] for recipient_id in sorted(ids)] for task_id, ids in linked.items()}
+    me = owner()
+    return {task_id: [me] + found.get(task_id, []) for task_id in task_ids}
+
+
+def group_by_recipient(recipients_by_task):
+    """
+    Invert recipients_for_tasks: return {Recipient: [task ids]}, so a batch
+    of reminders costs one message per distinct recipient
+    """
+    grouped = {}
+    for task_id, recipients in recipients_by_task.items():
+        for recipient in recipients:
+            grouped.setdefault(recipient, []).append(task_id)
+    return grouped
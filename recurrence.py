@@ -0,0 +1,210 @@
+"""
+Recurrence helpers for Task Manager
+Weekday bitmasks use Mon=1, Tue=2, Wed=4, Thu=8, Fri=16, Sat=32, Sun=64
+"""
+import heapq
+from collections import namedtuple
+from datetime import datetime, timedelta
+import metrics
+from task_repository import notify_series_changed, insert_occurrence, materialized_occurrences
+
+
+def weekdays_from_bitmask(bitmask):
+    """
+    Convert a recurrence_days bitmask into a sorted list of weekday numbers
+
+    Args:
+        bitmask (int): recurrence_days value
+
+    Returns:
+        list: Weekday numbers as used by datetime.weekday() (Mon=0 ... Sun=6)
+    """
+    return [day for day in range(7) if bitmask and bitmask & (1 << day)]
+
+
+def _weekly_dates(first, end_date):
+    current = first
+    while current.date() <= end_date:
+        yield current
+        current += timedelta(days=7)
+
+
+def expand_occurrences(start, due, recurrence_days, end_date):
+    """
+    Yield the repeat occurrences of a recurring task in date order, jumping
+    straight from one matching weekday to the next instead of testing every day.
+    The first occurrence (start itself) is not included.
+
+    Args:
+        start (datetime): Start of the first occurrence
+        due (datetime): Due time of the first occurrence
+        recurrence_days (int): Weekday bitmask
+        end_date (date): Last date an occurrence may start on
+
+    Yields:
+        tuple: (occurrence_start, occurrence_due) datetimes
+    """
+    duration = due - start
+    series = []
+    for weekday in weekdays_from_bitmask(recurrence_days):
+        offset = (weekday - start.weekday()) % 7 or 7
+        series.append(_weekly_dates(start + timedelta(days=offset), end_date))
+    for occurrence_start in heapq.merge(*series):
+        yield occurrence_start, occurrence_start + duration
+
+
+# --- Rule-based recurring series ---
+# A recurring task is stored once in the series table. Its occurrences are generated
+# on demand; a tasks row (with series_id and occurrence set) only exists for an
+# occurrence that has its own state, e.g. a changed status or a sent reminder.
+# Deleted occurrences are recorded in series_skips. Occurrences are identified by
+# their start date ('%Y-%m-%d'), so editing a series' time of day keeps them apart.
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+Series = namedtuple("Series", "id name course status recurrence_days start due end_date reminder_hours")
+
+_expand_seconds = metrics.histogram("taskmanager_recurrence_expand_seconds",
+                                    "Time spent generating the pending occurrences of a series")
+
+
+def _series_from_row(row):
+    series_id, name, course, status, recurrence_days, start, due, end_date, reminder_hours = row
+    return Series(series_id, name, course, status, recurrence_days,
+                  datetime.strptime(start, TIME_FORMAT), datetime.strptime(due, TIME_FORMAT),
+                  datetime.strptime(end_date, "%Y-%m-%d").date(), reminder_hours)
+
+
+def load_series(conn, series_id=None):
+    """
+    Load one series or all of them
+
+    Args:
+        conn (sqlite3.Connection): Connection to tasks.db
+        series_id (int): Only load this series
+
+    Returns:
+        list: Series tuples
+    """
+    sql = 'SELECT id, name, course, status, recurrence_days, start, due, end_date, reminder_hours FROM series'
+    if series_id is None:
+        rows = conn.execute(sql).fetchall()
+    else:
+        rows = conn.execute(sql + ' WHERE id = ?', (series_id,)).fetchall()
+    return [_series_from_row(row) for row in rows]
+
+
+def insert_series(conn, name, course, status, recurrence_days, start, due, end_date, reminder_hours):
+    """
+    Store a new series rule without committing
+
+    Returns:
+        int: The new series id
+    """
+    cur = conn.execute(
+        'INSERT INTO series (name, course, status, recurrence_days, start, due, end_date, reminder_hours) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (name, course, status, recurrence_days, start.strftime(TIME_FORMAT), due.strftime(TIME_FORMAT),
+         end_date.strftime("%Y-%m-%d"), reminder_hours)
+    )
+    notify_series_changed(cur.lastrowid)
+    return cur.lastrowid
+
+
+def update_series(conn, series_id, name, course, status, recurrence_days, start, due, reminder_hours):
+    """Replace a series rule's fields without committing; the end date is kept."""
+    conn.execute(
+        'UPDATE series SET name=?, course=?, status=?, recurrence_days=?, start=?, due=?, reminder_hours=? '
+        'WHERE id=?',
+        (name, course, status, recurrence_days, start.strftime(TIME_FORMAT), due.strftime(TIME_FORMAT),
+         reminder_hours, series_id)
+    )
+    notify_series_changed(series_id)
+
+
+def skip_occurrence(conn, series_id, key):
+    """Record one occurrence of a series as deleted, without committing."""
+    if conn.execute('INSERT OR IGNORE INTO series_skips (series_id, occurrence) VALUES (?, ?)',
+                    (series_id, key)).rowcount:
+        notify_series_changed(series_id)
+
+
+def series_occurrences(series, window_start=None, window_end=None):
+    """
+    Yield the occurrences of a series whose due time falls in
+    [window_start, window_end), first occurrence included, in date order.
+    Weeks before the window are skipped arithmetically, not generated.
+
+    Args:
+        series (Series): The series rule
+        window_start (datetime): Earliest due time, or None for no limit
+        window_end (datetime): Due times must be before this, or None for no limit
+
+    Yields:
+        tuple: (occurrence_start, occurrence_due) datetimes
+    """
+    duration = series.due - series.start
+    candidates = [(series.start, series.due)]
+    if window_start is not None and window_start - duration > series.start + timedelta(days=7):
+        # Jump to the week before the window; anything earlier is out of range
+        anchor = series.start + timedelta(days=((window_start - duration - series.start).days // 7 - 1) * 7)
+    else:
+        anchor = series.start
+    repeats = expand_occurrences(anchor, anchor + duration, series.recurrence_days, series.end_date)
+    for occ_start, occ_due in heapq.merge(candidates, repeats):
+        if window_end is not None and occ_due >= window_end:
+            break
+        if window_start is not None and occ_due < window_start:
+            continue
+        yield occ_start, occ_due
+
+
+def occurrence_key(occ_start):
+    """Return the key identifying the occurrence of a series that starts at occ_start."""
+    return occ_start.strftime("%Y-%m-%d")
+
+
+def occurrence_start(series, key):
+    """Return the start datetime of the occurrence with the given key."""
+    return datetime.combine(datetime.strptime(key, "%Y-%m-%d").date(), series.start.time())
+
+
+def overridden_occurrences(conn, series_id):
+    """Return the set of occurrence keys of a series that are materialized or deleted."""
+    skipped = conn.execute('SELECT occurrence FROM series_skips WHERE series_id = ?', (series_id,))
+    return materialized_occurrences(conn, series_id) | {row[0] for row in skipped}
+
+
+def skipped_occurrences(conn, series_id):
+    """Return the sorted keys of the deleted occurrences of a series."""
+    return [row[0] for row in conn.execute(
+        'SELECT occurrence FROM series_skips WHERE series_id = ? ORDER BY occurrence', (series_id,))]
+
+
+def pending_occurrences(conn, series, window_start=None, window_end=None):
+    """Like series_occurrences, leaving out occurrences that have a tasks row or were deleted."""
+    overridden = overridden_occurrences(conn, series.id)
+    # Timed as the occurrences are produced, so a caller that stops early is only charged for what it took
+    return _expand_seconds.time_iter(
+        (occ_start, occ_due) for occ_start, occ_due in series_occurrences(series, window_start, window_end)
+        if occurrence_key(occ_start) not in overridden)
+
+
+def materialize_occurrence(conn, series, occ_start, status=None, reminder_sent=0):
+    """
+    Give one occurrence its own tasks row (without committing), copying the
+    series fields. If the occurrence already has a row, that row is returned.
+
+    Args:
+        conn (sqlite3.Connection): Connection to tasks.db
+        series (Series): The series the occurrence belongs to
+        occ_start (datetime): Start of the occurrence
+        status (str): Status for the new row, defaults to the series status
+        reminder_sent (int): Initial reminder_sent flag
+
+    Returns:
+        int: The tasks row id
+    """
+    return insert_occurrence(conn, series.name, series.course, occ_start, occ_start + (series.due - series.start),
+                             status or series.status, series.recurrence_days, series.reminder_hours, series.id,
+                             occurrence_key(occ_start), reminder_sent)
@@ -1,20 +1,267 @@
 import os
-from dotenv import load_dotenv
+import hashlib
+from datetime import datetime, timedelta
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
-from email_utils import send_email
+import metrics
+import outbox
+from recipients import owner, recipients_for_tasks, group_by_recipient, channels_for
+from task_repository import (get_connection, transaction, to_epoch, from_epoch, mark_reminder_sent, pending_reminders,
+                             claim_due_reminders)
+from recurrence import (load_series, pending_occurrences, overridden_occurrences, materialize_occurrence,
+                        occurrence_key, occurrence_start)
 
-load_dotenv()
+# Digest mode: when a reminder fires, every other reminder that becomes due within
+# the window is sent along with it in one email instead of one email per task
+REMINDER_DIGEST = os.getenv("REMINDER_DIGEST", "0") == "1"
+REMINDER_DIGEST_WINDOW_MINUTES = int(os.getenv("REMINDER_DIGEST_WINDOW_MINUTES", "60"))
+
+_reminder_seconds = metrics.histogram("taskmanager_reminder_seconds",
+                                     "Time the reminder engine spent rebuilding, syncing or queueing reminders")
 
 scheduler = BackgroundScheduler()
 scheduler.start()  # Make sure the scheduler is running
 
-def schedule_reminder(recipient_email, subject, body, send_time):
-    # Schedule a reminder using only positional arguments and confirm when sent
-    def send_and_confirm():
-        send_email(recipient_email, subject, body)
-        print(f"Reminder sent to {recipient_email} with subject '{subject}' at {send_time}")
+def _enqueue_for(conn, targets, idempotency_key, subject, body, due_ts=None):
+    # One outbox message per recipient; the owner's keeps the plain idempotency key
+    added = False
+    for recipient in targets:
+        key = idempotency_key
+        if recipient.id is not None and idempotency_key is not None:
+            key = f"{idempotency_key}:r{recipient.id}"
+        added |= outbox.enqueue(conn, key, recipient.email, subject, body, channels_for(recipient), recipient.phone,
+                                due_ts)
+    return added
+
+@_reminder_seconds.labels(op="queue").timed
+def queue_reminder(recipient_email, subject, body, idempotency_key=None, task_id=None, due_ts=None):
+    # Hand a reminder to the outbox for delivery. For a task reminder, the outbox rows and
+    # the task's reminder_sent flag are written in one transaction, so a crash can neither
+    # lose the reminder nor send it twice. A task reminder also goes to everyone it is shared with.
+    with transaction() as conn:
+        if task_id is not None and not mark_reminder_sent(task_id):
+            return  # Already reminded
+        if task_id is None:
+            targets = [owner()._replace(email=recipient_email)]
+        else:
+            targets = recipients_for_tasks(conn, [task_id])[task_id]
+        added = _enqueue_for(conn, targets, idempotency_key, subject, body, due_ts)
+    if added:
+        outbox.notify()
+        print(f"Reminder queued for {len(targets)} recipient(s) with subject '{subject}'")
+
+def schedule_reminder(recipient_email, subject, body, send_time, job_id=None, task_id=None, idempotency_key=None,
+                      due_ts=None):
+    # Schedule a reminder to be queued for delivery at send_time.
+    # Passing a job_id replaces any job already scheduled under that id.
+    scheduler.add_job(
+        queue_reminder,
+        'date',
+        run_date=send_time,
+        args=(recipient_email, subject, body, idempotency_key, task_id, due_ts),
+        id=job_id,
+        replace_existing=job_id is not None,
+        misfire_grace_time=None
+    )
+
+def format_digest(rows):
+    """
+    Build the plain-text body of a digest email: one line per task with its
+    name, course and due time, in aligned columns.
+    """
+    lines = [(name, course or "", from_epoch(due_ts).strftime('%m/%d/%y %I:%M %p'))
+             for name, course, due_ts in rows]
+    header = ("Assignment", "Class", "Due")
+    widths = [max(len(str(col)) for col in column) for column in zip(header, *lines)]
+    def fmt(cols):
+        return "  ".join(str(col).ljust(width) for col, width in zip(cols, widths)).rstrip()
+    table = [fmt(header), fmt("-" * width for width in widths)] + [fmt(line) for line in lines]
+    return f"You have {len(lines)} assignment(s) due soon:\n\n" + "\n".join(table)
+
+@_reminder_seconds.labels(op="queue_digest").timed
+def queue_digest(recipient_email):
+    # Collect every unsent reminder that falls due within the digest window, mark them all
+    # as reminded with one UPDATE and queue one email per recipient, all in one transaction.
+    # recipient_email is kept for jobs scheduled by earlier versions; the owner is always included.
+    now = datetime.now()
+    horizon = now + timedelta(minutes=REMINDER_DIGEST_WINDOW_MINUTES)
+    with transaction() as conn:
+        # Series occurrences in the window get their own rows first, so the claim below covers them
+        series_ids = _materialize_due_occurrences(conn, now, horizon)
+        rows = claim_due_reminders(now, horizon)
+        if not rows:
+            return  # Already covered by an earlier digest
+        by_id = {row[0]: row for row in rows}
+        added = False
+        for recipient, task_ids in group_by_recipient(recipients_for_tasks(conn, list(by_id))).items():
+            # Keyed on each reminder time too, so a task re-armed for a later reminder is queued again
+            ids = ",".join(f"{task_id}:{by_id[task_id][4]}" for task_id in task_ids)
+            added |= outbox.enqueue(
+                conn,
+                f"digest:{'owner' if recipient.id is None else f'r{recipient.id}'}:"
+                f"{hashlib.sha1(ids.encode()).hexdigest()}",
+                recipient.email,
+                f"Reminder: {len(task_ids)} assignment(s) due soon",
+                format_digest(by_id[task_id][1:4] for task_id in task_ids),
+                channels_for(recipient),
+                recipient.phone,
+                min(by_id[task_id][3] for task_id in task_ids)
+            )
+    for row in rows:
+        cancel_reminder(task_job_id(row[0]))
+    for series_id in series_ids:
+        sync_series_reminder(series_id)
+    if added:
+        outbox.notify()
+        print(f"Reminder digest of {len(rows)} task(s) queued")
+
+def cancel_reminder(job_id):
+    # Remove a scheduled reminder; a job that already ran or never existed is ignored
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass
+
+# --- Per-task reminder jobs ---
+def task_job_id(task_id):
+    return f"task-{task_id}"
+
+def _reminder_message(name, course, due):
+    return (f"Reminder: {name} due soon",
+            f"Your assignment '{name}' for {course} is due at {due.strftime('%m/%d/%y %I:%M %p')}.")
+
+def _schedule_row(task_id, name, course, due_ts, reminder_ts, now):
+    due = from_epoch(due_ts)
+    reminder_time = from_epoch(reminder_ts)
+    if REMINDER_DIGEST:
+        scheduler.add_job(
+            queue_digest,
+            'date',
+            run_date=max(reminder_time, now),
+            args=(os.getenv("EMAIL_USER"),),
+            id=task_job_id(task_id),
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+        return
+    schedule_reminder(
+        os.getenv("EMAIL_USER"),
+        *_reminder_message(name, course, due),
+        max(reminder_time, now),  # reminders missed while the app was closed go out right away
+        job_id=task_job_id(task_id),
+        task_id=task_id,
+        idempotency_key=f"reminder:{task_id}:{reminder_ts}",
+        due_ts=due_ts
+    )
+
+def sync_task_reminder(task_id):
+    """
+    Add, replace or remove the reminder job for one task so it matches tasks.db.
+    Call after the task's row has been committed (or deleted).
+    """
+    sync_task_reminders([task_id])
+
+@_reminder_seconds.labels(op="sync_tasks").timed
+def sync_task_reminders(task_ids):
+    """Same as sync_task_reminder for many tasks at once, e.g. a newly added recurring series."""
+    now = datetime.now()
+    rows = pending_reminders(now, task_ids)
+    pending = {row[0] for row in rows}
+    for task_id in task_ids:
+        if task_id not in pending:
+            cancel_reminder(task_job_id(task_id))
+    for row in rows:
+        _schedule_row(*row, now)
+
+# --- Per-series reminder jobs ---
+# Each series has at most one job, for its next occurrence that has no tasks row yet.
+# When it fires, the occurrence is materialized with reminder_sent=1 and the job moves on.
+def series_job_id(series_id):
+    return f"series-{series_id}"
+
+def _next_series_reminder(conn, series, now):
+    # (occurrence start, reminder time) of the next pending occurrence, or None
+    if not series.reminder_hours or series.status == "Completed":
+        return None
+    occurrence = next(pending_occurrences(conn, series, window_start=now + timedelta(seconds=1)), None)
+    if occurrence is None:
+        return None
+    return occurrence[0], occurrence[1] - timedelta(hours=series.reminder_hours)
+
+def _schedule_series(series_id, occurrence, now):
+    occ_start, reminder_time = occurrence
     scheduler.add_job(
-        send_and_confirm,
+        queue_digest if REMINDER_DIGEST else queue_series_reminder,
         'date',
-        run_date=send_time
-    )
\ No newline at end of file
+        run_date=max(reminder_time, now),
+        args=(os.getenv("EMAIL_USER"),) if REMINDER_DIGEST else (series_id, occurrence_key(occ_start)),
+        id=series_job_id(series_id),
+        replace_existing=True,
+        misfire_grace_time=None
+    )
+
+@_reminder_seconds.labels(op="sync_series").timed
+def sync_series_reminder(series_id):
+    """
+    Add, replace or remove the reminder job of a series so it points at the
+    series' next pending occurrence. Call after the series or any of its
+    occurrences changed.
+    """
+    now = datetime.now()
+    conn = get_connection()
+    found = load_series(conn, series_id)
+    occurrence = _next_series_reminder(conn, found[0], now) if found else None
+    if occurrence is None:
+        cancel_reminder(series_job_id(series_id))
+    else:
+        _schedule_series(series_id, occurrence, now)
+
+@_reminder_seconds.labels(op="queue_series").timed
+def queue_series_reminder(series_id, occurrence):
+    # Materialize the occurrence as reminded and queue its email in one transaction,
+    # then point the series job at the following occurrence
+    added = False
+    with transaction() as conn:
+        found = load_series(conn, series_id)
+        # An occurrence that already has its own row is reminded through its task job
+        if found and occurrence not in overridden_occurrences(conn, series_id):
+            series = found[0]
+            occ_start = occurrence_start(series, occurrence)
+            task_id = materialize_occurrence(conn, series, occ_start, reminder_sent=1)
+            occ_due = occ_start + (series.due - series.start)
+            subject, body = _reminder_message(series.name, series.course, occ_due)
+            targets = recipients_for_tasks(conn, [task_id])[task_id]
+            added = _enqueue_for(conn, targets, f"reminder:{task_id}:{occurrence}", subject, body, to_epoch(occ_due))
+    if added:
+        outbox.notify()
+        print(f"Reminder queued for {len(targets)} recipient(s) with subject '{subject}'")
+    sync_series_reminder(series_id)
+
+def _materialize_due_occurrences(conn, now, horizon):
+    # Give every series occurrence whose reminder falls before horizon its own (unsent) row
+    touched = []
+    for series in load_series(conn):
+        if not series.reminder_hours or series.status == "Completed":
+            continue
+        window_end = horizon + timedelta(hours=series.reminder_hours)
+        for occ_start, occ_due in pending_occurrences(conn, series, now + timedelta(seconds=1), window_end):
+            materialize_occurrence(conn, series, occ_start)
+            touched.append(series.id)
+    return set(touched)
+
+@_reminder_seconds.labels(op="rebuild").timed
+def rebuild_reminder_jobs():
+    """Drop all reminder jobs and schedule one per pending task reminder and one per series in tasks.db."""
+    for job in scheduler.get_jobs():
+        if job.id.startswith(("task-", "series-")):
+            job.remove()
+    now = datetime.now()
+    conn = get_connection()
+    rows = pending_reminders(now)
+    series_reminders = [(series.id, _next_series_reminder(conn, series, now)) for series in load_series(conn)]
+    for row in rows:
+        _schedule_row(*row, now)
+    for series_id, occurrence in series_reminders:
+        if occurrence is not None:
+            _schedule_series(series_id, occurrence, now)
+    return len(rows) + sum(1 for _, occurrence in series_reminders if occurrence is not None)
@@ -0,0 +1,74 @@
+"""
+Startup profiling for Task Manager
+`python main.py --profile-startup` (or the bundled app with the same flag)
+times every module imported during startup and each startup phase, prints
+the report to stderr once the main window has been drawn, and exits.
+Import this module before any other, so the import timer sees everything.
+"""
+import builtins
+import sys
+import threading
+import time
+
+ENABLED = "--profile-startup" in sys.argv[1:]
+
+# Imports and phases faster than this are left out of the report
+REPORT_THRESHOLD_MS = 1.0
+# Nested imports are reported down to this depth below the importing module
+REPORT_DEPTH = 2
+
+_started = time.perf_counter()
+_last_mark = _started
+_phases = []
+# [depth, module name, seconds] in the order the imports started
+_imports = []
+_stack = []
+_original_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only first-time imports on the main thread are timed; everything else passes straight through
+    if level or (name in sys.modules and not fromlist) or threading.current_thread() is not threading.main_thread():
+        return _original_import(name, globals, locals, fromlist, level)
+    entry = [len(_stack), name, 0.0]
+    _imports.append(entry)
+    _stack.append(entry)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        entry[2] = time.perf_counter() - start
+        _stack.pop()
+
+
+def mark(phase):
+    """
+    Record the end of a startup phase; its time runs from the previous mark
+
+    Args:
+        phase (str): Name of the phase that just finished
+    """
+    global _last_mark
+    if not ENABLED:
+        return
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def report(out=sys.stderr):
+    """Print the import and phase timings collected so far."""
+    total = time.perf_counter() - _started
+    print("Startup profile", file=out)
+    print(f"  Imports (>= {REPORT_THRESHOLD_MS:g} ms, nested imports indented):", file=out)
+    for depth, name, seconds in _imports:
+        if depth <= REPORT_DEPTH and seconds * 1000 >= REPORT_THRESHOLD_MS:
+            print(f"    {seconds * 1000:8.1f} ms  {'  ' * depth}{name}", file=out)
+    print("  Phases:", file=out)
+    for phase, seconds in _phases:
+        print(f"    {seconds * 1000:8.1f} ms  {phase}", file=out)
+    print(f"    {total * 1000:8.1f} ms  total", file=out)
+
+
+if ENABLED:
+    builtins.__import__ = _timed_import
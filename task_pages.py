@@ -0,0 +1,157 @@
+"""
+Paged task listing for the main Treeview
+Rows from the tasks table (and, if asked, the archive table) and generated
+series occurrences are merged into one sorted sequence and read a page at a time with keyset pagination, so only the
+rows that are shown are ever fetched
+"""
+import heapq
+from itertools import islice
+from datetime import datetime
+from recurrence import load_series, pending_occurrences
+from task_repository import (TIME_FORMAT, TaskRow, get_connection, tasks_page, archive_page, tasks_for_course,
+                             count_by_course, count_by_status, search_tasks, search_series_ids)
+
+# Rows per page fetched from the database
+PAGE_SIZE = 200
+
+# Treeview heading -> tasks column
+SORT_COLUMNS = {"Name": "name", "Class": "course", "Start": "start", "Due": "due", "Status": "status"}
+
+
+def _iid_order(iid):
+    # Tie-breaker after the sort value: tasks and archived rows by id, then series occurrences by series and date
+    if iid.startswith("S"):
+        series_id, stamp = iid[1:].split("@")
+        return 1, int(series_id), stamp
+    # Archived tasks keep their task id, so the two tables never share one
+    return 0, int(iid.lstrip("A")), ""
+
+
+def row_sort_key(row, column):
+    """
+    Return the key that orders a row in a listing sorted by column. NULL values
+    sort first, as they do in SQLite.
+
+    Args:
+        row (TaskRow): The row
+        column (str): One of the SORT_COLUMNS values
+    """
+    value = getattr(row, column)
+    return (value is not None, value or "", *_iid_order(row.iid))
+
+
+def series_rows(series, window_start=None):
+    """Yield the unmaterialized occurrences of a series as TaskRows, in start order."""
+    for occ_start, occ_due in pending_occurrences(get_connection(), series, window_start):
+        yield TaskRow(f"S{series.id}@{occ_start.strftime('%Y%m%d')}", series.name, series.course,
+                      occ_start.strftime(TIME_FORMAT), occ_due.strftime(TIME_FORMAT), series.status)
+
+
+def _series_source(series, column, descending, after):
+    # Occurrences of one series past the cursor, in listing order
+    window_start = None
+    if not descending and after is not None and column in ("start", "due") and after[0]:
+        # Jump straight to the cursor instead of generating the occurrences before it
+        window_start = datetime.strptime(after[1], TIME_FORMAT)
+        if column == "start":
+            window_start += series.due - series.start
+    rows = series_rows(series, window_start)
+    if descending:
+        rows = reversed(list(rows))
+    for row in rows:
+        key = row_sort_key(row, column)
+        if after is None or (key < after if descending else key > after):
+            yield row
+
+
+def fetch_page(column="due", descending=False, after=None, limit=PAGE_SIZE, include_archived=False):
+    """
+    Return the next page of the task listing
+
+    Args:
+        column (str): Sort column, one of the SORT_COLUMNS values
+        descending (bool): Sort direction
+        after (tuple): row_sort_key of the last row already shown, or None for the first page
+        limit (int): Maximum number of rows
+        include_archived (bool): Also list archived tasks
+
+    Returns:
+        list: TaskRow tuples in listing order
+    """
+    if column not in SORT_COLUMNS.values():
+        raise ValueError(f"Cannot sort by {column}")
+    sources = [tasks_page(column, descending, after, limit)]
+    if include_archived:
+        sources.append(archive_page(column, descending, after, limit))
+    sources.extend(_series_source(series, column, descending, after) for series in load_series(get_connection()))
+    merged = heapq.merge(*sources, key=lambda row: row_sort_key(row, column), reverse=descending)
+    page = []
+    for row in merged:
+        page.append(row)
+        if len(page) == limit:
+            break
+    return page
+
+
+# --- View by Class ---
+
+def class_rows(course, include_archived=False):
+    """
+    Return every task of one class, series occurrences included, ordered by due time
+
+    Args:
+        course (str): Class name
+        include_archived (bool): Also list archived tasks
+
+    Returns:
+        list: TaskRow tuples
+    """
+    sources = [tasks_for_course(course, include_archived)]
+    sources.extend(series_rows(series) for series in load_series(get_connection()) if series.course == course)
+    return list(heapq.merge(*sources, key=lambda row: row.due or ""))
+
+
+def _add_series_counts(counts, field, course=None):
+    # Generated occurrences aren't rows, so they are counted per series
+    conn = get_connection()
+    for series in load_series(conn):
+        if course is None or series.course == course:
+            key = getattr(series, field)
+            counts[key] = counts.get(key, 0) + sum(1 for _ in pending_occurrences(conn, series))
+    return counts
+
+
+def class_counts(include_archived=False):
+    """Return {class: number of tasks}, counted with GROUP BY over the course index."""
+    return _add_series_counts(count_by_course(include_archived), "course")
+
+
+def status_counts(course, include_archived=False):
+    """Return {status: number of tasks} for one class."""
+    return _add_series_counts(count_by_status(course, include_archived), "status", course)
+
+
+# --- Search ---
+
+def search_rows(text, limit=PAGE_SIZE, include_archived=False):
+    """
+    Return one page of rows whose name or class has a word starting with each
+    word of text: the newest matching tasks, plus the upcoming occurrences of
+    matching recurring series
+
+    Args:
+        text (str): Words typed in the search box
+        limit (int): Maximum number of rows
+        include_archived (bool): Also search archived tasks
+
+    Returns:
+        list: TaskRow tuples, unordered
+    """
+    conn = get_connection()
+    now = datetime.now()
+    occurrences = []
+    # Generated occurrences may fill at most half the page
+    for series_id in search_series_ids(text):
+        for series in load_series(conn, series_id):
+            occurrences.extend(islice(series_rows(series, now), limit // 2 - len(occurrences)))
+    return search_tasks(text, limit - len(occurrences), include_archived) + occurrences
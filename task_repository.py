@@ -0,0 +1,919 @@
+"""
+Data access layer for Task Manager
+All SQL against the tasks table lives here. Every thread gets its own
+connection to tasks.db in WAL mode, so the GUI, the reminder jobs and the
+outbox workers can read while another thread writes
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import heapq
+from itertools import islice
+from collections import namedtuple
+from datetime import datetime, timedelta
+import metrics
+
+DB_PATH = 'tasks.db'
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Statements kept compiled per connection; covers every query this app issues
+CACHED_STATEMENTS = 256
+# Negative cache_size is in KiB
+CACHE_SIZE_KIB = 16384
+# How long a writer waits for another writer's lock before giving up
+BUSY_TIMEOUT_SECONDS = 10
+
+# Rows per executemany and transaction when importing
+IMPORT_CHUNK_SIZE = 5000
+# Rows fetched per round trip when exporting
+EXPORT_BATCH_SIZE = 1000
+
+# Tasks moved per transaction when archiving
+ARCHIVE_BATCH_SIZE = 2000
+
+# Columns the main Treeview can be sorted by
+SORTABLE_COLUMNS = ("name", "course", "start", "due", "status")
+
+# start and due are in TIME_FORMAT, like the tasks columns
+TaskRow = namedtuple("TaskRow", "iid name course start due status")
+
+_local = threading.local()
+
+_query_seconds = metrics.histogram("taskmanager_db_query_seconds", "Time spent in a tasks.db query, by function")
+_lock_wait_seconds = metrics.histogram("taskmanager_db_lock_wait_seconds",
+                                       "Time spent waiting for the tasks.db write lock")
+_transaction_seconds = metrics.histogram("taskmanager_db_transaction_seconds",
+                                         "Time a write transaction held the tasks.db write lock")
+
+# Callbacks told about writes to tasks and series, see add_task_listener
+_task_listeners = []
+_series_listeners = []
+
+
+# --- Connections ---
+
+def connect(isolation_level=""):
+    """
+    Open a new, tuned connection to tasks.db
+
+    Args:
+        isolation_level (str): Passed to sqlite3.connect; None for autocommit
+
+    Returns:
+        sqlite3.Connection: The connection
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=isolation_level,
+                           cached_statements=CACHED_STATEMENTS)
+    # WAL lets readers and one writer work at the same time; NORMAL sync is durable across
+    # application crashes and only fsyncs at checkpoints
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+def get_connection():
+    """Return the calling thread's connection, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect()
+        _local.depth = 0
+        _local.pending = []
+    return conn
+
+
+def close_connection():
+    """Close the calling thread's connection, if it has one."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def data_version():
+    """
+    Return the thread's connection's PRAGMA data_version, which changes whenever
+    another connection (in this process or another) commits to tasks.db
+    """
+    return get_connection().execute('PRAGMA data_version').fetchone()[0]
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block as one write transaction on the thread's connection. Nested
+    blocks join the outermost one, which commits (or rolls back on error).
+    Listeners notified inside the block are called once it has committed,
+    and not at all if it rolls back.
+
+    Yields:
+        sqlite3.Connection: The thread's connection
+    """
+    conn = get_connection()
+    outermost = _local.depth == 0 and not conn.in_transaction
+    if outermost:
+        # Take the write lock up front so a read-then-write block can't hit a busy snapshot
+        started = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        locked = time.perf_counter()
+        _lock_wait_seconds.observe(locked - started)
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            _local.pending.clear()
+            conn.rollback()
+            if outermost:
+                _transaction_seconds.observe(time.perf_counter() - locked)
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.commit()
+        if outermost:
+            _transaction_seconds.observe(time.perf_counter() - locked)
+        pending, _local.pending = _local.pending, []
+        for call in pending:
+            call()
+
+
+def _timed_query(func):
+    # Every call is timed in taskmanager_db_query_seconds, labelled with the function name
+    return _query_seconds.labels(query=func.__name__).timed(func)
+
+
+# --- Timestamps ---
+# start_ts, due_ts and reminder_ts hold UTC epoch seconds next to the local-time text columns
+
+def to_epoch(dt):
+    """Return a naive local datetime as UTC epoch seconds."""
+    return int(dt.timestamp())
+
+
+def from_epoch(ts):
+    """Return UTC epoch seconds as a naive local datetime."""
+    return datetime.fromtimestamp(ts)
+
+
+def reminder_epoch(due, reminder_hours):
+    """Return the reminder time of a task due at due as epoch seconds, or None when it has no reminder."""
+    if not reminder_hours:
+        return None
+    return to_epoch(due) - reminder_hours * 3600
+
+
+# --- Change listeners ---
+
+def add_task_listener(listener):
+    """
+    Call listener(before, after) after every write to a task. before and after
+    are the task's (status, due_ts) before and after the write, None where it
+    didn't or doesn't exist. After a bulk change both are None.
+    """
+    _task_listeners.append(listener)
+
+
+def add_series_listener(listener):
+    """Call listener(series_id) after a series, its skips or its occurrences change."""
+    _series_listeners.append(listener)
+
+
+def _after_commit(call):
+    # Inside transaction() the call waits for the commit (and is dropped on rollback)
+    if getattr(_local, "depth", 0):
+        _local.pending.append(call)
+    else:
+        call()
+
+
+def notify_task_changed(before, after):
+    """Tell the task listeners about a write, once it is committed; see add_task_listener."""
+    def call():
+        for listener in _task_listeners:
+            listener(before, after)
+    _after_commit(call)
+
+
+def notify_series_changed(series_id):
+    """Tell the series listeners that a series changed, once it is committed."""
+    def call():
+        for listener in _series_listeners:
+            listener(series_id)
+    _after_commit(call)
+
+
+# --- Tasks ---
+
+_TASK_COLUMNS = 'id, name, course, start, due, status'
+
+_INSERT_TASK = ('INSERT INTO tasks (name, course, start, due, status, recurrence_days, reminder_hours, '
+                'reminder_at, start_ts, due_ts, reminder_ts, reminder_sent) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)')
+
+
+def compute_reminder_at(due, reminder_hours):
+    """
+    Return the reminder time for a task as a '%Y-%m-%d %H:%M:%S' string,
+    or None when the task has no reminder.
+    """
+    if not reminder_hours:
+        return None
+    return (due - timedelta(hours=reminder_hours)).strftime(TIME_FORMAT)
+
+
+def _task_params(name, course, start, due, status, recurrence_days, reminder_hours):
+    return (name, course, start.strftime(TIME_FORMAT), due.strftime(TIME_FORMAT), status, recurrence_days,
+            reminder_hours, compute_reminder_at(due, reminder_hours), to_epoch(start), to_epoch(due),
+            reminder_epoch(due, reminder_hours))
+
+
+def _task_row(row):
+    return TaskRow(str(row[0]), *row[1:])
+
+
+def _archived_row(row):
+    # Archived tasks are read-only rows, told apart by their "A" iid
+    return TaskRow(f"A{row[0]}", *row[1:])
+
+
+def _task_state(conn, task_id):
+    # (status, due_ts) as passed to the task listeners
+    return conn.execute('SELECT status, due_ts FROM tasks WHERE id = ?', (task_id,)).fetchone()
+
+
+def insert_task(name, course, start, due, status, recurrence_days=0, reminder_hours=24):
+    """
+    Insert one task
+
+    Args:
+        name (str): Assignment name
+        course (str): Class
+        start (datetime): Start time
+        due (datetime): Due time
+        status (str): Status
+        recurrence_days (int): Weekday bitmask (0 for none)
+        reminder_hours (int): Hours before due to send the reminder (0 for none)
+
+    Returns:
+        int: The new task id
+    """
+    with transaction() as conn:
+        cur = conn.execute(_INSERT_TASK, _task_params(name, course, start, due, status, recurrence_days,
+                                                      reminder_hours))
+    notify_task_changed(None, (status, to_epoch(due)))
+    return cur.lastrowid
+
+
+def insert_tasks(tasks):
+    """
+    Insert many tasks with one executemany in one transaction
+
+    Args:
+        tasks (iterable): Tuples of insert_task's arguments, all seven given
+
+    Returns:
+        list: The new task ids, in input order
+    """
+    with transaction() as conn:
+        first_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM tasks').fetchone()[0]
+        conn.executemany(_INSERT_TASK, (_task_params(*task) for task in tasks))
+        # AUTOINCREMENT ids are assigned in order, and nobody else can write inside this transaction
+        ids = [row[0] for row in conn.execute('SELECT id FROM tasks WHERE id > ? ORDER BY id', (first_id,))]
+    notify_task_changed(None, None)
+    return ids
+
+
+# Imported rows and materialized series occurrences; an occurrence that already has a row is ignored
+_INSERT_OCCURRENCE = ('INSERT OR IGNORE INTO tasks (name, course, start, due, status, recurrence_days, '
+                      'reminder_hours, reminder_at, start_ts, due_ts, reminder_ts, series_id, occurrence, '
+                      'reminder_sent) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+def import_tasks(tasks, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Insert tasks from any iterable, chunk_size rows per executemany and
+    transaction, so no more than one chunk is held in memory. The reminder
+    and timestamp columns are computed on the way in. A materialized series
+    occurrence that already has a row is skipped.
+
+    Args:
+        tasks (iterable): Tuples (name, course, start, due, status, recurrence_days, reminder_hours,
+            series_id, occurrence) with start and due as datetimes
+        chunk_size (int): Rows per transaction
+
+    Returns:
+        int: Number of rows inserted
+    """
+    params = (_task_params(*task[:7]) + tuple(task[7:9]) + (0,) for task in tasks)
+    conn = get_connection()
+    inserted = 0
+    while True:
+        chunk = list(islice(params, chunk_size))
+        if not chunk:
+            break
+        with transaction():
+            # rowcount leaves out the rows the search-index triggers write
+            inserted += conn.executemany(_INSERT_OCCURRENCE, chunk).rowcount
+    if inserted:
+        notify_task_changed(None, None)
+    return inserted
+
+
+def insert_occurrence(conn, name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence,
+                      reminder_sent=0):
+    """
+    Give a series occurrence its own tasks row on the caller's connection,
+    without committing. If the occurrence already has a row, that row is kept.
+
+    Args:
+        conn (sqlite3.Connection): Connection with an open transaction
+        name, course, start, due, status, recurrence_days, reminder_hours: As for insert_task
+        series_id (int): The series
+        occurrence (str): The occurrence key (its start date, YYYY-MM-DD)
+        reminder_sent (int): Initial reminder_sent flag
+
+    Returns:
+        int: The tasks row id
+    """
+    cur = conn.execute(_INSERT_OCCURRENCE, _task_params(name, course, start, due, status, recurrence_days,
+                                                        reminder_hours) + (series_id, occurrence, reminder_sent))
+    if cur.rowcount:
+        # The occurrence moves from the generated ones to the tasks table
+        notify_task_changed(None, (status, to_epoch(due)))
+        notify_series_changed(series_id)
+    return conn.execute('SELECT id FROM tasks WHERE series_id = ? AND occurrence = ?',
+                        (series_id, occurrence)).fetchone()[0]
+
+
+def materialized_occurrences(conn, series_id):
+    """Return the set of occurrence keys of a series that have a row of their own, archived or not."""
+    return {row[0] for row in conn.execute('''
+        SELECT occurrence FROM tasks WHERE series_id = ?
+        UNION
+        SELECT occurrence FROM archive WHERE series_id = ?
+    ''', (series_id, series_id))}
+
+
+def series_of_tasks(conn, task_ids):
+    """Return {task id: series id} for the tasks with these ids that are series occurrences."""
+    found = {}
+    for i in range(0, len(task_ids), 500):
+        chunk = task_ids[i:i + 500]
+        found.update(conn.execute(
+            f'SELECT id, series_id FROM tasks WHERE id IN ({",".join("?" * len(chunk))}) AND series_id IS NOT NULL',
+            chunk))
+    return found
+
+
+def iter_tasks(batch_size=EXPORT_BATCH_SIZE, course=None, due_after=None):
+    """
+    Yield tasks in id order, then archived tasks in id order, fetching
+    batch_size rows at a time
+
+    Args:
+        batch_size (int): Rows per fetchmany
+        course (str): Only tasks of this class, or None for every class
+        due_after (datetime): Only tasks due at or after this time, or None for all
+
+    Yields:
+        tuple: (id, name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence)
+    """
+    where, params = [], []
+    if course is not None:
+        where.append('course = ?')
+        params.append(course)
+    if due_after is not None:
+        where.append('due_ts >= ?')
+        params.append(to_epoch(due_after))
+    for table in ("tasks", "archive"):
+        cur = get_connection().execute(
+            'SELECT id, name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence '
+            f'FROM {table} {"WHERE " + " AND ".join(where) if where else ""} ORDER BY id',
+            params
+        )
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def get_task(task_id):
+    """Return one task as a TaskRow, or None if it doesn't exist."""
+    row = get_connection().execute(f'SELECT {_TASK_COLUMNS} FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    return _task_row(row) if row else None
+
+
+@_timed_query
+def get_tasks(task_ids):
+    """Return the tasks with these ids that exist, as TaskRows."""
+    task_ids = list(task_ids)
+    conn = get_connection()
+    rows = []
+    for i in range(0, len(task_ids), 500):
+        chunk = task_ids[i:i + 500]
+        rows.extend(_task_row(row) for row in conn.execute(
+            f'SELECT {_TASK_COLUMNS} FROM tasks WHERE id IN ({",".join("?" * len(chunk))})', chunk))
+    return rows
+
+
+def update_task(task_id, name, course, start, due, status, reminder_hours, recurrence_days):
+    """
+    Replace a task's fields. A changed reminder time re-arms the reminder, even
+    if the old one was already sent.
+
+    Returns:
+        bool: False if no task has this id
+    """
+    reminder_ts = reminder_epoch(due, reminder_hours)
+    with transaction() as conn:
+        before = _task_state(conn, task_id)
+        conn.execute(
+            'UPDATE tasks SET name=?, course=?, start=?, due=?, status=?, reminder_hours=?, '
+            'reminder_sent=CASE WHEN reminder_ts IS ? THEN reminder_sent ELSE 0 END, reminder_at=?, '
+            'start_ts=?, due_ts=?, reminder_ts=?, recurrence_days=? WHERE id=?',
+            (name, course, start.strftime(TIME_FORMAT), due.strftime(TIME_FORMAT), status, reminder_hours,
+             reminder_ts, compute_reminder_at(due, reminder_hours), to_epoch(start), to_epoch(due), reminder_ts,
+             recurrence_days, task_id)
+        )
+    if before is None:
+        return False
+    notify_task_changed(before, (status, to_epoch(due)))
+    return True
+
+
+def update_status(task_id, status):
+    """Set a task's status."""
+    with transaction() as conn:
+        before = _task_state(conn, task_id)
+        conn.execute('UPDATE tasks SET status=? WHERE id=?', (status, task_id))
+    if before is not None:
+        notify_task_changed(before, (status, before[1]))
+
+
+def delete_task(task_id):
+    """Delete a task. A materialized series occurrence is recorded as skipped so it isn't generated again."""
+    with transaction() as conn:
+        before = _task_state(conn, task_id)
+        conn.execute('INSERT OR IGNORE INTO series_skips (series_id, occurrence) '
+                     'SELECT series_id, occurrence FROM tasks WHERE id=? AND series_id IS NOT NULL', (task_id,))
+        conn.execute('DELETE FROM tasks WHERE id=?', (task_id,))
+    if before is not None:
+        notify_task_changed(before, None)
+
+
+# --- Bulk edits ---
+# Each runs a single executemany over the ids in one transaction and tells the listeners once.
+
+def update_status_many(task_ids, status):
+    """
+    Set the status of many tasks
+
+    Args:
+        task_ids (list): Task ids
+        status (str): The new status
+
+    Returns:
+        int: Number of tasks changed
+    """
+    with transaction() as conn:
+        changed = conn.executemany('UPDATE tasks SET status=? WHERE id=?',
+                                   [(status, task_id) for task_id in task_ids]).rowcount
+    notify_task_changed(None, None)
+    return changed
+
+
+def delete_many(task_ids):
+    """
+    Delete many tasks. Materialized series occurrences are recorded as skipped, as in delete_task.
+
+    Returns:
+        int: Number of tasks deleted
+    """
+    params = [(task_id,) for task_id in task_ids]
+    with transaction() as conn:
+        conn.executemany('INSERT OR IGNORE INTO series_skips (series_id, occurrence) '
+                         'SELECT series_id, occurrence FROM tasks WHERE id=? AND series_id IS NOT NULL', params)
+        deleted = conn.executemany('DELETE FROM tasks WHERE id=?', params).rowcount
+    notify_task_changed(None, None)
+    return deleted
+
+
+def shift_due_many(task_ids, days):
+    """
+    Move many tasks by a number of days. Start moves with due, so each task
+    keeps its length, and the reminder moves along (re-armed, as in update_task).
+
+    Args:
+        task_ids (list): Task ids
+        days (int): Days to move by; negative moves earlier
+
+    Returns:
+        int: Number of tasks changed
+    """
+    shift = f"{int(days):+d} days"
+    # The text columns are local time; 'utc' turns the shifted local time into epoch seconds,
+    # so a shift across a daylight saving change keeps the wall-clock time
+    with transaction() as conn:
+        changed = conn.executemany('''
+            UPDATE tasks SET
+                start = datetime(start, :shift), due = datetime(due, :shift),
+                start_ts = CAST(strftime('%s', start, :shift, 'utc') AS INTEGER),
+                due_ts = CAST(strftime('%s', due, :shift, 'utc') AS INTEGER),
+                reminder_at = datetime(reminder_at, :shift),
+                reminder_ts = CASE WHEN reminder_hours > 0
+                    THEN CAST(strftime('%s', due, :shift, 'utc') AS INTEGER) - reminder_hours * 3600 END,
+                reminder_sent = CASE WHEN :shift = '+0 days' THEN reminder_sent ELSE 0 END
+            WHERE id = :id
+        ''', [{"shift": shift, "id": task_id} for task_id in task_ids]).rowcount
+    notify_task_changed(None, None)
+    return changed
+
+
+def set_reminder_hours_many(task_ids, reminder_hours):
+    """
+    Give many tasks the same reminder lead time. A changed reminder time
+    re-arms the reminder, as in update_task.
+
+    Args:
+        task_ids (list): Task ids
+        reminder_hours (int): Hours before due to remind, 0 for no reminder
+
+    Returns:
+        int: Number of tasks changed
+    """
+    hours = int(reminder_hours)
+    with transaction() as conn:
+        changed = conn.executemany('''
+            UPDATE tasks SET
+                reminder_hours = :hours,
+                reminder_at = CASE WHEN :hours > 0 THEN datetime(due, printf('-%d hours', :hours)) END,
+                reminder_ts = CASE WHEN :hours > 0 THEN due_ts - :hours * 3600 END,
+                reminder_sent = CASE WHEN reminder_ts IS (CASE WHEN :hours > 0 THEN due_ts - :hours * 3600 END)
+                    THEN reminder_sent ELSE 0 END
+            WHERE id = :id
+        ''', [{"hours": hours, "id": task_id} for task_id in task_ids]).rowcount
+    notify_task_changed(None, None)
+    return changed
+
+
+def delete_all():
+    """Delete every task, archived ones included, and every recurring series."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM tasks')
+        conn.execute('DELETE FROM archive')
+        conn.execute('DELETE FROM series')
+        conn.execute('DELETE FROM series_skips')
+    notify_task_changed(None, None)
+
+
+# --- Archive ---
+
+_ARCHIVABLE = "status IN ('Completed', 'Graded') AND due_ts < ?"
+
+_ARCHIVE_COLUMNS = ('id, name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence, '
+                    'start_ts, due_ts')
+
+
+def archive_tasks(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move done (Completed or Graded) tasks due before cutoff into the archive
+    table, batch_size tasks per transaction, so the GUI and the reminder jobs
+    only ever wait for one short batch
+
+    Args:
+        cutoff (datetime): Tasks due before this are moved
+        batch_size (int): Tasks per transaction
+
+    Returns:
+        int: Number of tasks moved
+    """
+    cutoff_ts = to_epoch(cutoff)
+    archived_at = datetime.now().strftime(TIME_FORMAT)
+    moved, last_id = 0, 0
+    while True:
+        with transaction() as conn:
+            ids = [row[0] for row in conn.execute(
+                f'SELECT id FROM tasks WHERE {_ARCHIVABLE} AND id > ? ORDER BY id LIMIT ?',
+                (cutoff_ts, last_id, batch_size))]
+            if not ids:
+                break
+            # The id range covers exactly this batch, re-checked in case a row changed since the SELECT
+            params = (cutoff_ts, ids[0], ids[-1])
+            conn.execute(f'INSERT INTO archive ({_ARCHIVE_COLUMNS}, archived_at) '
+                         f'SELECT {_ARCHIVE_COLUMNS}, ? FROM tasks WHERE {_ARCHIVABLE} AND id BETWEEN ? AND ?',
+                         (archived_at, *params))
+            moved += conn.execute(f'DELETE FROM tasks WHERE {_ARCHIVABLE} AND id BETWEEN ? AND ?', params).rowcount
+        last_id = ids[-1]
+    if moved:
+        notify_task_changed(None, None)
+    return moved
+
+
+def get_archived_tasks(task_ids):
+    """Return the archived tasks with these ids, as TaskRows with "A" iids."""
+    task_ids = list(task_ids)
+    conn = get_connection()
+    rows = []
+    for i in range(0, len(task_ids), 500):
+        chunk = task_ids[i:i + 500]
+        rows.extend(_archived_row(row) for row in conn.execute(
+            f'SELECT {_TASK_COLUMNS} FROM archive WHERE id IN ({",".join("?" * len(chunk))})', chunk))
+    return rows
+
+
+def delete_archived(task_ids):
+    """
+    Delete archived tasks. An archived series occurrence is recorded as skipped, as in delete_task.
+
+    Returns:
+        int: Number of tasks deleted
+    """
+    params = [(task_id,) for task_id in task_ids]
+    with transaction() as conn:
+        conn.executemany('INSERT OR IGNORE INTO series_skips (series_id, occurrence) '
+                         'SELECT series_id, occurrence FROM archive WHERE id=? AND series_id IS NOT NULL', params)
+        return conn.executemany('DELETE FROM archive WHERE id=?', params).rowcount
+
+
+@_timed_query
+def tasks_page(column, descending, after, limit):
+    """
+    Return one keyset page of tasks ordered by (column, id)
+
+    Args:
+        column (str): One of SORTABLE_COLUMNS
+        descending (bool): Sort direction
+        after (tuple): task_pages.row_sort_key of the last row already shown, or None
+        limit (int): Maximum number of rows
+
+    Returns:
+        list: TaskRow tuples
+    """
+    return [_task_row(row) for row in _page("tasks", column, descending, after, limit)]
+
+
+@_timed_query
+def archive_page(column, descending, after, limit):
+    """Like tasks_page, for archived tasks."""
+    return [_archived_row(row) for row in _page("archive", column, descending, after, limit)]
+
+
+def _page(table, column, descending, after, limit):
+    if column not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort by {column}")
+    order = "DESC" if descending else "ASC"
+    cmp = "<" if descending else ">"
+    where, params = "", ()
+    if after is not None:
+        has_value, value, kind, task_id, _ = after
+        if not has_value:
+            if descending:
+                where, params = f"WHERE {column} IS NULL AND id < ?", (task_id,)
+            else:
+                where, params = f"WHERE ({column} IS NULL AND id > ?) OR {column} IS NOT NULL", (task_id,)
+        elif kind == 0:
+            where = f"WHERE ({column}, id) {cmp} (?, ?)"
+            if descending:
+                where += f" OR {column} IS NULL"
+            params = (value, task_id)
+        else:
+            # Series occurrences come after tasks rows with the same value
+            where = f"WHERE {column} {'<=' if descending else '>'} ?"
+            if descending:
+                where += f" OR {column} IS NULL"
+            params = (value,)
+    return get_connection().execute(
+        f'SELECT {_TASK_COLUMNS} FROM {table} {where} ORDER BY {column} {order}, id {order} LIMIT ?',
+        (*params, limit)
+    ).fetchall()
+
+
+@_timed_query
+def tasks_due_between(start, end):
+    """Return the tasks due in [start, end), ordered by due time."""
+    rows = get_connection().execute(
+        f'SELECT {_TASK_COLUMNS} FROM tasks WHERE due_ts >= ? AND due_ts < ? ORDER BY due_ts, id',
+        (to_epoch(start), to_epoch(end))
+    ).fetchall()
+    return [_task_row(row) for row in rows]
+
+
+@_timed_query
+def tasks_for_course(course, include_archived=False):
+    """Return every task of one class, ordered by due time (course index); archived ones too if asked."""
+    conn = get_connection()
+    rows = [_task_row(row) for row in conn.execute(
+        f'SELECT {_TASK_COLUMNS} FROM tasks WHERE course = ? ORDER BY due, id', (course,))]
+    if not include_archived:
+        return rows
+    archived = [_archived_row(row) for row in conn.execute(
+        f'SELECT {_TASK_COLUMNS} FROM archive WHERE course = ? ORDER BY due, id', (course,))]
+    return list(heapq.merge(rows, archived, key=lambda row: (row.due or "", int(row.iid.lstrip("A")))))
+
+
+def _add_counts(counts, rows):
+    for key, count in rows:
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+@_timed_query
+def count_by_course(include_archived=False):
+    """Return {class: number of tasks}."""
+    conn = get_connection()
+    counts = dict(conn.execute('SELECT course, COUNT(*) FROM tasks GROUP BY course').fetchall())
+    if include_archived:
+        _add_counts(counts, conn.execute('SELECT course, COUNT(*) FROM archive GROUP BY course'))
+    return counts
+
+
+@_timed_query
+def count_by_status(course, include_archived=False):
+    """Return {status: number of tasks} for one class."""
+    conn = get_connection()
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM tasks WHERE course = ? GROUP BY status', (course,)))
+    if include_archived:
+        _add_counts(counts, conn.execute('SELECT status, COUNT(*) FROM archive WHERE course = ? GROUP BY status',
+                                         (course,)))
+    return counts
+
+
+@_timed_query
+def count_pending(now):
+    """Return the number of tasks that are not completed and not yet due."""
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM tasks WHERE due_ts > ? AND status != 'Completed'", (to_epoch(now),)
+    ).fetchone()[0]
+
+
+@_timed_query
+def next_pending_due(now):
+    """Return the earliest due_ts after now of a task that is not completed, or None."""
+    return get_connection().execute(
+        "SELECT MIN(due_ts) FROM tasks WHERE due_ts > ? AND status != 'Completed'", (to_epoch(now),)
+    ).fetchone()[0]
+
+
+# --- Search ---
+# tasks_fts and series_fts index name and course; see migrations._create_search_index
+
+def fts_query(text):
+    """
+    Turn what the user typed into an FTS5 query matching rows that have a word
+    starting with each typed word, in either column
+
+    Returns:
+        str: The MATCH expression, or None when text has no words
+    """
+    words = text.split()
+    if not words:
+        return None
+    # Quoted, so FTS5 operators and punctuation in the input are taken literally
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+
+@_timed_query
+def search_tasks(text, limit, include_archived=False):
+    """
+    Return up to limit tasks matching text, newest first
+
+    Args:
+        text (str): Words typed in the search box
+        limit (int): Maximum number of rows
+        include_archived (bool): Also search archived tasks
+
+    Returns:
+        list: TaskRow tuples
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    # rowid order lets FTS5 stop after limit matches instead of ranking them all
+    rows = [_task_row(row) for row in get_connection().execute(f'''
+        SELECT {_TASK_COLUMNS} FROM tasks
+        WHERE id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ? ORDER BY rowid DESC LIMIT ?)
+        ORDER BY id DESC
+    ''', (query, limit))]
+    if not include_archived:
+        return rows
+    archived = [_archived_row(row) for row in get_connection().execute(f'''
+        SELECT {_TASK_COLUMNS} FROM archive
+        WHERE id IN (SELECT rowid FROM archive_fts WHERE archive_fts MATCH ? ORDER BY rowid DESC LIMIT ?)
+        ORDER BY id DESC
+    ''', (query, limit))]
+    return list(islice(heapq.merge(rows, archived, key=lambda row: int(row.iid.lstrip("A")), reverse=True), limit))
+
+
+@_timed_query
+def search_series_ids(text):
+    """Return the ids of the recurring series whose name or class match text."""
+    query = fts_query(text)
+    if query is None:
+        return []
+    return [row[0] for row in get_connection().execute(
+        'SELECT rowid FROM series_fts WHERE series_fts MATCH ? ORDER BY rowid', (query,))]
+
+
+# --- Change log ---
+# Written by triggers on tasks, series and series_skips, see change_feed.py
+
+@_timed_query
+def changes_since(seq, limit):
+    """
+    Return up to limit change log entries after seq, oldest first
+
+    Returns:
+        list: (seq, tbl, row_id, series_id, op) tuples; tbl is 'tasks' or 'series'
+    """
+    return get_connection().execute(
+        'SELECT seq, tbl, row_id, series_id, op FROM changes WHERE seq > ? ORDER BY seq LIMIT ?', (seq, limit)
+    ).fetchall()
+
+
+def change_log_bounds():
+    """Return (oldest seq, newest seq) in the change log, (None, None) when it is empty."""
+    return get_connection().execute('SELECT MIN(seq), MAX(seq) FROM changes').fetchone()
+
+
+def prune_changes(through_seq):
+    """Delete change log entries up to and including through_seq."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM changes WHERE seq <= ?', (through_seq,))
+
+
+# --- Reminders ---
+# These match idx_tasks_pending_reminder_ts, so SQLite reads only rows that can still fire
+
+@_timed_query
+def pending_reminders(now, task_ids=None):
+    """
+    Return (id, name, course, due_ts, reminder_ts) for unsent reminders of
+    tasks that are not completed and not yet due
+
+    Args:
+        now (datetime): Current time
+        task_ids (list): Only consider these tasks
+
+    Returns:
+        list: Row tuples, due_ts and reminder_ts in epoch seconds
+    """
+    conn = get_connection()
+    sql = '''
+        SELECT id, name, course, due_ts, reminder_ts FROM tasks
+        WHERE reminder_sent = 0 AND status != 'Completed'
+          AND reminder_ts IS NOT NULL AND due_ts > ?
+    '''
+    now_ts = to_epoch(now)
+    if task_ids is None:
+        return conn.execute(sql, (now_ts,)).fetchall()
+    rows = []
+    for i in range(0, len(task_ids), 500):
+        chunk = task_ids[i:i + 500]
+        rows.extend(conn.execute(sql + f' AND id IN ({",".join("?" * len(chunk))})', (now_ts, *chunk)).fetchall())
+    return rows
+
+
+def mark_reminder_sent(task_id):
+    """
+    Flag one task as reminded
+
+    Returns:
+        bool: False if it was already reminded
+    """
+    with transaction() as conn:
+        cur = conn.execute('UPDATE tasks SET reminder_sent=1 WHERE id=? AND reminder_sent=0', (task_id,))
+        return cur.rowcount == 1
+
+
+@_timed_query
+def claim_due_reminders(now, horizon):
+    """
+    Flag, with one UPDATE, every unsent reminder due to fire before horizon for
+    a task not yet due, and return those tasks
+
+    Args:
+        now (datetime): Current time
+        horizon (datetime): Latest reminder time to include
+
+    Returns:
+        list: (id, name, course, due_ts, reminder_ts) tuples ordered by due time
+    """
+    params = (to_epoch(horizon), to_epoch(now))
+    with transaction() as conn:
+        rows = conn.execute('''
+            SELECT id, name, course, due_ts, reminder_ts FROM tasks
+            WHERE reminder_sent = 0 AND status != 'Completed'
+              AND reminder_ts <= ? AND due_ts > ?
+            ORDER BY due_ts
+        ''', params).fetchall()
+        if rows:
+            conn.execute('''
+                UPDATE tasks SET reminder_sent = 1
+                WHERE reminder_sent = 0 AND status != 'Completed'
+                  AND reminder_ts <= ? AND due_ts > ?
+            ''', params)
+        return rows
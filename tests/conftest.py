@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+import notifiers
+import task_repository
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated tasks.db of its own for each test."""
+    task_repository.close_connection()
+    monkeypatch.setattr(task_repository, "DB_PATH", str(tmp_path / "tasks.db"))
+    migrations.migrate()
+    yield task_repository.get_connection()
+    task_repository.close_connection()
+
+
+@pytest.fixture(autouse=True)
+def notifier_registry(monkeypatch):
+    """Channels registered in a test (notifiers.register_notifier) are dropped afterwards."""
+    monkeypatch.setattr(notifiers, "_notifiers", dict(notifiers._notifiers))
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import archive
+import task_repository
+from task_pages import fetch_page, search_rows, class_counts
+from recurrence import insert_series, load_series, materialize_occurrence, overridden_occurrences, occurrence_key
+
+CUTOFF = datetime(2026, 1, 1)
+
+
+def add(name, status, due, course="HIST 105"):
+    return task_repository.insert_task(name, course, due - timedelta(days=1), due, status)
+
+
+def test_only_old_finished_tasks_are_moved(db):
+    old_done = add("Essay 1", "Completed", CUTOFF - timedelta(days=30))
+    old_graded = add("Essay 2", "Graded", CUTOFF - timedelta(days=20))
+    old_open = add("Essay 3", "In Progress", CUTOFF - timedelta(days=10))
+    new_done = add("Essay 4", "Completed", CUTOFF + timedelta(days=1))
+
+    # One task per transaction, to go through the batching
+    assert task_repository.archive_tasks(CUTOFF, batch_size=1) == 2
+    assert task_repository.archive_tasks(CUTOFF) == 0
+
+    assert [row[0] for row in db.execute('SELECT id FROM tasks ORDER BY id')] == [old_open, new_done]
+    assert [row[0] for row in db.execute('SELECT id FROM archive ORDER BY id')] == [old_done, old_graded]
+    assert [row.iid for row in task_repository.get_archived_tasks([old_graded])] == [f"A{old_graded}"]
+
+
+def test_archived_tasks_are_listed_searched_and_counted_only_when_asked(db):
+    add("Essay 1", "Completed", CUTOFF - timedelta(days=30))
+    add("Essay 2", "Not Started", CUTOFF + timedelta(days=3))
+    task_repository.archive_tasks(CUTOFF)
+
+    assert [row.name for row in fetch_page()] == ["Essay 2"]
+    assert [row.name for row in fetch_page(include_archived=True)] == ["Essay 1", "Essay 2"]
+    assert sorted(row.name for row in search_rows("essay")) == ["Essay 2"]
+    assert sorted(row.name for row in search_rows("essay", include_archived=True)) == ["Essay 1", "Essay 2"]
+    assert class_counts() == {"HIST 105": 1}
+    assert class_counts(include_archived=True) == {"HIST 105": 2}
+
+
+def test_archived_occurrence_still_overrides_the_generated_one(db):
+    start = datetime(2025, 9, 1, 9, 0)
+    with task_repository.transaction() as conn:
+        series_id = insert_series(conn, "Lecture", "CS 101", "Not Started", 1, start, start + timedelta(hours=1),
+                                  (start + timedelta(weeks=4)).date(), 0)
+        task_id = materialize_occurrence(conn, load_series(conn, series_id)[0], start, status="Completed")
+    task_repository.archive_tasks(CUTOFF)
+    key = occurrence_key(start)
+
+    assert key in overridden_occurrences(db, series_id)
+    rows = fetch_page(include_archived=True)
+    assert [row.iid for row in rows if row.name == "Lecture"][0] == f"A{task_id}"
+
+    # Deleting it from the archive keeps the occurrence deleted rather than bringing it back
+    assert task_repository.delete_archived([task_id]) == 1
+    assert key in overridden_occurrences(db, series_id)
+    assert all(row.iid != f"A{task_id}" and not row.iid.endswith(f"@{start:%Y%m%d}")
+               for row in fetch_page(include_archived=True))
+
+
+def test_delete_all_empties_the_archive(db):
+    add("Essay 1", "Completed", CUTOFF - timedelta(days=30))
+    add("Essay 2", "Not Started", CUTOFF + timedelta(days=3))
+    task_repository.archive_tasks(CUTOFF)
+
+    task_repository.delete_all()
+
+    assert fetch_page(include_archived=True) == []
+    assert db.execute('SELECT COUNT(*) FROM archive').fetchone()[0] == 0
+
+
+def test_archiving_can_be_turned_off(db):
+    add("Essay 1", "Completed", datetime.now() - timedelta(days=400))
+
+    assert archive.archive_old_tasks(after_days=0) == 0
+    assert archive.archive_old_tasks(after_days=180) == 1
@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta
+
+import task_repository
+from change_feed import ChangeFeed
+from recurrence import insert_series, load_series, materialize_occurrence
+
+DUE = datetime(2026, 3, 2, 23, 59)
+
+
+def elsewhere(work):
+    # Run work on another thread, hence another connection, as a second window or the daemon would
+    result = {}
+
+    def run():
+        try:
+            result["value"] = work()
+        finally:
+            task_repository.close_connection()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result.get("value")
+
+
+def add(name):
+    return task_repository.insert_task(name, "CS 240", DUE - timedelta(days=2), DUE, "Not Started")
+
+
+def test_poll_reports_tasks_changed_by_another_connection(db):
+    kept, changed, deleted = (add(name) for name in ("Project 1", "Project 2", "Project 3"))
+    feed = ChangeFeed()
+    assert feed.poll() is None
+
+    def work():
+        task_repository.update_status(changed, "Completed")
+        task_repository.delete_task(deleted)
+        return add("Project 4")
+
+    added = elsewhere(work)
+
+    changes = feed.poll()
+    assert changes.task_ids == {changed, deleted, added} and not changes.overflow
+    assert kept not in changes.task_ids
+    assert feed.poll() is None
+
+
+def test_own_changes_are_not_reported_until_another_connection_commits(db):
+    feed = ChangeFeed()
+    mine = add("Project 1")
+    assert feed.poll() is None
+
+    theirs = elsewhere(lambda: add("Project 2"))
+
+    assert feed.poll().task_ids == {mine, theirs}
+
+
+def test_materialized_occurrence_reports_its_series(db):
+    feed = ChangeFeed()
+
+    def work():
+        with task_repository.transaction() as conn:
+            series_id = insert_series(conn, "Lecture", "CS 240", "Not Started", 1, DUE, DUE + timedelta(hours=1),
+                                      (DUE + timedelta(weeks=4)).date(), 24)
+            task_id = materialize_occurrence(conn, load_series(conn, series_id)[0], DUE + timedelta(weeks=1))
+        return series_id, task_id
+
+    series_id, task_id = elsewhere(work)
+
+    changes = feed.poll()
+    assert changes.task_ids == {task_id} and changes.series_ids == {series_id}
+
+
+def test_too_many_changes_ask_for_a_reload(db):
+    feed = ChangeFeed(limit=3)
+
+    elsewhere(lambda: [add(f"Project {i}") for i in range(5)])
+
+    assert feed.poll() == (set(), set(), True)
+    # The reader is caught up afterwards
+    elsewhere(lambda: add("Project 6"))
+    assert not feed.poll().overflow
@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import migrations
+import task_repository
+from task_repository import to_epoch, TIME_FORMAT
+
+
+def baseline_db(path, tasks):
+    # tasks.db as the app created it before migrations existed: text dates only, user_version 0
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE tasks
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            course TEXT,
+            start TEXT,
+            due TEXT,
+            status TEXT,
+            recurrence_days INTEGER,
+            reminder_hours INTEGER DEFAULT 24
+        )
+    ''')
+    conn.executemany('INSERT INTO tasks (name, course, start, due, status, recurrence_days, reminder_hours) '
+                     'VALUES (?, ?, ?, ?, ?, 0, ?)', tasks)
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_upgraded_and_backfilled(tmp_path, monkeypatch):
+    path = str(tmp_path / "tasks.db")
+    soon = (datetime.now() + timedelta(days=3)).replace(microsecond=0)
+    past = datetime(2024, 3, 1, 23, 59)
+    baseline_db(path, [
+        ("Lab Report 3", "CHEM 110", (soon - timedelta(days=1)).strftime(TIME_FORMAT), soon.strftime(TIME_FORMAT),
+         "In Progress", 24),
+        ("Essay Draft", "ENGL 201", (past - timedelta(days=7)).strftime(TIME_FORMAT), past.strftime(TIME_FORMAT),
+         "Completed", 0),
+    ])
+    task_repository.close_connection()
+    monkeypatch.setattr(task_repository, "DB_PATH", path)
+    try:
+        assert migrations.migrate() == len(migrations.MIGRATIONS)
+        # Running again at the latest version changes nothing
+        assert migrations.migrate() == len(migrations.MIGRATIONS)
+        conn = task_repository.get_connection()
+        rows = conn.execute('SELECT name, start_ts, due_ts, reminder_ts, reminder_sent FROM tasks ORDER BY id')
+        assert rows.fetchall() == [
+            ("Lab Report 3", to_epoch(soon - timedelta(days=1)), to_epoch(soon), to_epoch(soon) - 24 * 3600, 0),
+            # Its reminder time had passed when reminder_sent was added, so it is marked as sent
+            ("Essay Draft", to_epoch(past - timedelta(days=7)), to_epoch(past), None, 1),
+        ]
+        # The upgraded rows are in the search index and the listing reads them back
+        assert [row.name for row in task_repository.search_tasks("lab", 10)] == ["Lab Report 3"]
+        assert [row.name for row in task_repository.tasks_page("due", False, None, 10)] == [
+            "Essay Draft", "Lab Report 3"]
+    finally:
+        task_repository.close_connection()
+
+
+def test_new_database_gets_every_table(db):
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    assert {"tasks", "outbox", "series", "series_skips", "recipients", "changes", "archive"} <= tables
+    assert db.execute('PRAGMA user_version').fetchone()[0] == len(migrations.MIGRATIONS)
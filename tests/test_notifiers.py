@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import time
+
+import email_utils
+import notifiers
+from notifiers import FakeNotifier, EmailNotifier, register_notifier
+from recipients import Recipient
+
+RECIPIENT = Recipient(None, None, "student@example.com", None, None)
+MESSAGES = [("Lab Report 3", "Due tomorrow"), ("Quiz Prep", "Due Friday")]
+
+
+def dispatch(channels, messages=MESSAGES, recipient=RECIPIENT):
+    return asyncio.run(notifiers.dispatch(channels, recipient, messages))
+
+
+def test_dispatch_reports_every_channel_for_every_message():
+    good = FakeNotifier(name="good")
+    register_notifier(good)
+    bad = FakeNotifier(name="bad", fail=True)
+    register_notifier(bad)
+
+    deliveries = dispatch(["good", "bad"])
+
+    assert [[(d.channel, d.ok) for d in outcome] for outcome in deliveries] == [
+        [("good", True), ("bad", False)], [("good", True), ("bad", False)]]
+    assert deliveries[0][1].error == "fake channel failure"
+    assert [subject for _, subject, _ in good.sent] == ["Lab Report 3", "Quiz Prep"]
+    assert bad.sent == []
+
+
+def test_dispatch_fails_unknown_channel_and_missing_address():
+    deliveries = dispatch(["nowhere", "sms"])
+
+    assert [(d.ok, d.skipped) for d in deliveries[0]] == [(False, False), (False, True)]
+    assert "Unknown notification channel" in deliveries[0][0].error
+    assert "No address" in deliveries[0][1].error
+
+
+def test_slow_channel_times_out_without_holding_up_the_others():
+    register_notifier(FakeNotifier(name="slow", delay=2, timeout=0.05))
+    fast = FakeNotifier(name="fast")
+    register_notifier(fast)
+
+    started = time.perf_counter()
+    deliveries = dispatch(["slow", "fast"], MESSAGES[:1])
+
+    assert time.perf_counter() - started < 1
+    slow, quick = deliveries[0]
+    # Cancelled, but the provider may have had it already, so it is unknown rather than failed
+    assert slow.ok is None and "timed out" in slow.error
+    assert quick.ok and len(fast.sent) == 1
+
+
+def test_email_batch_timeout_reports_message_in_flight_as_unknown(monkeypatch):
+    calls, release = [], threading.Event()
+
+    def send_email(to_email, subject, body):
+        calls.append(subject)
+        if len(calls) == 2:
+            release.wait(5)  # A provider that stops answering mid-message
+        return True
+
+    monkeypatch.setattr(email_utils, "send_email", send_email)
+    email = EmailNotifier()
+    email.timeout = 0.1
+    register_notifier(email)
+
+    messages = [("first", ""), ("second", ""), ("third", "")]
+    deliveries = dispatch(["email"], messages)
+    release.set()
+    time.sleep(0.2)
+
+    assert [outcome[0].ok for outcome in deliveries] == [True, None, False]
+    # The thread finished the message it was on but never started the next one
+    assert calls == ["first", "second"]
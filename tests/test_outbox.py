@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import email_utils
+import outbox
+import task_repository
+from notifiers import FakeNotifier, EmailNotifier, register_notifier
+
+
+def enqueue(key, channels, subject="Lab Report 3", due_ts=None):
+    with task_repository.transaction() as conn:
+        outbox.enqueue(conn, key, "student@example.com", subject, "Due tomorrow", channels=channels, due_ts=due_ts)
+
+
+def deliver_once():
+    # One claim and delivery, as a worker thread does it
+    conn = task_repository.connect(isolation_level=None)
+    loop = asyncio.new_event_loop()
+    try:
+        first, rows = outbox._claim(conn)
+        if rows:
+            outbox._deliver(conn, loop, *first, rows)
+        return len(rows)
+    finally:
+        loop.close()
+        conn.close()
+
+
+def make_due(db):
+    with task_repository.transaction() as conn:
+        conn.execute("UPDATE outbox SET next_attempt_at = '2000-01-01 00:00:00' WHERE status = 'pending'")
+
+
+def rows(db):
+    return db.execute('SELECT idempotency_key, status, channels, attempts FROM outbox ORDER BY id').fetchall()
+
+
+def test_only_failed_channels_are_retried(db):
+    good = FakeNotifier(name="good")
+    register_notifier(good)
+    flaky = FakeNotifier(name="flaky", fail=True)
+    register_notifier(flaky)
+    enqueue("k1", "good,flaky")
+
+    assert deliver_once() == 1
+    assert rows(db) == [("k1", "pending", "flaky", 1)]
+
+    flaky.fail = False
+    make_due(db)
+    assert deliver_once() == 1
+    assert rows(db) == [("k1", "sent", "flaky", 2)]
+    assert len(good.sent) == 1 and len(flaky.sent) == 1
+
+
+def test_message_that_keeps_failing_goes_dead(db, monkeypatch):
+    register_notifier(FakeNotifier(name="broken", fail=True))
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    enqueue("k1", "broken")
+
+    deliver_once()
+    make_due(db)
+    deliver_once()
+
+    assert rows(db) == [("k1", "dead", "broken", 2)]
+
+
+def test_timed_out_channel_is_not_retried(db):
+    slow = FakeNotifier(name="slow", delay=2, timeout=0.05)
+    register_notifier(slow)
+    enqueue("k1", "slow")
+
+    assert deliver_once() == 1
+    make_due(db)
+    assert deliver_once() == 0
+    assert rows(db) == [("k1", "unknown", "slow", 1)]
+
+
+def test_channel_without_address_is_not_retried(db):
+    sms = FakeNotifier(name="sms")
+    sms.address = lambda recipient: recipient.phone
+    register_notifier(sms)
+    with task_repository.transaction() as conn:
+        outbox.enqueue(conn, "k1", None, "Lab Report 3", "Due tomorrow", "email,sms", "+15550100")
+        outbox.enqueue(conn, "k2", None, "Quiz Prep", "Due Friday", "email")
+
+    assert deliver_once() == 1 and deliver_once() == 1
+    # Sent by sms with email noted as skipped; the email-only message has nowhere to go
+    assert rows(db) == [("k1", "sent", "email,sms", 1), ("k2", "dead", "email", 1)]
+    assert [address for address, _, _ in sms.sent] == ["+15550100"]
+
+
+def test_timed_out_email_batch_sends_nothing_twice(db, monkeypatch):
+    calls, release = [], threading.Event()
+
+    def send_email(to_email, subject, body):
+        calls.append(subject)
+        if subject == "second":
+            release.wait(5)
+        return True
+
+    monkeypatch.setattr(email_utils, "send_email", send_email)
+    monkeypatch.setattr(outbox.email_limiter, "available", lambda: 50)
+    email = EmailNotifier()
+    email.timeout = 0.1
+    register_notifier(email)
+    for due_ts, subject in enumerate(["first", "second", "third"]):
+        enqueue(subject, "email", subject, due_ts)
+
+    assert deliver_once() == 3
+    release.set()
+    time.sleep(0.2)
+    # Sent, may have been sent (not retried), never started (retried)
+    assert [row[:2] for row in rows(db)] == [("first", "sent"), ("second", "unknown"), ("third", "pending")]
+
+    make_due(db)
+    assert deliver_once() == 1
+    assert deliver_once() == 0
+    assert sorted(calls) == ["first", "second", "third"]
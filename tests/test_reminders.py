@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import reminders
+import task_repository
+from recipients import add_recipient, set_task_recipients, set_series_recipients, recipients_for_tasks
+from recurrence import insert_series, load_series, materialize_occurrence
+
+
+@pytest.fixture
+def shared(db, monkeypatch):
+    # Two tasks due in two hours, so both reminders are due now: one shared with an
+    # email-only classmate, the other with a phone-only one
+    monkeypatch.setenv("EMAIL_USER", "me@example.com")
+    monkeypatch.delenv("SMS_TO", raising=False)
+    due = datetime.now().replace(microsecond=0) + timedelta(hours=2)
+    lab = task_repository.insert_task("Lab Report 3", "CHEM 110", due - timedelta(days=1), due, "In Progress")
+    quiz = task_repository.insert_task("Quiz Prep", "MATH 221", due - timedelta(days=1), due, "Not Started")
+    with task_repository.transaction() as conn:
+        ana = add_recipient(conn, "Ana", "ana@example.com")
+        ben = add_recipient(conn, "Ben", None, "+15550100")
+        set_task_recipients(conn, lab, [ana])
+        set_task_recipients(conn, quiz, [ben])
+    return lab, quiz, ana, ben
+
+
+def outbox_rows(db):
+    return db.execute('SELECT idempotency_key, recipient, phone, channels, body FROM outbox ORDER BY id').fetchall()
+
+
+def test_digest_goes_to_the_owner_and_each_recipient_once(shared, db):
+    lab, quiz, ana, ben = shared
+
+    reminders.queue_digest("me@example.com")
+
+    rows = {key.split(":")[1]: tuple(row) for key, *row in outbox_rows(db)}
+    assert sorted(rows) == sorted(["owner", f"r{ana}", f"r{ben}"])
+    assert rows["owner"][0] == "me@example.com" and "Lab Report 3" in rows["owner"][3] \
+        and "Quiz Prep" in rows["owner"][3]
+    assert rows[f"r{ana}"][:3] == ("ana@example.com", None, None)
+    assert "Lab Report 3" in rows[f"r{ana}"][3] and "Quiz Prep" not in rows[f"r{ana}"][3]
+    # Ben has only a phone, so his digest goes by SMS rather than the default email channel
+    assert rows[f"r{ben}"][:3] == (None, "+15550100", "sms")
+    assert db.execute('SELECT COUNT(*) FROM tasks WHERE reminder_sent = 1').fetchone()[0] == 2
+
+    # Claimed already, so a second digest queues nothing
+    reminders.queue_digest("me@example.com")
+    assert len(outbox_rows(db)) == 3
+
+
+def test_rearmed_reminder_is_queued_again(shared, db):
+    lab, quiz, ana, ben = shared
+    reminders.queue_digest("me@example.com")
+
+    # A new lead time re-arms both reminders; the same tasks get a new digest, not a duplicate key
+    task_repository.set_reminder_hours_many([lab, quiz], 12)
+    reminders.queue_digest("me@example.com")
+
+    keys = [row[0] for row in outbox_rows(db)]
+    assert len(keys) == len(set(keys)) == 6
+
+
+def test_occurrence_goes_to_the_series_recipients(db):
+    start = datetime(2026, 1, 5, 9, 0)
+    with task_repository.transaction() as conn:
+        series_id = insert_series(conn, "Lecture", "CS 101", "Not Started", 1, start, start + timedelta(hours=1),
+                                  (start + timedelta(weeks=4)).date(), 24)
+        cal = add_recipient(conn, "Cal", "cal@example.com")
+        set_series_recipients(conn, series_id, [cal])
+        task_id = materialize_occurrence(conn, load_series(conn, series_id)[0], start + timedelta(weeks=1))
+    other = task_repository.insert_task("Essay Draft", "ENGL 201", start, start, "Not Started")
+
+    found = recipients_for_tasks(db, [task_id, other])
+
+    assert [recipient.name for recipient in found[task_id]] == ["Me", "Cal"]
+    assert [recipient.name for recipient in found[other]] == ["Me"]
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import task_pages
+import task_repository
+from recurrence import insert_series, load_series, series_occurrences, materialize_occurrence
+from task_pages import fetch_page, row_sort_key
+
+MONDAY = datetime(2026, 1, 5, 9, 0)
+
+
+@pytest.fixture
+def listing(db):
+    # One-off tasks, some sharing a due time with each other and with the series, plus a
+    # Mon/Wed series with one occurrence materialized; the oldest done tasks are archived
+    for i in range(12):
+        due = MONDAY + timedelta(days=i // 2, hours=1)
+        status = "Completed" if i < 4 else "Not Started"
+        task_repository.insert_task(f"Homework {i}", "MATH 221", due - timedelta(days=1), due, status)
+    with task_repository.transaction() as conn:
+        series_id = insert_series(conn, "Lecture", "CS 101", "Not Started", 1 | 4, MONDAY, MONDAY + timedelta(hours=1),
+                                  (MONDAY + timedelta(weeks=2)).date(), 24)
+        occ_start, _ = list(series_occurrences(load_series(conn, series_id)[0]))[1]
+        materialize_occurrence(conn, load_series(conn, series_id)[0], occ_start, status="In Progress")
+    task_repository.archive_tasks(MONDAY + timedelta(days=2))
+    return series_id
+
+
+def read_all(column, descending, include_archived, limit):
+    rows, after = [], None
+    while True:
+        page = fetch_page(column, descending, after, limit, include_archived)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        after = row_sort_key(page[-1], column)
+
+
+@pytest.mark.parametrize("column", ["due", "start", "name", "status"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("include_archived", [False, True])
+def test_pages_join_up_into_the_full_listing(listing, column, descending, include_archived):
+    everything = fetch_page(column, descending, None, 1000, include_archived)
+
+    for limit in (1, 3, 7):
+        assert read_all(column, descending, include_archived, limit) == everything
+    keys = [row_sort_key(row, column) for row in everything]
+    assert keys == sorted(keys, reverse=descending)
+    assert len({row.iid for row in everything}) == len(everything)
+
+
+def test_listing_merges_tasks_archive_and_series(listing):
+    active = fetch_page("due", False, None, 1000)
+    everything = fetch_page("due", False, None, 1000, include_archived=True)
+
+    # Lecture meets Mon and Wed for two weeks plus the final Monday; one occurrence is a tasks row
+    lectures = [row for row in everything if row.name == "Lecture"]
+    assert len(lectures) == 5
+    assert sum(row.iid.startswith("S") for row in lectures) == 4
+    archived = [row for row in everything if row.iid.startswith("A")]
+    assert len(archived) == 4 and all(row.status == "Completed" for row in archived)
+    assert len(everything) - len(active) == 4
+
+
+def test_unknown_sort_column_is_rejected(db):
+    with pytest.raises(ValueError):
+        task_pages.fetch_page("reminder_hours")
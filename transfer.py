@@ -0,0 +1,284 @@
+"""
+Bulk import and export for Task Manager
+Tasks are streamed through generators in constant memory: imports go into
+tasks.db in chunked executemany transactions, exports read the tables in
+batches with fetchmany. CSV and JSON Lines can be imported and exported;
+iCalendar (.ics) is export only, with each recurring series written once
+as an RRULE.
+
+    python transfer.py import syllabus.csv
+    python transfer.py export backup.jsonl
+    python transfer.py export calendar.ics
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timezone
+import migrations
+from task_repository import get_connection, transaction, import_tasks, iter_tasks
+from recurrence import load_series, insert_series, skip_occurrence, skipped_occurrences, occurrence_start
+
+# Columns of a CSV file and keys of a JSON Lines record. A recurring series is one record
+# with recurrence_days and end_date set; "series" is its id in the exporting database, which
+# its materialized occurrences refer to along with their "occurrence" key. "skipped" lists
+# the deleted occurrences of a series, separated by spaces.
+FIELDS = ("name", "course", "start", "due", "status", "reminder_hours", "recurrence_days", "end_date",
+          "series", "occurrence", "skipped")
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".ics": "ics"}
+
+BYDAY = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+
+def format_for_path(path):
+    """Return the format ('csv', 'jsonl' or 'ics') implied by a file name's extension."""
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unknown file type for {path}; use .csv, .jsonl or .ics")
+    return fmt
+
+
+# --- Import ---
+
+def read_csv(path):
+    """Yield the records of a CSV file with a header row as dicts."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def read_jsonl(path):
+    """Yield the records of a JSON Lines file as dicts."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _int(value, default):
+    return default if value in (None, "") else int(value)
+
+
+def _task_tuples(records, stats):
+    # Turn records into import_tasks tuples. Series records are stored right away, so the
+    # occurrences that follow them can be linked to the new series id.
+    series_ids = {}
+    for number, record in enumerate(records, 1):
+        try:
+            name = record["name"]
+            course = record.get("course") or None
+            start = datetime.fromisoformat(record["start"])
+            due = datetime.fromisoformat(record["due"])
+            status = record.get("status") or "Not Started"
+            reminder_hours = _int(record.get("reminder_hours"), 24)
+            recurrence_days = _int(record.get("recurrence_days"), 0)
+            end_date = record.get("end_date")
+            if recurrence_days and end_date:
+                end_date = datetime.fromisoformat(end_date).date()
+        except (KeyError, TypeError, ValueError) as e:
+            logging.warning(f"Skipping record {number}: {e!r}")
+            stats["skipped"] += 1
+            continue
+
+        if recurrence_days and end_date:
+            with transaction() as conn:
+                series_id = insert_series(conn, name, course, status, recurrence_days, start, due, end_date,
+                                          reminder_hours)
+                for key in (record.get("skipped") or "").split():
+                    skip_occurrence(conn, series_id, key)
+            if record.get("series") not in (None, ""):
+                series_ids[str(record["series"])] = series_id
+            stats["series"] += 1
+            continue
+
+        # A materialized occurrence stays linked to its series, if the series was imported too
+        series_id = series_ids.get(str(record.get("series")))
+        occurrence = record.get("occurrence") or None if series_id else None
+        yield name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence
+
+
+def import_file(path, fmt=None):
+    """
+    Import tasks and recurring series from a CSV or JSON Lines file
+
+    Args:
+        path (str): File to read
+        fmt (str): 'csv' or 'jsonl'; taken from the extension when None
+
+    Returns:
+        dict: Counts of imported "tasks" and "series" and of "skipped" invalid records
+    """
+    fmt = fmt or format_for_path(path)
+    if fmt == "csv":
+        records = read_csv(path)
+    elif fmt == "jsonl":
+        records = read_jsonl(path)
+    else:
+        raise ValueError(f"Cannot import {fmt} files")
+    stats = {"tasks": 0, "series": 0, "skipped": 0}
+    stats["tasks"] = import_tasks(_task_tuples(records, stats))
+    return stats
+
+
+# --- Export ---
+
+def export_records():
+    """Yield every series and task as a record with the FIELDS keys, series first."""
+    conn = get_connection()
+    for series in load_series(conn):
+        yield {
+            "name": series.name, "course": series.course,
+            "start": series.start.isoformat(" "), "due": series.due.isoformat(" "),
+            "status": series.status, "reminder_hours": series.reminder_hours,
+            "recurrence_days": series.recurrence_days, "end_date": series.end_date.isoformat(),
+            "series": series.id, "occurrence": None,
+            "skipped": " ".join(skipped_occurrences(conn, series.id)) or None,
+        }
+    for task_id, name, course, start, due, status, recurrence_days, reminder_hours, series_id, occurrence \
+            in iter_tasks():
+        yield {
+            "name": name, "course": course, "start": start, "due": due, "status": status,
+            "reminder_hours": reminder_hours, "recurrence_days": recurrence_days, "end_date": None,
+            "series": series_id, "occurrence": occurrence, "skipped": None,
+        }
+
+
+def _ics_text(value):
+    return (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_time(value):
+    # '%Y-%m-%d %H:%M:%S' local time -> iCalendar floating local time
+    return value.replace("-", "").replace(":", "").replace(" ", "T")
+
+
+def _fold(line):
+    # Content lines longer than 75 octets continue on the next line after a space
+    data = line.encode("utf-8")
+    chunks = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:  # Don't split a UTF-8 sequence
+            cut -= 1
+        chunks.append(data[:cut])
+        data = data[cut:]
+        limit = 74
+    chunks.append(data)
+    return b"\r\n ".join(chunks).decode("utf-8") + "\r\n"
+
+
+def _event(uid, stamp, start, due, name, course, status, extra=()):
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{stamp}", f"DTSTART:{_ics_time(start)}",
+             f"DTEND:{_ics_time(due)}", f"SUMMARY:{_ics_text(name)}"]
+    if course:
+        lines.append(f"CATEGORIES:{_ics_text(course)}")
+    description = "Class: " + (course or "") + "\nStatus: " + (status or "")
+    lines.append(f"DESCRIPTION:{_ics_text(description)}")
+    lines.append(f"X-TASKMANAGER-STATUS:{_ics_text(status)}")
+    lines.extend(extra)
+    lines.append("END:VEVENT")
+    return lines
+
+
+def ics_lines(course=None, due_after=None):
+    """
+    Yield an iCalendar file line by line (folded, with CRLF endings). A series
+    is one VEVENT with an RRULE and EXDATEs for its deleted occurrences; an
+    occurrence with its own row overrides it with a RECURRENCE-ID.
+
+    Args:
+        course (str): Only include this class, or None for everything
+        due_after (datetime): Leave out tasks due before this time and series that ended before it
+    """
+    conn = get_connection()
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield from map(_fold, ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Task Manager//Task Manager//EN",
+                           "CALSCALE:GREGORIAN", "X-WR-CALNAME:" + _ics_text(course or "Task Manager")])
+    series_by_id = {}
+    for series in load_series(conn):
+        if course is not None and series.course != course:
+            continue
+        if due_after is not None and series.end_date < due_after.date():
+            continue
+        series_by_id[series.id] = series
+        start = series.start.strftime("%Y-%m-%d %H:%M:%S")
+        days = ",".join(code for bit, code in enumerate(BYDAY) if series.recurrence_days & (1 << bit))
+        extra = [f"RRULE:FREQ=WEEKLY;BYDAY={days};UNTIL={series.end_date.strftime('%Y%m%d')}T235959"]
+        extra.extend(f"EXDATE:{occurrence_start(series, key).strftime('%Y%m%dT%H%M%S')}"
+                     for key in skipped_occurrences(conn, series.id))
+        for line in _event(f"series-{series.id}@taskmanager", stamp, start,
+                           series.due.strftime("%Y-%m-%d %H:%M:%S"), series.name, series.course, series.status,
+                           extra):
+            yield _fold(line)
+    for task_id, name, task_course, start, due, status, _, _, series_id, occurrence \
+            in iter_tasks(course=course, due_after=due_after):
+        start, due = start or due, due or start
+        if not start:
+            continue
+        series = series_by_id.get(series_id)
+        if series is not None and occurrence:
+            recurrence_id = occurrence_start(series, occurrence).strftime('%Y%m%dT%H%M%S')
+            event = _event(f"series-{series_id}@taskmanager", stamp, start, due, name, task_course, status,
+                           [f"RECURRENCE-ID:{recurrence_id}"])
+        else:
+            event = _event(f"task-{task_id}@taskmanager", stamp, start, due, name, task_course, status)
+        for line in event:
+            yield _fold(line)
+    yield _fold("END:VCALENDAR")
+
+
+def export_file(path, fmt=None):
+    """
+    Export every task and recurring series to a file
+
+    Args:
+        path (str): File to write
+        fmt (str): 'csv', 'jsonl' or 'ics'; taken from the extension when None
+
+    Returns:
+        int: Number of records (or lines, for iCalendar) written
+    """
+    fmt = fmt or format_for_path(path)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            for record in export_records():
+                writer.writerow(record)
+                count += 1
+        elif fmt == "jsonl":
+            for record in export_records():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        elif fmt == "ics":
+            for line in ics_lines():
+                f.write(line)
+                count += 1
+        else:
+            raise ValueError(f"Cannot export {fmt} files")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import or export Task Manager tasks")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "jsonl", "ics"), help="Override the format implied by the extension")
+    args = parser.parse_args(argv)
+    migrations.migrate()
+    if args.command == "import":
+        stats = import_file(args.path, args.format)
+        print(f"Imported {stats['tasks']} task(s) and {stats['series']} recurring series from {args.path}"
+              + (f", skipped {stats['skipped']} invalid record(s)" if stats["skipped"] else ""))
+    else:
+        count = export_file(args.path, args.format)
+        print(f"Exported {count} {'line' if (args.format or format_for_path(args.path)) == 'ics' else 'record'}(s) "
+              f"to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())